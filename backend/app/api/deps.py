@@ -1,7 +1,12 @@
-from typing import Annotated, Generator, Optional
+from typing import Annotated, AsyncGenerator, Generator, Optional
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi import Depends
-from backend.app.core.db import engine
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from backend.app.core.db import async_session_factory, engine
+from backend.app.crud.user import AsyncUserCRUD
+from backend.app.models.user import User
+from backend.app.utils.auth_cache import auth_cache, credentials_exception
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -9,4 +14,49 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_factory() as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def get_optional_user(
+    db: AsyncSessionDep,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer),
+) -> Optional[User]:
+    """
+    Resolve the user of a Bearer token, or None if no token was sent.
+    Verified claims and users are served from auth_cache, so repeated requests skip
+    signature verification and the database lookup.
+    """
+    if credentials is None:
+        return None
+    claims = auth_cache.verify_token(credentials.credentials)
+    user_id = claims.get("user_id")
+    if user_id is None:
+        raise credentials_exception("Invalid token")
+
+    user = auth_cache.get_user(user_id)
+    if user is None:
+        db_user = await AsyncUserCRUD.get_user_by_id(db, user_id)
+        if db_user is None:
+            auth_cache.invalidate_user(user_id)
+            raise credentials_exception("User not found")
+        user = User(id=db_user.id, email=db_user.email)
+        auth_cache.put_user(user)
+    return user
+
+
+async def get_current_user(user: Optional[User] = Depends(get_optional_user)) -> User:
+    if user is None:
+        raise credentials_exception()
+    return user
+
+
+OptionalUser = Annotated[Optional[User], Depends(get_optional_user)]
+CurrentUser = Annotated[User, Depends(get_current_user)]
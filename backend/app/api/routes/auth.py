@@ -1,11 +1,16 @@
-import aiohttp
+import secrets
+
 from fastapi import APIRouter, HTTPException, status
 from pydantic import EmailStr
 
 from backend.app.models.user import UserLogin
-from backend.app.crud.user import UserCRUD
-from backend.app.api.deps import SessionDep
+from backend.app.crud.user import AsyncUserCRUD
+from backend.app.api.deps import AsyncSessionDep
 from backend.app.utils.jwt_token import generate_jwt_token
+from backend.app.utils.password import PasswordHasherBusy, password_hasher
+from backend.app.utils.auth_cache import auth_cache
+from backend.app.services.captcha_client import CaptchaUnavailable, captcha_client
+from backend.user_service import VerificationRateLimited, store_verification_code
 from pydantic import BaseModel
 from backend.app.core.config import settings
 
@@ -13,6 +18,14 @@ from backend.app.core.config import settings
 router = APIRouter()
 
 
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please retry later",
+        headers={"Retry-After": "1"},
+    )
+
+
 class CaptchaVerification(BaseModel):
     email: EmailStr
     captchaToken: str
@@ -22,21 +35,26 @@ async def verify_captcha(request: CaptchaVerification) -> dict:
     """
     Captcha verification endpoint
     """
-    async with aiohttp.ClientSession() as session:
-        async with session.post(settings.VERIFICATION_ENDPOINT, data={"secret": settings.RE_CAPTCHA_KEY, "response": request.captchaToken}) as response:
-            response_data = await response.json()
-            if response_data["success"]:
-                return {"message": "人机验证通过。"}
-            return {"message": "人机验证失败，请重试。"}
+    try:
+        success = await captcha_client.verify(request.captchaToken)
+    except CaptchaUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="人机验证服务暂时不可用，请稍后重试。",
+            headers={"Retry-After": str(int(settings.CAPTCHA_BREAKER_RESET_SECONDS))},
+        )
+    if success:
+        return {"message": "人机验证通过。"}
+    return {"message": "人机验证失败，请重试。"}
 
 
 @router.post("/api/register")
-async def register(user_data: UserLogin, db: SessionDep):
+async def register(user_data: UserLogin, db: AsyncSessionDep):
     """
     User registration endpoint
     """
     # 检查用户是否已存在
-    existing_user = UserCRUD.get_user_by_email(db, user_data.email)
+    existing_user = await AsyncUserCRUD.get_user_by_email(db, user_data.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -44,7 +62,12 @@ async def register(user_data: UserLogin, db: SessionDep):
         )
     
     try:
-        user = UserCRUD.create_user(db, user_data)
+        password_hash = await password_hasher.hash(user_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+    try:
+        user = await AsyncUserCRUD.create_user(db, user_data, password_hash)
         # 生成token
         token = generate_jwt_token({"user_id": user.id, "username": user.email})
         return {"message": "User registered successfully", "token": token}
@@ -58,15 +81,28 @@ async def register(user_data: UserLogin, db: SessionDep):
 # 发送邮件code
 @router.post("/api/send_verification_code")
 async def send_verification_code(email: EmailStr) -> dict:
-    return {"message": "验证码已发送，请在5分钟内使用。"}
+    code = f"{secrets.randbelow(1000000):06d}"
+    try:
+        store_verification_code(email, code)
+    except VerificationRateLimited as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="验证码请求过于频繁，请稍后再试。",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    minutes = settings.VERIFICATION_CODE_TTL_SECONDS // 60
+    return {"message": f"验证码已发送，请在{minutes}分钟内使用。"}
 
 
 @router.post("/api/login")
-async def login(user_data: UserLogin, db: SessionDep):
+async def login(user_data: UserLogin, db: AsyncSessionDep):
     """
     User login endpoint
     """
-    user = UserCRUD.authenticate_user(db, user_data.email, user_data.password)
+    try:
+        user = await AsyncUserCRUD.authenticate_user(db, user_data.email, user_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -75,4 +111,16 @@ async def login(user_data: UserLogin, db: SessionDep):
     
     # 生成token
     token = generate_jwt_token({"user_id": user.id, "username": user.email})
-    return {"message": "Login successful", "token": token}
\ No newline at end of file
+    return {"message": "Login successful", "token": token}
+
+
+@router.get("/api/auth/stats")
+async def auth_stats() -> dict:
+    """
+    Password hashing executor and auth cache statistics
+    """
+    return {
+        "password_hasher": password_hasher.stats(),
+        "auth_cache": auth_cache.stats(),
+        "captcha_client": captcha_client.stats(),
+    }
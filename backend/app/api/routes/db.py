@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+
+from backend.app.core.db import async_engine, engine, pool_stats
+
+
+router = APIRouter()
+
+
+@router.get("/api/db/pool_stats")
+async def get_pool_stats() -> dict:
+    """
+    Connection pool statistics of the sync and async engines
+    """
+    return {
+        "async": pool_stats(async_engine.pool),
+        "sync": pool_stats(engine.pool),
+    }
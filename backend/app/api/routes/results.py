@@ -0,0 +1,45 @@
+import zipfile
+
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import FileResponse
+from PIL import Image, UnidentifiedImageError
+
+from backend.app.services.image_store import image_store
+
+
+router = APIRouter()
+
+
+@router.get("/api/results/{image_id}")
+async def download_result(image_id: str) -> FileResponse:
+    """
+    Download a tool result by its handle.
+    Supports Range requests, and the file is sent without copying it through Python
+    when the server supports the pathsend extension.
+    """
+    try:
+        path = image_store.open_path(image_id)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Result not found"
+        )
+
+    # 只解析文件头获取格式，不解码像素；批处理结果的压缩包也存放在同一个库中
+    filename = None
+    try:
+        with Image.open(path) as img:
+            media_type = Image.MIME.get(img.format, "application/octet-stream")
+    except UnidentifiedImageError:
+        if zipfile.is_zipfile(path):
+            media_type, filename = "application/zip", f"results-{image_id[:12]}.zip"
+        else:
+            media_type = "application/octet-stream"
+
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        # 内容寻址的结果永远不会改变，可以被长期缓存
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
@@ -1,5 +1,6 @@
 import secrets
 import warnings
+from pathlib import Path
 from typing import Annotated, Any, Literal
 
 from pydantic import (
@@ -16,6 +17,10 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing_extensions import Self
 
 
+# backend/ 目录，用于定位与启动目录无关的数据路径
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
 def parse_cors(v: Any) -> list[str] | str:
     if isinstance(v, str) and not v.startswith("["):
         return [i.strip() for i in v.split(",")]
@@ -57,6 +62,13 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = "admin"
     POSTGRES_DB: str = "test_db"
 
+    # 数据库连接池
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
     @computed_field  # type: ignore[prop-decorator]
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
@@ -96,6 +108,145 @@ class Settings(BaseSettings):
     #FIRST_SUPERUSER_PASSWORD: str
     RE_CAPTCHA_KEY: str | None = None
     VERIFICATION_ENDPOINT: str = ""
+    # 人机验证客户端：连接池、超时、熔断和结果缓存
+    CAPTCHA_TIMEOUT_SECONDS: float = 5.0
+    CAPTCHA_POOL_SIZE: int = 20
+    CAPTCHA_KEEPALIVE_SECONDS: float = 30.0
+    CAPTCHA_BREAKER_FAILURES: int = 5
+    CAPTCHA_BREAKER_RESET_SECONDS: float = 30.0
+    CAPTCHA_VERDICT_TTL_SECONDS: float = 120.0
+    CAPTCHA_VERDICT_CACHE_SIZE: int = 10000
+
+    # 验证码与内存用户服务使用的键值存储；KV_STORE_URL 设为 redis:// 地址时改用 Redis
+    KV_STORE_URL: str | None = None
+    # 内存存储的容量上限：键数量和键值的估算字节数，任一超出时按 LRU 淘汰
+    KV_STORE_MAX_KEYS: int = 100000
+    KV_STORE_MAX_BYTES: int = 64 * 1024 * 1024
+    KV_STORE_SHARDS: int = 16
+    VERIFICATION_CODE_TTL_SECONDS: int = 600
+    # 每个邮箱在一个窗口内最多可获取的验证码数量
+    VERIFICATION_CODE_RATE_LIMIT: int = 5
+    VERIFICATION_CODE_RATE_WINDOW_SECONDS: int = 3600
+
+    # 密码哈希：修改迭代次数后，旧哈希会在用户下次登录时自动升级
+    PASSWORD_HASH_ITERATIONS: int = 100000
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # 认证依赖的 token / 用户缓存
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: float = 30.0
+    # 开启后 /agent/image_process 需要携带有效的 Bearer token
+    AGENT_REQUIRE_AUTH: bool = False
+    # Agent 任务调度：同时运行的任务数、排队上限（总数 / 每个用户）
+    AGENT_MAX_CONCURRENCY: int = 2
+    AGENT_MAX_QUEUE: int = 32
+    AGENT_MAX_QUEUE_PER_USER: int = 4
+    # 快速路径（不调用 LLM 的简单指令）使用独立的调度器，不与 Agent 任务争用名额；
+    # 图片计算的并发和内存仍由 MCP 服务的工作池限制
+    FAST_PATH_MAX_CONCURRENCY: int = 16
+    FAST_PATH_MAX_QUEUE: int = 64
+    FAST_PATH_MAX_QUEUE_PER_USER: int = 8
+    # 批处理：单次最多上传的图片数量、同时处理的图片数量
+    BATCH_MAX_FILES: int = 100
+    BATCH_CONCURRENCY: int = 8
+
+    # 上传图片的内容寻址存储，主服务与 MCP 工具服务共享同一目录
+    IMAGE_STORE_DIR: str = str(BACKEND_DIR / "data" / "images")
+    IMAGE_STORE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    # 上传限制：单个文件大小、图片尺寸和像素数（防止解压炸弹）、允许的格式
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    # 整个请求体的上限（批处理会一次上传多个文件）
+    UPLOAD_MAX_REQUEST_BYTES: int = 512 * 1024 * 1024
+    UPLOAD_MAX_DIMENSION: int = 20000
+    UPLOAD_MAX_PIXELS: int = 400_000_000
+    UPLOAD_ALLOWED_FORMATS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = [
+        "PNG", "JPEG", "WEBP", "GIF", "BMP", "TIFF",
+    ]
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    # MCP 工具服务中已解码图片的内存缓存上限（进程模式下平分给各工作进程）
+    DECODED_IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    # 超过该像素数的图片改用分块处理：裁剪和缩放逐条带解码，不进入解码缓存
+    TILED_PIXEL_THRESHOLD: int = 40_000_000
+    # 处理单张大图时允许使用的内存上限，超出时拒绝处理而不是耗尽内存
+    TILED_MEMORY_CEILING_BYTES: int = 512 * 1024 * 1024
+
+    # MCP 工具服务执行图片计算的工作池。thread：Pillow 在缩放、滤镜和编解码时释放 GIL，
+    # 所有线程共享一个解码缓存；process：不受 GIL 限制、工作进程定期替换以回收内存，
+    # 但每个进程各有一份解码缓存（预算平分、进程被替换时缓存丢失、命中率不计入 /stats）
+    WORKER_POOL_KIND: Literal["process", "thread"] = "thread"
+    # 0 表示使用全部 CPU 核心
+    WORKER_POOL_SIZE: int = 0
+    WORKER_POOL_MAX_QUEUE: int = 64
+    WORKER_POOL_TASK_TIMEOUT: float = 60.0
+    # 进程模式下每个工作进程处理多少个任务后被替换
+    WORKER_POOL_MAX_TASKS_PER_CHILD: int = 200
+
+    # 工具结果缓存：输入图片、操作参数和输出编码都相同的调用直接复用结果；内存层在前，磁盘层按大小做 LRU 淘汰
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MEMORY_BYTES: int = 128 * 1024 * 1024
+    RESULT_CACHE_DIR: str = str(BACKEND_DIR / "data" / "results")
+    RESULT_CACHE_DISK_MAX_BYTES: int = 1024 * 1024 * 1024
+
+    # 工具返回结果的方式：handle 写入图片库并返回引用，bytes 直接返回图片字节
+    TOOL_RESULT_MODE: Literal["handle", "bytes"] = "handle"
+
+    # 输出图片编码：source 表示沿用输入图片的格式；预设可选 fast / balanced / smallest
+    OUTPUT_FORMAT: Literal["source", "PNG", "JPEG", "WEBP"] = "source"
+    OUTPUT_PRESET: Literal["fast", "balanced", "smallest"] = "balanced"
+    # 以下参数留空时使用预设中的值
+    OUTPUT_PNG_COMPRESS_LEVEL: int | None = None
+    OUTPUT_JPEG_QUALITY: int | None = None
+    OUTPUT_JPEG_OPTIMIZE: bool | None = None
+    OUTPUT_JPEG_PROGRESSIVE: bool | None = None
+    OUTPUT_WEBP_QUALITY: int | None = None
+    OUTPUT_WEBP_METHOD: int | None = None
+    # 工具执行期间先返回的低分辨率预览（仅在调用方请求进度通知时生成）
+    PREVIEW_ENABLED: bool = True
+    PREVIEW_MAX_SIDE: int = 512
+    PREVIEW_FORMAT: Literal["JPEG", "WEBP"] = "JPEG"
+    PREVIEW_QUALITY: int = 70
+
+    # SSE 推送：连续的 token 按字符数或时间合并成一帧；空闲时定期发送心跳（注释帧）
+    SSE_COALESCE_MAX_CHARS: int = 256
+    SSE_COALESCE_MAX_DELAY_SECONDS: float = 0.1
+    SSE_PING_SECONDS: float = 15.0
+
+    # 请求总耗时超过该秒数时打印各阶段的耗时树（span 树），0 表示关闭；各阶段耗时另外导出到 /metrics
+    SLOW_REQUEST_LOG_SECONDS: float = 0.0
+
+    # 简单指令绕过 LLM 直接执行，解析置信度低于阈值时回退到 Agent
+    FAST_ROUTER_ENABLED: bool = True
+    FAST_ROUTER_MIN_CONFIDENCE: float = 0.9
+    # 快速路由生成的操作输出超过该像素数时不直接执行，交给 Agent
+    FAST_ROUTER_MAX_OUTPUT_PIXELS: int = 50_000_000
+
+    # Agent 工具调用计划缓存，命中时直接重放工具调用，不再调用 LLM
+    PLAN_CACHE_ENABLED: bool = True
+    PLAN_CACHE_PATH: str = str(BACKEND_DIR / "data" / "plan_cache.sqlite3")
+    PLAN_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    PLAN_CACHE_MAX_ENTRIES: int = 10000
+
+    # Agent 后端：可配置多个 Ollama / MCP 工具服务地址（逗号分隔），按最少未完成请求负载均衡
+    LLM_MODEL: str = "modelscope.cn/unsloth/Qwen3-Coder-30B-A3B-Instruct-GGUF:UD-TQ1_0"
+    LLM_ENDPOINTS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = ["http://localhost:11434"]
+    MCP_ENDPOINTS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = ["http://localhost:8000/mcp"]
+    # 每个 MCP 服务保持的持久会话数
+    MCP_SESSIONS_PER_ENDPOINT: int = 2
+    MCP_CALL_TIMEOUT_SECONDS: float = 120.0
+    # 健康检查间隔；连续失败达到次数后摘除节点一段时间
+    BACKEND_HEALTH_CHECK_INTERVAL_SECONDS: float = 10.0
+    BACKEND_EJECT_AFTER_FAILURES: int = 3
+    BACKEND_EJECT_SECONDS: float = 30.0
+
+    # 启动：服务先开始监听，MCP 连接、模型预热和 Agent 构建在后台并发进行，全部完成后 /ready 返回 200
+    # 模型在 Ollama 中保持加载的时长（Ollama 的 keep_alive 格式，如 "30m"；负值如 "-1m" 表示一直保持）
+    LLM_KEEP_ALIVE: str = "30m"
+    # 预热请求的超时，需覆盖大模型从磁盘加载的时间
+    LLM_WARMUP_TIMEOUT_SECONDS: float = 300.0
+    # MCP 服务或 Ollama 启动时不可达时的重试间隔
+    STARTUP_RETRY_SECONDS: float = 5.0
 
     def _check_default_secret(self, var_name: str, value: str | None) -> None:
         if value == "changethis":
@@ -1,6 +1,34 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from backend.app.core.config import settings
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 
+_pool_options = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI), **_pool_options)
+
+# 异步引擎：同一个 postgresql+psycopg URL 在 create_async_engine 下使用 psycopg 的异步驱动
+async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI), **_pool_options)
+
+async_session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def pool_stats(pool) -> dict:
+    """
+    Snapshot of a SQLAlchemy connection pool.
+    """
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "status": pool.status(),
+    }
@@ -1,35 +1,37 @@
-import hashlib
-import secrets
 from typing import Optional
 from backend.app.models.user import UserTable, UserLogin, User
+from backend.app.utils.password import (
+    hash_password,
+    needs_rehash,
+    password_hasher,
+    verify_password,
+)
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import EmailStr
 
 
 class UserCRUD:
     @staticmethod
-    def hash_password(password: str, salt: str | None = None) -> tuple[str, str]:
+    def hash_password(password: str) -> str:
         """
-        Hash a password with a salt.
-        Returns tuple of (hashed_password, salt).
+        Hash a password into the versioned ``algo$iterations$salt$hash`` format.
+        Blocks for the whole key derivation; use password_hasher from async code.
         """
-        if salt is None:
-            salt = secrets.token_hex(16)
-        pwdhash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000)
-        return pwdhash.hex(), salt
+        return hash_password(password)
     
     @staticmethod
-    def verify_password(stored_password_hash: str, salt: str, provided_password: str) -> bool:
+    def verify_password(stored_password_hash: str, provided_password: str) -> bool:
         """
         Verify a stored password hash against one provided by user
         """
-        pwdhash, _ = UserCRUD.hash_password(provided_password, salt)
-        return pwdhash == stored_password_hash
+        return verify_password(stored_password_hash, provided_password)
 
     @staticmethod
-    def create_user(db: Session, user_login: UserLogin) -> User:
-        password_hash, salt = UserCRUD.hash_password(user_login.password)
-        user = UserTable(email=user_login.email, password_hash=f"{password_hash}:{salt}")
+    def create_user(db: Session, user_login: UserLogin, password_hash: str | None = None) -> User:
+        if password_hash is None:
+            password_hash = UserCRUD.hash_password(user_login.password)
+        user = UserTable(email=user_login.email, password_hash=password_hash)
         db.add(user)
         db.commit()
         db.refresh(user)
@@ -51,17 +53,53 @@ class UserCRUD:
         statement = select(UserTable).where(UserTable.id == user_id)
         return db.exec(statement).first()
 
+
+class AsyncUserCRUD:
+    """
+    UserCRUD 的异步版本，查询不会阻塞事件循环
+    """
+
+    @staticmethod
+    async def create_user(db: AsyncSession, user_login: UserLogin, password_hash: str | None = None) -> User:
+        if password_hash is None:
+            password_hash = await password_hasher.hash(user_login.password)
+        user = UserTable(email=user_login.email, password_hash=password_hash)
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        return user
+
+    @staticmethod
+    async def get_user_by_email(db: AsyncSession, email: EmailStr) -> Optional[UserTable]:
+        """
+        根据邮箱查询用户
+        """
+        statement = select(UserTable).where(UserTable.email == email)
+        return (await db.exec(statement)).first()
+
     @staticmethod
-    def authenticate_user(db: Session, email: EmailStr, password: str) -> Optional[UserTable]:
+    async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[UserTable]:
+        """
+        根据ID查询用户
         """
-        验证用户身份
+        statement = select(UserTable).where(UserTable.id == user_id)
+        return (await db.exec(statement)).first()
+
+    @staticmethod
+    async def authenticate_user(db: AsyncSession, email: EmailStr, password: str) -> Optional[UserTable]:
         """
-        user = UserCRUD.get_user_by_email(db, email)
+        验证用户身份，哈希计算在独立线程池中进行，不阻塞事件循环
+        """
+        user = await AsyncUserCRUD.get_user_by_email(db, email)
         if not user:
             return None
-        
-        # 分离存储的哈希和盐
-        stored_hash, salt = user.password_hash.split(':', 1)
-        if UserCRUD.verify_password(stored_hash, salt, password):
-            return user
-        return None
\ No newline at end of file
+
+        if not await password_hasher.verify(user.password_hash, password):
+            return None
+
+        # 旧格式或迭代次数已调整的哈希在登录成功时升级，无需数据迁移
+        if needs_rehash(user.password_hash):
+            user.password_hash = await password_hasher.hash(password)
+            db.add(user)
+            await db.commit()
+        return user
@@ -0,0 +1,47 @@
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from backend.app.services.metrics import agent_iterations
+from backend.app.services.tracing import Span, current_span
+
+
+class AgentTracer(AsyncCallbackHandler):
+    """
+    Callback handler that records one ``llm`` span per reasoning step of an agent run
+    and counts the steps in ``agent_iterations``.
+    """
+
+    def __init__(self, parent: Span | None = None):
+        self.parent = parent or current_span()
+        self._spans: dict[UUID, Span] = {}
+
+    def _start(self, run_id: UUID) -> None:
+        agent_iterations.inc()
+        self._spans[run_id] = self.parent.child("llm") if self.parent is not None else Span("llm")
+
+    def _end(self, run_id: UUID, error: BaseException | None = None) -> None:
+        span_ = self._spans.pop(run_id, None)
+        if span_ is not None:
+            span_.finish(error)
+
+    async def on_chat_model_start(self, serialized: dict[str, Any], messages: list, *, run_id: UUID,
+                                  **kwargs: Any) -> None:
+        self._start(run_id)
+
+    async def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID,
+                           **kwargs: Any) -> None:
+        self._start(run_id)
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        span_ = self._spans.get(run_id)
+        if span_ is not None and "first_token_ms" not in span_.attrs:
+            span_.attrs["first_token_ms"] = round((time.perf_counter() - span_.start) * 1000, 1)
+
+    async def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
@@ -0,0 +1,142 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Generic, Iterator, TypeVar
+
+
+T = TypeVar("T")
+
+
+class NoHealthyEndpoint(RuntimeError):
+    """
+    Raised when a pool has no endpoints at all.
+    """
+
+
+class Endpoint(Generic[T]):
+    """
+    One backend server and the client object used to talk to it.
+    """
+
+    def __init__(self, url: str, client: T):
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class EndpointPool(Generic[T]):
+    """
+    Client-side load balancer over several equivalent backends.
+
+    Each request goes to the healthy endpoint with the fewest outstanding
+    requests (ties are broken randomly). An endpoint is ejected for
+    ``eject_seconds`` after ``eject_after_failures`` consecutive failures, or
+    when the periodic health check fails, and rejoins once a health check
+    passes. If every endpoint is ejected, requests are still spread over all
+    of them rather than failing outright.
+    """
+
+    def __init__(self, name: str, endpoints: list[Endpoint[T]], eject_after_failures: int, eject_seconds: float):
+        if not endpoints:
+            raise NoHealthyEndpoint(f"No endpoints configured for {name}")
+        self.name = name
+        self.endpoints = endpoints
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self._health_task: asyncio.Task | None = None
+
+    def pick(self, exclude: list[Endpoint[T]] | None = None) -> Endpoint[T]:
+        exclude = exclude or []
+        candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+        candidates = [e for e in candidates if e.healthy] or candidates
+        least = min(e.outstanding for e in candidates)
+        return random.choice([e for e in candidates if e.outstanding == least])
+
+    @contextmanager
+    def lease(self, exclude: list[Endpoint[T]] | None = None) -> Iterator[Endpoint[T]]:
+        """
+        Pick an endpoint, preferring those not in ``exclude``, and count the
+        request against it while the block runs. Exceptions raised in the
+        block count as endpoint failures.
+        """
+        endpoint = self.pick(exclude)
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        try:
+            yield endpoint
+        except Exception:
+            self.record_failure(endpoint)
+            raise
+        else:
+            endpoint.consecutive_failures = 0
+        finally:
+            endpoint.outstanding -= 1
+
+    def record_failure(self, endpoint: Endpoint[T]) -> None:
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.eject_after_failures:
+            self.eject(endpoint)
+
+    def eject(self, endpoint: Endpoint[T]) -> None:
+        endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    def start_health_checks(self, check: Callable[[Endpoint[T]], Awaitable[bool]], interval: float) -> None:
+        """
+        Run ``check`` against every endpoint every ``interval`` seconds in the background.
+        """
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop(check, interval))
+
+    async def check_health(self, check: Callable[[Endpoint[T]], Awaitable[bool]]) -> None:
+        async def check_one(endpoint: Endpoint[T]) -> None:
+            try:
+                ok = await check(endpoint)
+            except Exception:
+                ok = False
+            if ok:
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_until = 0.0
+            else:
+                self.eject(endpoint)
+
+        await asyncio.gather(*(check_one(e) for e in self.endpoints))
+
+    async def _health_loop(self, check: Callable[[Endpoint[T]], Awaitable[bool]], interval: float) -> None:
+        while True:
+            await self.check_health(check)
+            await asyncio.sleep(interval)
+
+    async def stop_health_checks(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "healthy": sum(e.healthy for e in self.endpoints),
+            "endpoints": [e.stats() for e in self.endpoints],
+        }
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+from backend.app.core.config import settings
+
+
+class CaptchaUnavailable(RuntimeError):
+    """
+    Raised when the verification endpoint is failing or the circuit breaker is open.
+    """
+
+
+class CaptchaClient:
+    """
+    Shared HTTP client for captcha verification.
+
+    One aiohttp session with a pooled keep-alive connector is reused for all
+    requests and closed with the application lifespan. Every call has strict
+    timeouts. After ``breaker_failures`` consecutive failures the circuit opens
+    and requests fail fast for ``breaker_reset_seconds``; then one trial request
+    is let through. Verdicts are cached briefly per token, and concurrent
+    requests for the same token share a single upstream call, so a retried or
+    double-submitted token is verified only once.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        secret: str | None,
+        timeout_seconds: float,
+        pool_size: int,
+        keepalive_seconds: float,
+        breaker_failures: int,
+        breaker_reset_seconds: float,
+        verdict_ttl_seconds: float,
+        verdict_cache_size: int,
+    ):
+        self.endpoint = endpoint
+        self.secret = secret
+        self.timeout_seconds = timeout_seconds
+        self.pool_size = pool_size
+        self.keepalive_seconds = keepalive_seconds
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.verdict_ttl_seconds = verdict_ttl_seconds
+        self.verdict_cache_size = verdict_cache_size
+        self._session: aiohttp.ClientSession | None = None
+        # token 摘要 -> (结果, 过期时间)
+        self._verdicts: OrderedDict[str, tuple[bool, float]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._consecutive_failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self.upstream_calls = 0
+        self.cache_hits = 0
+        self.failures = 0
+        self.short_circuited = 0
+
+    async def start(self) -> None:
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            keepalive_timeout=self.keepalive_seconds,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.timeout_seconds,
+            connect=self.timeout_seconds / 2,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.breaker_reset_seconds:
+            return "half_open"
+        return "open"
+
+    async def verify(self, token: str) -> bool:
+        """
+        Return whether the captcha token is valid.
+        Raises CaptchaUnavailable if the endpoint cannot be reached or the circuit is open.
+        """
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        cached = self._verdicts.get(key)
+        if cached is not None:
+            if cached[1] > now:
+                self.cache_hits += 1
+                return cached[0]
+            del self._verdicts[key]
+
+        # 同一个 token 的并发请求共享一次上游调用
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.cache_hits += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            verdict = await self._call_upstream(token)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # 避免没有其他等待者时出现 "exception was never retrieved" 警告
+                future.exception()
+            raise
+        else:
+            future.set_result(verdict)
+            self._remember(key, verdict)
+            return verdict
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _call_upstream(self, token: str) -> bool:
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            self.short_circuited += 1
+            raise CaptchaUnavailable("Captcha verification is temporarily unavailable")
+
+        await self.start()
+        self._trial_in_flight = state == "half_open"
+        self.upstream_calls += 1
+        try:
+            async with self._session.post(
+                self.endpoint,
+                data={"secret": self.secret or "", "response": token},
+            ) as response:
+                if response.status >= 500:
+                    raise CaptchaUnavailable(f"Verification endpoint returned {response.status}")
+                response_data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, CaptchaUnavailable, ValueError) as e:
+            self._record_failure()
+            if isinstance(e, CaptchaUnavailable):
+                raise
+            raise CaptchaUnavailable(f"Captcha verification failed: {e}") from e
+        finally:
+            self._trial_in_flight = False
+
+        self._consecutive_failures = 0
+        self._opened_at = None
+        return bool(response_data.get("success"))
+
+    def _record_failure(self) -> None:
+        self.failures += 1
+        self._consecutive_failures += 1
+        if self._opened_at is not None or self._consecutive_failures >= self.breaker_failures:
+            # 半开状态下的试探请求失败，或连续失败达到阈值：打开熔断器
+            self._opened_at = time.monotonic()
+
+    def _remember(self, key: str, verdict: bool) -> None:
+        self._verdicts[key] = (verdict, time.monotonic() + self.verdict_ttl_seconds)
+        self._verdicts.move_to_end(key)
+        while len(self._verdicts) > self.verdict_cache_size:
+            self._verdicts.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "upstream_calls": self.upstream_calls,
+            "cache_hits": self.cache_hits,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "cached_verdicts": len(self._verdicts),
+        }
+
+
+captcha_client = CaptchaClient(
+    endpoint=settings.VERIFICATION_ENDPOINT,
+    secret=settings.RE_CAPTCHA_KEY,
+    timeout_seconds=settings.CAPTCHA_TIMEOUT_SECONDS,
+    pool_size=settings.CAPTCHA_POOL_SIZE,
+    keepalive_seconds=settings.CAPTCHA_KEEPALIVE_SECONDS,
+    breaker_failures=settings.CAPTCHA_BREAKER_FAILURES,
+    breaker_reset_seconds=settings.CAPTCHA_BREAKER_RESET_SECONDS,
+    verdict_ttl_seconds=settings.CAPTCHA_VERDICT_TTL_SECONDS,
+    verdict_cache_size=settings.CAPTCHA_VERDICT_CACHE_SIZE,
+)
@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from backend.app.core.config import settings
+from backend.app.services.tracing import span
+
+
+def estimate_bytes(mode: str, size: tuple[int, int]) -> int:
+    """
+    Estimate the memory a decoded image of ``mode`` and ``size`` would hold, without allocating it.
+    Pillow stores 1-byte modes as-is, 16-bit modes in 2 bytes and everything else in 4 bytes per pixel.
+    """
+    if mode in ("1", "L", "P"):
+        bytes_per_pixel = 1
+    elif mode.startswith("I;16"):
+        bytes_per_pixel = 2
+    else:
+        bytes_per_pixel = 4
+    return size[0] * size[1] * bytes_per_pixel
+
+
+def estimate_image_bytes(img: Image.Image) -> int:
+    """
+    Estimate the memory held by a decoded image.
+    """
+    return estimate_bytes(img.mode, img.size)
+
+
+class DecodedImageCache:
+    """
+    Process-wide LRU cache of decoded images.
+
+    Entries are keyed by (path, mtime, size) so a rewritten file is decoded
+    again, and the total decoded size is kept under ``max_bytes``. Callers get
+    read-only views that share the cached pixel buffer; Pillow copies the
+    buffer on the first mutating call, so the cached bitmap is never changed.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (decoded image, estimated bytes), ordered from least to most recently used
+        self._entries: OrderedDict[tuple[str, int, int], tuple[Image.Image, int]] = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _view(img: Image.Image) -> Image.Image:
+        view = img._new(img.im)
+        # readonly 会让 paste/putpixel 等修改操作先复制像素缓冲区（写时复制）
+        view.readonly = 1
+        view.format = img.format
+        return view
+
+    def get(self, path: str | os.PathLike) -> Image.Image:
+        """
+        Return a copy-on-write view of the decoded image at ``path``.
+        """
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._view(entry[0])
+            self.misses += 1
+
+        # 解码在锁外进行，避免大图解码阻塞其他线程的缓存命中
+        with span("decode"), Image.open(path) as opened:
+            opened.load()
+            img = opened._new(opened.im)
+            img.format = opened.format
+        size = estimate_image_bytes(img)
+
+        if size <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = (img, size)
+                    self._total_bytes += size
+                    self._evict()
+        return self._view(img)
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+decoded_image_cache = DecodedImageCache(settings.DECODED_IMAGE_CACHE_MAX_BYTES)
@@ -0,0 +1,122 @@
+from io import BytesIO
+from typing import Any
+
+from PIL import Image
+
+from backend.app.core.config import settings
+from backend.app.services.tracing import span
+
+
+ENCODABLE_FORMATS = ("PNG", "JPEG", "WEBP")
+
+_FORMAT_ALIASES = {"JPG": "JPEG", "PNG": "PNG", "JPEG": "JPEG", "WEBP": "WEBP"}
+
+# 各预设下的编码参数：fast 优先速度，smallest 优先体积，balanced 介于两者之间
+PRESETS: dict[str, dict[str, dict[str, Any]]] = {
+    "fast": {
+        "PNG": {"compress_level": 1},
+        "JPEG": {"quality": 85, "optimize": False, "progressive": False},
+        "WEBP": {"quality": 80, "method": 0},
+    },
+    "balanced": {
+        "PNG": {"compress_level": 6},
+        "JPEG": {"quality": 88, "optimize": True, "progressive": False},
+        "WEBP": {"quality": 85, "method": 4},
+    },
+    "smallest": {
+        "PNG": {"compress_level": 9, "optimize": True},
+        "JPEG": {"quality": 80, "optimize": True, "progressive": True},
+        "WEBP": {"quality": 75, "method": 6},
+    },
+}
+
+
+def normalize_format(name: str | None) -> str | None:
+    """
+    Map a user-facing format name (``jpg``, ``webp``, ...) to the Pillow format name.
+    Raises ValueError for formats the encoder does not produce.
+    """
+    if not name:
+        return None
+    image_format = _FORMAT_ALIASES.get(name.strip().upper().lstrip("."))
+    if image_format is None:
+        raise ValueError(f"Unsupported output format: {name}. Use one of {', '.join(ENCODABLE_FORMATS)}")
+    return image_format
+
+
+def resolve_format(source_format: str | None, output_format: str | None = None) -> str:
+    """
+    Pick the output format: the requested one, else the configured one, else the input's format.
+    Inputs in formats the encoder does not produce (GIF, BMP, TIFF) fall back to PNG.
+    """
+    requested = normalize_format(output_format)
+    if requested:
+        return requested
+    if settings.OUTPUT_FORMAT != "source":
+        return settings.OUTPUT_FORMAT
+    return source_format if source_format in ENCODABLE_FORMATS else "PNG"
+
+
+def encoder_options(image_format: str, preset: str | None = None) -> dict[str, Any]:
+    """
+    Encoder keyword arguments for a format: the preset, overridden by explicitly configured settings.
+    """
+    preset = preset or settings.OUTPUT_PRESET
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown encoding preset: {preset}. Use one of {', '.join(PRESETS)}")
+    options = dict(PRESETS[preset][image_format])
+    overrides = {
+        "PNG": {"compress_level": settings.OUTPUT_PNG_COMPRESS_LEVEL},
+        "JPEG": {
+            "quality": settings.OUTPUT_JPEG_QUALITY,
+            "optimize": settings.OUTPUT_JPEG_OPTIMIZE,
+            "progressive": settings.OUTPUT_JPEG_PROGRESSIVE,
+        },
+        "WEBP": {"quality": settings.OUTPUT_WEBP_QUALITY, "method": settings.OUTPUT_WEBP_METHOD},
+    }[image_format]
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+def _convert_for(img: Image.Image, image_format: str) -> Image.Image:
+    """
+    Convert to a mode the target format can store.
+    """
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+    if image_format == "JPEG":
+        if img.mode in ("L", "RGB", "CMYK"):
+            return img
+        return img.convert("L" if img.mode in ("1", "LA") else "RGB")
+    if image_format == "WEBP":
+        if img.mode in ("RGB", "RGBA"):
+            return img
+        return img.convert("RGBA" if has_alpha else "RGB")
+    if img.mode in ("1", "L", "LA", "P", "RGB", "RGBA", "I", "I;16"):
+        return img
+    return img.convert("RGBA" if has_alpha else "RGB")
+
+
+def encode_image(img: Image.Image, source_format: str | None = None,
+                 output_format: str | None = None, preset: str | None = None) -> tuple[bytes, str]:
+    """
+    Encode an image and return the bytes and the Pillow format name used.
+    """
+    image_format = resolve_format(source_format, output_format)
+    output_stream = BytesIO()
+    with span("encode", format=image_format):
+        _convert_for(img, image_format).save(output_stream, format=image_format, **encoder_options(image_format, preset))
+    return output_stream.getvalue(), image_format
+
+
+def encode_preview(img: Image.Image) -> tuple[bytes, str]:
+    """
+    Encode a low-resolution preview with the cheapest settings of the preview format.
+    """
+    image_format = settings.PREVIEW_FORMAT
+    options: dict[str, Any] = {"quality": settings.PREVIEW_QUALITY}
+    if image_format == "WEBP":
+        options["method"] = 0
+    output_stream = BytesIO()
+    with span("encode_preview", format=image_format):
+        _convert_for(img, image_format).save(output_stream, format=image_format, **options)
+    return output_stream.getvalue(), image_format
@@ -0,0 +1,289 @@
+import math
+from dataclasses import dataclass, field
+from typing import Any
+
+from PIL import Image
+
+from backend.app.services.pixel_ops import POINT_OPERATIONS, apply_pixel_operation
+
+
+# 每种操作需要的参数及其类型
+OPERATION_PARAMS: dict[str, dict[str, type]] = {
+    "resize": {"width": int, "height": int},
+    "crop": {"left": int, "upper": int, "right": int, "lower": int},
+    "rotate": {"angle": float},
+    "brightness": {"factor": float},
+    "contrast": {"factor": float},
+    "gamma": {"gamma": float},
+    "levels": {"black": int, "white": int, "gamma": float},
+    "curves": {"points": list},
+    "grayscale": {},
+    "sepia": {},
+    "channel_mix": {"matrix": list},
+    "blur": {"radius": float},
+    "sharpen": {"amount": float, "radius": float},
+}
+
+# 可以省略的参数及其默认值
+OPERATION_DEFAULTS: dict[str, dict[str, Any]] = {
+    "levels": {"gamma": 1.0},
+    "sharpen": {"radius": 2.0},
+}
+
+# 模糊和锐化的半径上限（像素），限制单次调用的计算量
+MAX_FILTER_RADIUS = 100.0
+
+Box = tuple[float, float, float, float]
+
+
+@dataclass
+class PipelineStep:
+    """
+    A single fused step of an image pipeline.
+
+    ``resize`` steps carry the target ``size`` and an optional source ``box``,
+    ``crop`` steps carry ``box`` and ``rotate`` steps carry ``angle``.
+    Pixel steps carry their operation's parameters in ``params``; a ``point``
+    step holds consecutive point operations under ``params["operations"]``.
+    """
+    op: str
+    size: tuple[int, int] | None = None
+    box: Box | None = None
+    angle: float = 0.0
+    params: dict[str, Any] = field(default_factory=dict)
+
+
+def _points(value: Any) -> list[list[float]]:
+    points = [[float(x), float(y)] for x, y in value]
+    if len(points) < 2:
+        raise ValueError("Curves need at least two points")
+    if any(not (0 <= v <= 255) for point in points for v in point):
+        raise ValueError("Curve points must be within 0-255")
+    if len({x for x, _ in points}) != len(points):
+        raise ValueError("Curve points must have distinct x values")
+    return sorted(points)
+
+
+def _matrix(value: Any) -> list[list[float]]:
+    matrix = [[float(v) for v in row] for row in value]
+    if len(matrix) != 3 or any(len(row) != 3 for row in matrix):
+        raise ValueError("Channel mix matrix must be 3x3")
+    return matrix
+
+
+def normalize_operation(operation: dict[str, Any]) -> dict[str, Any]:
+    """
+    Validate a single operation dict and coerce its parameters.
+    """
+    name = operation.get("op")
+    if name not in OPERATION_PARAMS:
+        raise ValueError(f"Unknown operation: {name!r}, expected one of {sorted(OPERATION_PARAMS)}")
+    normalized: dict[str, Any] = {"op": name}
+    defaults = OPERATION_DEFAULTS.get(name, {})
+    for param, param_type in OPERATION_PARAMS[name].items():
+        if param not in operation and param not in defaults:
+            raise ValueError(f"Operation {name!r} is missing parameter {param!r}")
+        value = operation.get(param, defaults.get(param))
+        if param == "points":
+            normalized[param] = _points(value)
+        elif param == "matrix":
+            normalized[param] = _matrix(value)
+        else:
+            normalized[param] = param_type(value)
+    if name == "resize" and (normalized["width"] <= 0 or normalized["height"] <= 0):
+        raise ValueError("Resize width and height must be positive")
+    if name == "crop" and (normalized["right"] <= normalized["left"] or normalized["lower"] <= normalized["upper"]):
+        raise ValueError("Crop box must have a positive width and height")
+    if normalized.get("factor", 0) < 0 or normalized.get("amount", 0) < 0:
+        raise ValueError(f"Operation {name!r} needs non-negative parameters")
+    if normalized.get("gamma", 1) <= 0:
+        raise ValueError("Gamma must be positive")
+    if name == "levels" and not 0 <= normalized["black"] < normalized["white"] <= 255:
+        raise ValueError("Levels need 0 <= black < white <= 255")
+    if "radius" in normalized and not 0 < normalized["radius"] <= MAX_FILTER_RADIUS:
+        raise ValueError(f"Radius must be in (0, {MAX_FILTER_RADIUS:g}]")
+    return normalized
+
+
+def output_size(operations: list[dict[str, Any]], size: tuple[int, int]) -> tuple[int, int]:
+    """
+    Size of the image after running ``operations`` on an image of ``size``, without touching pixels.
+    """
+    width, height = size
+    for operation in map(normalize_operation, operations):
+        if operation["op"] == "resize":
+            width, height = operation["width"], operation["height"]
+        elif operation["op"] == "crop":
+            width, height = operation["right"] - operation["left"], operation["lower"] - operation["upper"]
+        elif operation["op"] == "rotate":
+            # expand=True 时旋转后的尺寸是原图的外接矩形
+            angle = math.radians(operation["angle"])
+            cos, sin = abs(math.cos(angle)), abs(math.sin(angle))
+            width, height = round(width * cos + height * sin), round(width * sin + height * cos)
+    return width, height
+
+
+def step_output_size(step: PipelineStep, size: tuple[int, int]) -> tuple[int, int]:
+    """
+    Size of the image after running one pipeline step on an image of ``size``.
+    """
+    if step.op == "resize":
+        return step.size
+    if step.op == "crop":
+        left, upper, right, lower = (int(v) for v in step.box)
+        return right - left, lower - upper
+    if step.op == "rotate":
+        return output_size([{"op": "rotate", "angle": step.angle}], size)
+    return size
+
+
+def scale_operations(operations: list[dict[str, Any]], scale: float) -> list[dict[str, Any]]:
+    """
+    Scale the pixel parameters of ``operations`` so they can run on a proportionally smaller image.
+    """
+    scaled = []
+    for operation in map(normalize_operation, operations):
+        if operation["op"] == "resize":
+            operation["width"] = max(1, round(operation["width"] * scale))
+            operation["height"] = max(1, round(operation["height"] * scale))
+        elif operation["op"] == "crop":
+            for param in ("left", "upper", "right", "lower"):
+                operation[param] = round(operation[param] * scale)
+            operation["right"] = max(operation["right"], operation["left"] + 1)
+            operation["lower"] = max(operation["lower"], operation["upper"] + 1)
+        elif "radius" in operation:
+            # 模糊和锐化的半径以像素计，缩小的图片上按比例缩小才有相同的视觉效果
+            operation["radius"] = operation["radius"] * scale
+        scaled.append(operation)
+    return scaled
+
+
+def _within(box: Box, size: tuple[int, int] | None) -> bool:
+    if size is None:
+        return False
+    left, upper, right, lower = box
+    return left >= 0 and upper >= 0 and right <= size[0] and lower <= size[1]
+
+
+def _is_right_angle(angle: float) -> bool:
+    return angle % 90 == 0
+
+
+def plan_operations(operations: list[dict[str, Any]], size: tuple[int, int]) -> list[PipelineStep]:
+    """
+    Turn an ordered list of operations into fused pipeline steps.
+
+    Adjacent geometric steps are merged where the result is unchanged up to
+    resampling rounding: crop + crop becomes one crop, crop + resize becomes
+    ``resize(box=...)``, resize + crop narrows the resize box, a resize that
+    does not enlarge the previous resize replaces it, and right-angle
+    rotations are summed. Consecutive point
+    operations (brightness, contrast, gamma, levels, curves) become one
+    ``point`` step that runs as a single lookup table.
+    """
+    steps: list[PipelineStep] = []
+    # 记录每个步骤之前/之后的图片尺寸，任意角度旋转后尺寸未知，不再做依赖边界的合并
+    sizes: list[tuple[int, int] | None] = [size]
+
+    for operation in operations:
+        operation = normalize_operation(operation)
+        current = sizes[-1]
+        previous = steps[-1] if steps else None
+        before_previous = sizes[-2] if steps else None
+
+        if operation["op"] == "crop":
+            box = (operation["left"], operation["upper"], operation["right"], operation["lower"])
+            new_size = (box[2] - box[0], box[3] - box[1])
+            if previous is not None and previous.op == "crop" and _within(box, current):
+                left, upper = previous.box[0], previous.box[1]
+                previous.box = (left + box[0], upper + box[1], left + box[2], upper + box[3])
+                sizes[-1] = new_size
+                continue
+            if previous is not None and previous.op == "resize" and _within(box, current) and before_previous:
+                src = previous.box or (0, 0, before_previous[0], before_previous[1])
+                scale_x = (src[2] - src[0]) / current[0]
+                scale_y = (src[3] - src[1]) / current[1]
+                previous.box = (
+                    src[0] + box[0] * scale_x,
+                    src[1] + box[1] * scale_y,
+                    src[0] + box[2] * scale_x,
+                    src[1] + box[3] * scale_y,
+                )
+                previous.size = new_size
+                sizes[-1] = new_size
+                continue
+            steps.append(PipelineStep("crop", box=box))
+            sizes.append(new_size)
+
+        elif operation["op"] == "resize":
+            new_size = (operation["width"], operation["height"])
+            if previous is not None and previous.op == "crop" and _within(previous.box, before_previous):
+                steps[-1] = PipelineStep("resize", size=new_size, box=previous.box)
+                sizes[-1] = new_size
+                continue
+            # 放大会丢失前一次缩小去掉的细节：400 -> 20 -> 400 不能合并成原图，只合并不超过前一次尺寸的缩放
+            if previous is not None and previous.op == "resize" \
+                    and new_size[0] <= previous.size[0] and new_size[1] <= previous.size[1]:
+                previous.size = new_size
+                sizes[-1] = new_size
+                continue
+            steps.append(PipelineStep("resize", size=new_size))
+            sizes.append(new_size)
+
+        elif operation["op"] == "rotate":
+            angle = operation["angle"]
+            if previous is not None and previous.op == "rotate" \
+                    and _is_right_angle(angle) and _is_right_angle(previous.angle):
+                previous.angle = (previous.angle + angle) % 360
+                if before_previous is None or previous.angle % 180 == 0:
+                    sizes[-1] = before_previous
+                else:
+                    sizes[-1] = (before_previous[1], before_previous[0])
+                if previous.angle == 0:
+                    steps.pop()
+                    sizes.pop()
+                continue
+            if _is_right_angle(angle) and angle % 360 == 0:
+                continue
+            steps.append(PipelineStep("rotate", angle=angle))
+            if current is not None and _is_right_angle(angle):
+                sizes.append(current if angle % 180 == 0 else (current[1], current[0]))
+            else:
+                sizes.append(None)
+
+        elif operation["op"] in POINT_OPERATIONS:
+            if previous is not None and previous.op == "point":
+                previous.params["operations"].append(operation)
+                continue
+            steps.append(PipelineStep("point", params={"operations": [operation]}))
+            sizes.append(current)
+
+        else:
+            # 其余像素操作不改变尺寸
+            steps.append(PipelineStep(operation["op"], params=operation))
+            sizes.append(current)
+
+    return steps
+
+
+def apply_step(img: Image.Image, step: PipelineStep) -> Image.Image:
+    """
+    Apply one pipeline step to an image.
+    """
+    if step.op == "resize":
+        return img.resize(step.size, Image.Resampling.LANCZOS, box=step.box)
+    if step.op == "crop":
+        return img.crop(tuple(int(v) for v in step.box))
+    if step.op == "rotate":
+        # expand=True 保证旋转后的完整图像可见
+        return img.rotate(step.angle, expand=True)
+    return apply_pixel_operation(img, step.op, step.params)
+
+
+def apply_operations(img: Image.Image, operations: list[dict[str, Any]]) -> Image.Image:
+    """
+    Run an ordered list of operations on an image, decoding it only once.
+    """
+    for step in plan_operations(operations, img.size):
+        img = apply_step(img, step)
+    return img
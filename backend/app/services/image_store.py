@@ -0,0 +1,249 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from backend.app.core.config import settings
+
+
+_IMAGE_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ImageStore:
+    """
+    Content-addressed image store.
+
+    Images are keyed by the SHA-256 of their bytes and sharded on disk as
+    ``<root>/<id[:2]>/<id[2:4]>/<id>``, so identical uploads share one file.
+    Once the store grows past ``max_bytes`` the least recently used images
+    are evicted.
+    """
+
+    def __init__(self, root: str | os.PathLike, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # image_id -> (size, last access time), ordered from least to most recently used
+        self._entries: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+
+    @staticmethod
+    def compute_id(data: bytes) -> str:
+        """
+        Return the image ID for the given bytes.
+        """
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def is_valid_id(image_id: str) -> bool:
+        return bool(_IMAGE_ID_RE.match(image_id))
+
+    def path_for(self, image_id: str) -> Path:
+        """
+        Map an image ID to its sharded path without checking that it exists.
+        """
+        if not self.is_valid_id(image_id):
+            raise ValueError(f"Invalid image id: {image_id!r}")
+        return self.root / image_id[:2] / image_id[2:4] / image_id
+
+    def put(self, data: bytes) -> str:
+        """
+        Store image bytes and return their ID.
+        Re-uploading an existing image only refreshes its LRU position.
+        """
+        image_id = self.compute_id(data)
+        path = self.path_for(image_id)
+
+        with self._lock:
+            self._ensure_loaded()
+            if path.exists():
+                self._record_access(image_id, path)
+                return image_id
+
+        with self.open_writer() as writer:
+            writer.write(data, hashed=False)
+            return writer.commit(image_id)
+
+    def open_writer(self) -> "ImageWriter":
+        """
+        Start writing an image incrementally, e.g. while an upload is still being received.
+        """
+        return ImageWriter(self)
+
+    def _commit(self, tmp_path: str, image_id: str) -> str:
+        path = self.path_for(image_id)
+        with self._lock:
+            self._ensure_loaded()
+            exists = path.exists()
+            if exists:
+                self._record_access(image_id, path)
+        if exists:
+            os.unlink(tmp_path)
+            return image_id
+
+        # 写入在锁外进行，相同内容的并发写入通过原子 rename 互相覆盖，结果一致
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._record_access(image_id, path)
+            self._evict(keep=image_id)
+        return image_id
+
+    def open_path(self, image_id: str) -> Path:
+        """
+        Resolve an image ID to the path of a stored image.
+        Raises FileNotFoundError if the image is unknown or has been evicted.
+        """
+        path = self.path_for(image_id)
+        if not path.exists():
+            raise FileNotFoundError(f"Image {image_id} not found in image store")
+        with self._lock:
+            self._record_access(image_id, path)
+        return path
+
+    def __contains__(self, image_id: str) -> bool:
+        return self.is_valid_id(image_id) and self.path_for(image_id).exists()
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return self._total_bytes
+
+    def _ensure_loaded(self) -> None:
+        """
+        Build the LRU index from the files already on disk, oldest first.
+        """
+        if self._loaded:
+            return
+        found = []
+        if self.root.is_dir():
+            for shard1 in os.scandir(self.root):
+                if not shard1.is_dir():
+                    continue
+                for shard2 in os.scandir(shard1.path):
+                    if not shard2.is_dir():
+                        continue
+                    for entry in os.scandir(shard2.path):
+                        if entry.is_file() and self.is_valid_id(entry.name):
+                            stat = entry.stat()
+                            found.append((stat.st_atime, entry.name, stat.st_size))
+        found.sort()
+        for atime, image_id, size in found:
+            self._entries[image_id] = (size, atime)
+            self._total_bytes += size
+        self._loaded = True
+
+    def _record_access(self, image_id: str, path: Path) -> None:
+        # atime 作为跨进程共享的访问时间，MCP 工具进程读取图片时也会刷新它；
+        # mtime 保持为写入时间，供解码缓存作为缓存键
+        now_ns = time.time_ns()
+        now = now_ns / 1e9
+        try:
+            os.utime(path, ns=(now_ns, path.stat().st_mtime_ns))
+        except FileNotFoundError:
+            return
+        if not self._loaded:
+            return
+        if image_id in self._entries:
+            size, _ = self._entries.pop(image_id)
+        else:
+            size = path.stat().st_size
+            self._total_bytes += size
+        self._entries[image_id] = (size, now)
+
+    def _evict(self, keep: str) -> None:
+        """
+        Remove least recently used images until the store fits in max_bytes.
+        Images touched by another process since they were indexed get a second chance.
+        """
+        checked = 0
+        while self._total_bytes > self.max_bytes and checked < len(self._entries):
+            image_id, (size, accessed) = next(iter(self._entries.items()))
+            checked += 1
+            if image_id == keep:
+                self._entries.move_to_end(image_id)
+                continue
+            path = self.path_for(image_id)
+            try:
+                atime = path.stat().st_atime
+            except FileNotFoundError:
+                atime = None
+            if atime is not None and atime > accessed + 1:
+                self._entries.pop(image_id)
+                self._entries[image_id] = (size, atime)
+                continue
+            self._entries.pop(image_id)
+            self._total_bytes -= size
+            if atime is not None:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+class ImageWriter:
+    """
+    Incremental writer for the image store.
+
+    Bytes are hashed while they are written to a temporary file next to the
+    store, and ``commit()`` moves the file to its content address. Used as a
+    context manager, the temporary file is removed unless it was committed.
+    """
+
+    def __init__(self, store: ImageStore):
+        self._store = store
+        self._hash = hashlib.sha256()
+        self.size = 0
+        incoming = store.root / ".incoming"
+        incoming.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=incoming, prefix=".tmp-")
+        self._file = os.fdopen(fd, "wb")
+        self._done = False
+
+    def write(self, chunk: bytes, hashed: bool = True) -> None:
+        """
+        Append a chunk. Pass ``hashed=False`` when the ID is already known and given to ``commit()``.
+        """
+        if hashed:
+            self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def flush(self) -> None:
+        """
+        Flush buffered bytes so the temporary file can be read before committing.
+        """
+        self._file.flush()
+
+    def commit(self, image_id: str | None = None) -> str:
+        """
+        Finish the write and return the image ID.
+        """
+        self._file.close()
+        self._done = True
+        return self._store._commit(self.tmp_path, image_id or self._hash.hexdigest())
+
+    def abort(self) -> None:
+        if self._done:
+            return
+        self._done = True
+        self._file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "ImageWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.abort()
+
+
+image_store = ImageStore(settings.IMAGE_STORE_DIR, settings.IMAGE_STORE_MAX_BYTES)
@@ -0,0 +1,138 @@
+import math
+from typing import Any
+
+from PIL import Image
+
+from backend.app.core.config import settings
+from backend.app.services.image_cache import decoded_image_cache, estimate_bytes
+from backend.app.services.image_encoding import encode_image, encode_preview
+from backend.app.services.image_ops import (
+    apply_operations, apply_step, output_size, plan_operations, scale_operations, step_output_size,
+)
+from backend.app.services.tiled_images import check_pipeline_memory, decode_bounded, is_large, tiled_crop, tiled_resize
+from backend.app.services.tracing import span
+
+
+# 以下任务由工作池执行：参数只有图片路径和操作参数，返回编码后的字节和输出格式，
+# 保证可以被 pickle，像素数据不会跨进程传递。
+# output_format / preset 为空时使用配置：默认沿用输入图片的格式。
+# 超过 TILED_PIXEL_THRESHOLD 的大图不进入解码缓存，裁剪和缩放逐条带处理；
+# 无论输入大小，放大或超出原图的裁剪都可能产生很大的结果，解码前先按尺寸检查内存上限
+
+
+def _is_large_file(image_path: str, operations: list[dict[str, Any]]) -> bool:
+    """
+    Whether the image needs the tiled path. Raises MemoryLimitExceeded, before anything is decoded,
+    if running ``operations`` on it would not fit into the memory ceiling.
+    """
+    with Image.open(image_path) as img:
+        size, mode = img.size, img.mode
+    large = is_large(size)
+    check_pipeline_memory(plan_operations(operations, size), size, mode, source_in_memory=not large)
+    return large
+
+
+def _large_task(image_path: str, operations: list[dict[str, Any]],
+                output_format: str | None, preset: str | None) -> tuple[bytes, str]:
+    with Image.open(image_path) as img:
+        source_format, size, mode = img.format, img.size, img.mode
+    steps = plan_operations(operations, size)
+    # 逐条带处理时解码和变换交织在一起，整体计为一个阶段
+    with span("transform", tiled=True):
+        if steps and steps[0].op == "resize":
+            result_img = tiled_resize(image_path, steps[0].size, steps[0].box)
+            steps = steps[1:]
+        elif steps and steps[0].op == "crop":
+            result_img = tiled_crop(image_path, steps[0].box)
+            steps = steps[1:]
+        else:
+            # 旋转需要整张图片，先确认原图和结果都在内存上限之内
+            extra = estimate_bytes(mode, step_output_size(steps[0], size)) if steps else 0
+            result_img = decode_bounded(image_path, extra)
+        for step in steps:
+            result_img = apply_step(result_img, step)
+    return encode_image(result_img, source_format, output_format, preset)
+
+
+def resize_task(image_path: str, width: int, height: int,
+                output_format: str | None = None, preset: str | None = None) -> tuple[bytes, str]:
+    operations = [{"op": "resize", "width": width, "height": height}]
+    if _is_large_file(image_path, operations):
+        return _large_task(image_path, operations, output_format, preset)
+    img = decoded_image_cache.get(image_path)
+
+    # Resize the image using LANCZOS resampling algorithm for high quality
+    with span("transform"):
+        resized_img = img.resize((width, height), Image.Resampling.LANCZOS)
+    return encode_image(resized_img, img.format, output_format, preset)
+
+
+def crop_task(image_path: str, left: int, upper: int, right: int, lower: int,
+              output_format: str | None = None, preset: str | None = None) -> tuple[bytes, str]:
+    operations = [{"op": "crop", "left": left, "upper": upper, "right": right, "lower": lower}]
+    if _is_large_file(image_path, operations):
+        return _large_task(image_path, operations, output_format, preset)
+    img = decoded_image_cache.get(image_path)
+
+    # Crop the image to the specified bounding box
+    with span("transform"):
+        cropped_img = img.crop((left, upper, right, lower))
+    return encode_image(cropped_img, img.format, output_format, preset)
+
+
+def rotate_task(image_path: str, angle: float,
+                output_format: str | None = None, preset: str | None = None) -> tuple[bytes, str]:
+    operations = [{"op": "rotate", "angle": angle}]
+    if _is_large_file(image_path, operations):
+        return _large_task(image_path, operations, output_format, preset)
+    img = decoded_image_cache.get(image_path)
+
+    # Rotate the image by the specified angle, expand=True ensures the entire
+    # rotated image is visible without cropping
+    with span("transform"):
+        rotated_img = img.rotate(angle, expand=True)
+    return encode_image(rotated_img, img.format, output_format, preset)
+
+
+def pipeline_task(image_path: str, operations: list[dict[str, Any]],
+                  output_format: str | None = None, preset: str | None = None) -> tuple[bytes, str]:
+    if _is_large_file(image_path, operations):
+        return _large_task(image_path, operations, output_format, preset)
+    # Decode once, run the fused operations in memory and encode once at the end
+    img = decoded_image_cache.get(image_path)
+    with span("transform"):
+        result_img = apply_operations(img, operations)
+    return encode_image(result_img, img.format, output_format, preset)
+
+
+def _open_reduced(image_path: str, operations: list[dict[str, Any]], max_side: int) -> tuple[Image.Image, float]:
+    """
+    Decode an image just large enough for a ``max_side`` preview of the operations' result,
+    as cheaply as the format allows. Returns the image and its scale relative to the original.
+    """
+    with Image.open(image_path) as opened:
+        width, height = opened.size
+        scale = min(1.0, max_side / max(output_size(operations, opened.size)))
+        if opened.format == "JPEG" and scale < 1:
+            # JPEG 可以直接按 1/2、1/4、1/8 的比例解码，省去完整解码
+            opened.draft(opened.mode, (math.ceil(width * scale), math.ceil(height * scale)))
+            opened.load()
+            img = opened.copy()
+            return img, img.width / width
+    if is_large((width, height)):
+        img = tiled_resize(image_path, (max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))))
+        return img, img.width / width
+    img = decoded_image_cache.get(image_path)
+    factor = int(1 / scale)
+    if factor > 1:
+        img = img.reduce(factor)
+    return img, img.width / width
+
+
+def preview_task(image_path: str, operations: list[dict[str, Any]]) -> tuple[bytes, str]:
+    # Run the operations on a downscaled copy, so the preview is ready long before the full result
+    max_side = settings.PREVIEW_MAX_SIDE
+    img, scale = _open_reduced(image_path, operations, max_side)
+    preview_img = apply_operations(img, scale_operations(operations, scale))
+    preview_img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+    return encode_preview(preview_img)
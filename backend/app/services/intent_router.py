@@ -0,0 +1,237 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from backend.app.core.config import settings
+from backend.app.services.image_ops import normalize_operation, output_size
+
+
+Size = tuple[int, int] | None
+
+_NUM = r"(\d+(?:\.\d+)?)"
+_INT = r"(\d+)"
+_SEP = r"\s*[x×*乘]\s*"
+
+# 子句分隔：英文 then/and/逗号，中文 然后/再/并/，/。数字之间的逗号属于裁剪坐标，不作分隔
+_CLAUSE_SPLIT = re.compile(
+    r"\s*(?:[,，](?!\s*\d)|;|；|。|\band then\b|\bthen\b|\band\b|然后|之后|接着|并且|并|再)\s*",
+    re.IGNORECASE,
+)
+
+# 匹配前先去掉的无意义词，不影响置信度
+_FILLER = re.compile(
+    r"please|pls|can you|could you|the image|this image|the picture|this picture|the photo|this photo"
+    r"|image|picture|photo|\bit\b|\bto\b|\bby\b|\bmake\b|\bthe\b|\ba\b"
+    r"|帮我|请|麻烦|把|将|这张|图片|图像|照片|一下|给我|给|下|吧",
+    re.IGNORECASE,
+)
+
+_RESOLUTION_PRESETS = {"4k": 2160, "2160p": 2160, "1440p": 1440, "1080p": 1080, "720p": 720, "480p": 480}
+
+
+@dataclass
+class RoutedIntent:
+    """
+    Operations recognized in a prompt, in img_pipeline format, with the parse confidence.
+    """
+    operations: list[dict[str, Any]]
+    confidence: float
+    descriptions: list[str] = field(default_factory=list)
+
+
+def _rotated_size(size: Size, angle: float) -> Size:
+    if size is None or angle % 90 != 0:
+        return None
+    return size if angle % 180 == 0 else (size[1], size[0])
+
+
+# 每条规则：正则 + 根据匹配结果和当前尺寸生成操作的函数（无法确定时返回 None）
+def _resize_wh(m: re.Match, size: Size) -> dict | None:
+    return {"op": "resize", "width": int(m.group(1)), "height": int(m.group(2))}
+
+
+def _resize_preset(m: re.Match, size: Size) -> dict | None:
+    if size is None:
+        return None
+    height = _RESOLUTION_PRESETS[m.group(1).lower()]
+    width = round(size[0] * height / size[1])
+    return {"op": "resize", "width": width, "height": height}
+
+
+def _resize_percent(m: re.Match, size: Size) -> dict | None:
+    if size is None:
+        return None
+    factor = float(m.group(1)) / 100
+    if factor <= 0:
+        return None
+    return {"op": "resize", "width": max(1, round(size[0] * factor)), "height": max(1, round(size[1] * factor))}
+
+
+def _resize_half(m: re.Match, size: Size) -> dict | None:
+    if size is None:
+        return None
+    return {"op": "resize", "width": max(1, size[0] // 2), "height": max(1, size[1] // 2)}
+
+
+def _rotate(direction_group: int, angle_group: int) -> Callable[[re.Match, Size], dict | None]:
+    def build(m: re.Match, size: Size) -> dict | None:
+        angle = float(m.group(angle_group))
+        direction = (m.group(direction_group) or "").lower()
+        # Pillow 中正角度为逆时针，顺时针需要取负
+        if direction in ("clockwise", "cw", "顺时针", "向右"):
+            angle = -angle
+        return {"op": "rotate", "angle": angle}
+    return build
+
+
+def _crop_box(m: re.Match, size: Size) -> dict | None:
+    left, upper, right, lower = (int(m.group(i)) for i in range(1, 5))
+    if right <= left or lower <= upper:
+        return None
+    return {"op": "crop", "left": left, "upper": upper, "right": right, "lower": lower}
+
+
+def _crop_square(m: re.Match, size: Size) -> dict | None:
+    if size is None:
+        return None
+    side = min(size)
+    left = (size[0] - side) // 2
+    upper = (size[1] - side) // 2
+    return {"op": "crop", "left": left, "upper": upper, "right": left + side, "lower": upper + side}
+
+
+def _constant(operation: dict) -> Callable[[re.Match, Size], dict | None]:
+    def build(m: re.Match, size: Size) -> dict | None:
+        return dict(operation)
+    return build
+
+
+_RULES: list[tuple[re.Pattern, Callable[[re.Match, Size], dict | None]]] = [
+    # resize
+    (re.compile(rf"(?:resize|scale|size|调整|缩放|改|修改|变|设置)?\s*(?:大小|尺寸|分辨率)?\s*(?:为|到|成)?\s*{_INT}{_SEP}{_INT}\s*(?:px|pixels|像素)?\s*(?:的)?\s*(?:大小|尺寸|分辨率)?", re.I), _resize_wh),
+    (re.compile(r"(?:resize|scale|convert|调整|缩放|转|改|变)?\s*(?:为|到|成)?\s*(4k|2160p|1440p|1080p|720p|480p)", re.I), _resize_preset),
+    (re.compile(rf"(?:resize|scale|shrink|enlarge|调整|缩放|缩小|放大)\s*(?:为|到|成|至)?\s*(?:原来的|原图的)?\s*{_NUM}\s*%", re.I), _resize_percent),
+    (re.compile(r"(?:缩小一半|缩小为一半|缩小到一半|尺寸减半|half\s*size|scale\s*(?:down\s*)?half)", re.I), _resize_half),
+    # rotate
+    (re.compile(rf"(clockwise|counter-?clockwise|anti-?clockwise|顺时针|逆时针|向右|向左)?\s*(?:rotate|旋转|转)\s*{_NUM}\s*(?:°|degrees?|deg|度)?", re.I), _rotate(1, 2)),
+    (re.compile(rf"(?:rotate|旋转|转)\s*{_NUM}\s*(?:°|degrees?|deg|度)?\s*(clockwise|counter-?clockwise|anti-?clockwise|cw|ccw)", re.I), _rotate(2, 1)),
+    # crop
+    (re.compile(rf"(?:crop|裁剪|裁切|剪裁)\s*(?:box|区域|为|到|成)?\s*[\(（\[]?\s*{_INT}\s*[,，]\s*{_INT}\s*[,，]\s*{_INT}\s*[,，]\s*{_INT}\s*[\)）\]]?", re.I), _crop_box),
+    (re.compile(r"(?:crop|裁剪|裁切|剪裁)\s*(?:into|as|为|到|成)?\s*(?:a\s+)?(?:square|正方形|方形)", re.I), _crop_square),
+    # color
+    (re.compile(r"(?:convert|turn|变|转|转换|改)?\s*(?:为|到|成)?\s*(?:grayscale|greyscale|gray|grey|black\s*&\s*white|灰度|黑白)(?:图|色)?", re.I), _constant({"op": "grayscale"})),
+    (re.compile(r"(?:apply|add|加|变|转|转换|改)?\s*(?:为|到|成)?\s*(?:sepia|怀旧|复古|老照片)\s*(?:tone|filter|effect|色调|风格|效果|色)?", re.I), _constant({"op": "sepia"})),
+]
+
+
+def _validated(operation: dict, size: Size) -> dict | None:
+    """
+    Normalize a built operation like the tools do; None if it is invalid or its output is too large.
+    """
+    try:
+        operation = normalize_operation(operation)
+    except ValueError:
+        return None
+    # 缩放和裁剪的输出尺寸与输入无关；旋转只有在尺寸已知时才能计算
+    if size is not None or operation["op"] in ("resize", "crop"):
+        width, height = output_size([operation], size or (0, 0))
+        if width * height > settings.FAST_ROUTER_MAX_OUTPUT_PIXELS:
+            return None
+    return operation
+
+
+def _meaningful_chars(text: str) -> int:
+    return len(re.sub(r"[\W_]", "", text))
+
+
+def _leftover_ratio(clause: str, match: re.Match) -> float:
+    """
+    Fraction of meaningful characters in the clause that the rule did not cover.
+    """
+    leftover = clause[:match.start()] + " " + clause[match.end():]
+    total_chars = _meaningful_chars(clause)
+    return _meaningful_chars(leftover) / total_chars if total_chars else 0.0
+
+
+def parse_intent(prompt: str, size: Size) -> RoutedIntent | None:
+    """
+    Parse simple edit instructions into pipeline operations.
+
+    Each clause must be recognized by one rule; the confidence is the lowest
+    share of a clause's meaningful text covered by its rule.
+    Returns None if any clause is not understood at all.
+    """
+    clauses = [_FILLER.sub(" ", c).strip() for c in _CLAUSE_SPLIT.split(prompt.strip()) if c]
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        return None
+
+    operations: list[dict[str, Any]] = []
+    descriptions: list[str] = []
+    confidence = 1.0
+    for clause in clauses:
+        best = None
+        for pattern, build in _RULES:
+            match = pattern.search(clause)
+            if match is None:
+                continue
+            operation = build(match, size)
+            if operation is not None:
+                operation = _validated(operation, size)
+            if operation is None:
+                continue
+            clause_confidence = 1.0 - _leftover_ratio(clause, match)
+            if best is None or clause_confidence > best[0]:
+                best = (clause_confidence, operation)
+        if best is None:
+            return None
+        clause_confidence, operation = best
+        confidence = min(confidence, clause_confidence)
+        operations.append(operation)
+        descriptions.append(clause)
+
+        # 跟踪后续操作看到的图片尺寸
+        if operation["op"] == "resize":
+            size = (operation["width"], operation["height"])
+        elif operation["op"] == "crop":
+            size = (operation["right"] - operation["left"], operation["lower"] - operation["upper"])
+        elif operation["op"] == "rotate":
+            size = _rotated_size(size, operation["angle"])
+
+    return RoutedIntent(operations=operations, confidence=confidence, descriptions=descriptions)
+
+
+class IntentRouter:
+    """
+    Front router that handles simple edits without the LLM agent.
+    Prompts parsed with confidence below ``min_confidence`` fall back to the agent.
+    """
+
+    def __init__(self, min_confidence: float, enabled: bool = True):
+        self.min_confidence = min_confidence
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.routed = 0
+        self.fallback = 0
+
+    def route(self, prompt: str, size: Size) -> RoutedIntent | None:
+        intent = parse_intent(prompt, size) if self.enabled else None
+        with self._lock:
+            if intent is not None and intent.confidence >= self.min_confidence:
+                self.routed += 1
+                return intent
+            self.fallback += 1
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.routed + self.fallback
+            return {
+                "routed": self.routed,
+                "fallback": self.fallback,
+                "routed_rate": self.routed / total if total else 0.0,
+            }
+
+
+intent_router = IntentRouter(settings.FAST_ROUTER_MIN_CONFIDENCE, settings.FAST_ROUTER_ENABLED)
@@ -0,0 +1,187 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator
+
+from backend.app.core.config import settings
+
+
+class SchedulerFull(RuntimeError):
+    """
+    Raised when a job is submitted while the queue is full.
+    ``retry_after`` is the estimated number of seconds until a slot frees up.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """
+    One admitted job. Waits for a slot with ``wait()`` and must be released when done.
+    """
+
+    def __init__(self, scheduler: "JobScheduler", tenant: str):
+        self.scheduler = scheduler
+        self.tenant = tenant
+        self.granted = asyncio.get_running_loop().create_future()
+        self.started_at: float | None = None
+        self.released = False
+
+    async def wait(self, poll_interval: float = 1.0) -> AsyncIterator[int]:
+        """
+        Wait until the job may run, yielding the 1-based queue position whenever it changes.
+        """
+        last_position = None
+        while not self.granted.done():
+            position = self.scheduler.position(self)
+            if position != last_position:
+                last_position = position
+                yield position
+            try:
+                await asyncio.wait_for(asyncio.shield(self.granted), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self) -> None:
+        """
+        Leave the queue or free the running slot. Safe to call more than once.
+        """
+        if not self.released:
+            self.released = True
+            self.scheduler._release(self)
+
+
+class JobScheduler:
+    """
+    Admission control for agent jobs.
+
+    At most ``max_concurrency`` jobs run at once. Waiting jobs are kept in one
+    FIFO per tenant (user or client), and free slots are handed out round-robin
+    across tenants, so one busy client cannot starve the others. A tenant may
+    hold at most ``max_queue_per_tenant`` waiting jobs and at most
+    ``max_queue`` jobs wait in total; further submissions are rejected with
+    SchedulerFull and a Retry-After estimate based on recent job durations.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_queue_per_tenant: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_tenant = max_queue_per_tenant
+        # tenant -> 等待中的 ticket；字典顺序即轮转顺序
+        self._queues: OrderedDict[str, deque[Ticket]] = OrderedDict()
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        # 任务耗时的指数滑动平均，用于估算 Retry-After
+        self.avg_duration = 10.0
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.avg_duration * (self.queued + 1) / self.max_concurrency))
+
+    def submit(self, tenant: str) -> Ticket:
+        """
+        Admit a job for ``tenant`` or raise SchedulerFull.
+        """
+        ticket = Ticket(self, tenant)
+        if self.running < self.max_concurrency and self.queued == 0:
+            self._start(ticket)
+            return ticket
+
+        tenant_queue = self._queues.get(tenant)
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerFull("Too many queued jobs", self.retry_after())
+        if tenant_queue is not None and len(tenant_queue) >= self.max_queue_per_tenant:
+            self.rejected += 1
+            raise SchedulerFull("Too many queued jobs for this client", self.retry_after())
+
+        if tenant_queue is None:
+            tenant_queue = self._queues[tenant] = deque()
+        tenant_queue.append(ticket)
+        self.queued += 1
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """
+        1-based position of a waiting ticket in the round-robin order, 0 once it runs.
+        """
+        if ticket.granted.done():
+            return 0
+        own_queue = self._queues.get(ticket.tenant)
+        if not own_queue or ticket not in own_queue:
+            return 0
+        # 轮转调度下，租户队列中第 i 个任务在第 i 轮被调度
+        rank = own_queue.index(ticket)
+        ahead = rank
+        before_own = True
+        for tenant, tenant_queue in self._queues.items():
+            if tenant == ticket.tenant:
+                before_own = False
+                continue
+            ahead += min(len(tenant_queue), rank + (1 if before_own else 0))
+        return ahead + 1
+
+    def _start(self, ticket: Ticket) -> None:
+        self.running += 1
+        ticket.started_at = time.monotonic()
+        ticket.granted.set_result(None)
+
+    def _release(self, ticket: Ticket) -> None:
+        if ticket.started_at is None:
+            # 尚未开始运行就被取消（例如客户端断开连接）
+            tenant_queue = self._queues.get(ticket.tenant)
+            if tenant_queue is not None and ticket in tenant_queue:
+                tenant_queue.remove(ticket)
+                self.queued -= 1
+                if not tenant_queue:
+                    del self._queues[ticket.tenant]
+            self.cancelled += 1
+            return
+
+        self.running -= 1
+        self.completed += 1
+        duration = time.monotonic() - ticket.started_at
+        self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.running < self.max_concurrency and self._queues:
+            tenant, tenant_queue = next(iter(self._queues.items()))
+            ticket = tenant_queue.popleft()
+            self.queued -= 1
+            # 被调度的租户移到队尾，下一个空位交给其他租户
+            del self._queues[tenant]
+            if tenant_queue:
+                self._queues[tenant] = tenant_queue
+            self._start(ticket)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "waiting_tenants": len(self._queues),
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "avg_duration_seconds": round(self.avg_duration, 3),
+        }
+
+
+agent_scheduler = JobScheduler(
+    max_concurrency=settings.AGENT_MAX_CONCURRENCY,
+    max_queue=settings.AGENT_MAX_QUEUE,
+    max_queue_per_tenant=settings.AGENT_MAX_QUEUE_PER_USER,
+)
+
+fast_path_scheduler = JobScheduler(
+    max_concurrency=settings.FAST_PATH_MAX_CONCURRENCY,
+    max_queue=settings.FAST_PATH_MAX_QUEUE,
+    max_queue_per_tenant=settings.FAST_PATH_MAX_QUEUE_PER_USER,
+)
@@ -0,0 +1,259 @@
+import heapq
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Literal, Protocol
+
+
+class KeyValueStore(Protocol):
+    """
+    The subset of the redis-py client API used by the services, so a Redis
+    (or Redis-compatible) client can replace the in-process TTLStore.
+    """
+
+    def get(self, name: str) -> Any: ...
+
+    def set(self, name: str, value: Any, ex: int | None = None) -> Any: ...
+
+    def delete(self, *names: str) -> int: ...
+
+    def incr(self, name: str, amount: int = 1) -> int: ...
+
+    def expire(self, name: str, time: int) -> bool: ...
+
+    def ttl(self, name: str) -> int: ...
+
+
+class StoreFull(RuntimeError):
+    """
+    Raised when the store is at its key or byte limit and nothing can be evicted.
+    """
+
+
+def _entry_size(name: str, value: Any) -> int:
+    # 按键和值的长度估算内存占用；字符串按字符数计，其他对象用 sys.getsizeof
+    if isinstance(value, (str, bytes)):
+        return len(name) + len(value)
+    return len(name) + sys.getsizeof(value)
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> (value, 过期时间或 None)，按最近访问排序
+        self.data: OrderedDict[str, tuple[Any, float | None]] = OrderedDict()
+        # (过期时间, key) 小顶堆；键被覆盖或删除后旧条目留在堆中，弹出时再校验
+        self.expiry_heap: list[tuple[float, str]] = []
+        self.volatile_keys = 0
+        self.bytes = 0
+
+
+class TTLStore:
+    """
+    Thread-safe in-process key-value store with per-key TTL.
+
+    Keys are spread over ``shards`` independently locked shards. Expired keys
+    are removed on access and actively by a background sweeper that pops a
+    per-shard expiry heap. When a shard reaches its share of ``max_keys`` or of
+    ``max_bytes`` (the estimated size of keys and values), least recently used
+    keys are evicted: only keys with a TTL under the ``volatile-lru`` policy,
+    any key under ``allkeys-lru``.
+    """
+
+    def __init__(
+        self,
+        max_keys: int,
+        max_bytes: int,
+        shards: int = 16,
+        eviction_policy: Literal["volatile-lru", "allkeys-lru"] = "volatile-lru",
+        sweep_interval: float = 1.0,
+    ):
+        self.eviction_policy = eviction_policy
+        self.sweep_interval = sweep_interval
+        self._shards = [_Shard() for _ in range(shards)]
+        self._max_keys_per_shard = max(1, max_keys // shards)
+        self._max_bytes_per_shard = max(1, max_bytes // shards)
+        self._sweeper: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._sweeper_lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def _shard(self, name: str) -> _Shard:
+        return self._shards[zlib.crc32(name.encode("utf-8")) % len(self._shards)]
+
+    @staticmethod
+    def _is_expired(entry: tuple[Any, float | None], now: float) -> bool:
+        return entry[1] is not None and entry[1] <= now
+
+    def _remove(self, shard: _Shard, name: str) -> None:
+        value, expires_at = shard.data.pop(name)
+        shard.bytes -= _entry_size(name, value)
+        if expires_at is not None:
+            shard.volatile_keys -= 1
+
+    def _lookup(self, shard: _Shard, name: str, now: float) -> tuple[Any, float | None] | None:
+        entry = shard.data.get(name)
+        if entry is None:
+            return None
+        if self._is_expired(entry, now):
+            self._remove(shard, name)
+            self.expired += 1
+            return None
+        shard.data.move_to_end(name)
+        return entry
+
+    def _store(self, shard: _Shard, name: str, value: Any, expires_at: float | None) -> None:
+        size = _entry_size(name, value)
+        if size > self._max_bytes_per_shard:
+            raise StoreFull(f"Value of {name!r} is larger than the store's memory limit")
+        if name in shard.data:
+            self._remove(shard, name)
+        while len(shard.data) >= self._max_keys_per_shard or shard.bytes + size > self._max_bytes_per_shard:
+            self._evict_one(shard)
+        shard.data[name] = (value, expires_at)
+        shard.bytes += size
+        if expires_at is not None:
+            shard.volatile_keys += 1
+            heapq.heappush(shard.expiry_heap, (expires_at, name))
+            self._ensure_sweeper()
+
+    def _evict_one(self, shard: _Shard) -> None:
+        now = _now()
+        if self._sweep_shard(shard, now):
+            return
+        for name, entry in shard.data.items():
+            if self.eviction_policy == "allkeys-lru" or entry[1] is not None:
+                self._remove(shard, name)
+                self.evicted += 1
+                return
+        raise StoreFull("Key-value store is full and has no evictable keys")
+
+    def get(self, name: str) -> Any:
+        shard = self._shard(name)
+        with shard.lock:
+            entry = self._lookup(shard, name, _now())
+            return None if entry is None else entry[0]
+
+    def set(self, name: str, value: Any, ex: int | None = None) -> bool:
+        # 与 Redis 一致：ex 必须为正数，0 或负数是错误而不是“永不过期”
+        if ex is not None and ex <= 0:
+            raise ValueError("invalid expire time in 'set' command")
+        shard = self._shard(name)
+        with shard.lock:
+            self._store(shard, name, value, _now() + ex if ex is not None else None)
+        return True
+
+    def delete(self, *names: str) -> int:
+        deleted = 0
+        now = _now()
+        for name in names:
+            shard = self._shard(name)
+            with shard.lock:
+                if self._lookup(shard, name, now) is not None:
+                    self._remove(shard, name)
+                    deleted += 1
+        return deleted
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        shard = self._shard(name)
+        with shard.lock:
+            entry = self._lookup(shard, name, _now())
+            value = amount if entry is None else int(entry[0]) + amount
+            if entry is None:
+                self._store(shard, name, value, None)
+            else:
+                shard.data[name] = (value, entry[1])
+                shard.bytes += _entry_size(name, value) - _entry_size(name, entry[0])
+            return value
+
+    def expire(self, name: str, time: int) -> bool:
+        shard = self._shard(name)
+        with shard.lock:
+            entry = self._lookup(shard, name, _now())
+            if entry is None:
+                return False
+            self._store(shard, name, entry[0], _now() + time)
+            return True
+
+    def ttl(self, name: str) -> int:
+        """
+        Remaining seconds to live; -1 for keys without TTL and -2 for missing keys, as in Redis.
+        """
+        shard = self._shard(name)
+        with shard.lock:
+            now = _now()
+            entry = self._lookup(shard, name, now)
+            if entry is None:
+                return -2
+            if entry[1] is None:
+                return -1
+            return max(0, int(entry[1] - now))
+
+    def _sweep_shard(self, shard: _Shard, now: float) -> int:
+        removed = 0
+        heap = shard.expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, name = heapq.heappop(heap)
+            entry = shard.data.get(name)
+            # 只删除过期时间与堆条目一致的键，忽略已被覆盖或删除的旧条目
+            if entry is not None and entry[1] == expires_at:
+                self._remove(shard, name)
+                removed += 1
+        self.expired += removed
+        return removed
+
+    def sweep(self) -> int:
+        """
+        Remove every expired key now and return how many were removed.
+        """
+        removed = 0
+        now = _now()
+        for shard in self._shards:
+            with shard.lock:
+                removed += self._sweep_shard(shard, now)
+        return removed
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is not None:
+            return
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="ttl-store-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            self.sweep()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def __len__(self) -> int:
+        return sum(len(shard.data) for shard in self._shards)
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self),
+            "bytes": sum(shard.bytes for shard in self._shards),
+            "volatile_keys": sum(shard.volatile_keys for shard in self._shards),
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+def _now() -> float:
+    return time.time()
+
+
+def create_kv_store(url: str | None, max_keys: int, max_bytes: int, shards: int) -> KeyValueStore:
+    """
+    Create the configured store: a Redis client for ``redis://`` URLs, otherwise an in-process TTLStore.
+    """
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        # redis 为可选依赖，只有配置了 Redis 地址时才需要安装
+        import redis
+        return redis.Redis.from_url(url, decode_responses=True)
+    return TTLStore(max_keys=max_keys, max_bytes=max_bytes, shards=shards)
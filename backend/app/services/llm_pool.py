@@ -0,0 +1,108 @@
+from typing import Any, AsyncIterator, Iterator
+
+import aiohttp
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_ollama import ChatOllama
+from pydantic import ConfigDict
+
+from backend.app.services.backend_pool import Endpoint, EndpointPool
+
+
+class BalancedChatModel(BaseChatModel):
+    """
+    Chat model that spreads calls over several equivalent model servers.
+
+    Every call is sent to the least busy healthy endpoint of ``pool``. A call
+    that fails before producing any output is retried on another endpoint.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    pool: EndpointPool[BaseChatModel]
+
+    @property
+    def _llm_type(self) -> str:
+        return "balanced"
+
+    def _attempts(self) -> int:
+        return len(self.pool.endpoints)
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        tried = []
+        for attempt in range(self._attempts()):
+            try:
+                with self.pool.lease(tried) as endpoint:
+                    tried.append(endpoint)
+                    return endpoint.client._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception:
+                if attempt == self._attempts() - 1:
+                    raise
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        tried = []
+        for attempt in range(self._attempts()):
+            try:
+                with self.pool.lease(tried) as endpoint:
+                    tried.append(endpoint)
+                    return await endpoint.client._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception:
+                if attempt == self._attempts() - 1:
+                    raise
+
+    def _stream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tried = []
+        for attempt in range(self._attempts()):
+            started = False
+            try:
+                with self.pool.lease(tried) as endpoint:
+                    tried.append(endpoint)
+                    for chunk in endpoint.client._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                        started = True
+                        yield chunk
+                return
+            except Exception:
+                # 已经输出过内容时不能换节点重试
+                if started or attempt == self._attempts() - 1:
+                    raise
+
+    async def _astream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                       run_manager: AsyncCallbackManagerForLLMRun | None = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tried = []
+        for attempt in range(self._attempts()):
+            started = False
+            try:
+                with self.pool.lease(tried) as endpoint:
+                    tried.append(endpoint)
+                    async for chunk in endpoint.client._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                        started = True
+                        yield chunk
+                return
+            except Exception:
+                if started or attempt == self._attempts() - 1:
+                    raise
+
+
+async def ollama_health_check(endpoint: Endpoint[BaseChatModel]) -> bool:
+    """
+    An Ollama server is healthy if it answers the model list request.
+    """
+    timeout = aiohttp.ClientTimeout(total=2)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(f"{endpoint.url.rstrip('/')}/api/tags") as response:
+            return response.status == 200
+
+
+def make_ollama_pool(model: str, urls: list[str], eject_after_failures: int, eject_seconds: float,
+                     **model_kwargs: Any) -> EndpointPool[BaseChatModel]:
+    """
+    Build an endpoint pool with one ChatOllama client per Ollama server.
+    """
+    endpoints = [Endpoint(url, ChatOllama(model=model, base_url=url, **model_kwargs)) for url in urls]
+    return EndpointPool("llm", endpoints, eject_after_failures, eject_seconds)
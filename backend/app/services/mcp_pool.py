@@ -0,0 +1,244 @@
+import asyncio
+import json
+from typing import Any
+
+from fastmcp import Client
+from langchain_core.callbacks import AsyncCallbackHandler, AsyncCallbackManager, adispatch_custom_event
+from langchain_core.tools import StructuredTool, ToolException
+from mcp.types import Tool
+
+from backend.app.services.backend_pool import Endpoint, EndpointPool
+from backend.app.services.metrics import in_flight, tool_calls
+from backend.app.services.tracing import span
+
+
+# 工具执行期间上报预览图时使用的 LangChain 自定义事件名
+PREVIEW_EVENT = "tool_preview"
+
+
+class McpSessionGroup:
+    """
+    Persistent MCP client sessions to one server.
+    Calls go to the session with the fewest calls in flight.
+    """
+
+    def __init__(self, url: str, size: int, timeout: float):
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.sessions: list[Client] = []
+        self._outstanding: list[int] = []
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return bool(self.sessions) and all(s.is_connected() for s in self.sessions)
+
+    async def connect(self) -> None:
+        """
+        Open the missing sessions and replace the ones that dropped; healthy sessions keep serving their calls.
+        """
+        async with self._connect_lock:
+            if self.connected:
+                return
+            dropped = [i for i, s in enumerate(self.sessions) if not s.is_connected()]
+            missing = self.size - len(self.sessions)
+            sessions = [Client(self.url, timeout=self.timeout) for _ in range(len(dropped) + missing)]
+            try:
+                await asyncio.gather(*(s.__aenter__() for s in sessions))
+            except BaseException:
+                await asyncio.gather(*(s.close() for s in sessions), return_exceptions=True)
+                raise
+            stale = [self.sessions[i] for i in dropped]
+            # 断开的会话上仍在进行的调用结束时会自行减少计数，计数不清零
+            for i in dropped:
+                self.sessions[i] = sessions.pop()
+            self._outstanding = self._outstanding[:len(self.sessions)] + [0] * missing
+            self.sessions.extend(sessions)
+            await asyncio.gather(*(s.close() for s in stale), return_exceptions=True)
+
+    async def close(self) -> None:
+        sessions, self.sessions = self.sessions, []
+        await asyncio.gather(*(s.close() for s in sessions), return_exceptions=True)
+
+    async def call_tool(self, name: str, arguments: dict[str, Any], progress_handler=None):
+        if not self.connected:
+            await self.connect()
+        index = min(range(len(self.sessions)), key=self._outstanding.__getitem__)
+        self._outstanding[index] += 1
+        try:
+            return await self.sessions[index].call_tool(name, arguments, progress_handler=progress_handler,
+                                                        raise_on_error=False)
+        finally:
+            self._outstanding[index] -= 1
+
+    async def ping(self) -> bool:
+        # 部分服务端不实现 ping 请求，用工具列表请求检查每个会话是否可用
+        if not self.connected:
+            await self.connect()
+        await asyncio.gather(*(s.list_tools() for s in self.sessions))
+        return True
+
+
+def _result_text(result) -> str:
+    texts = [c.text for c in result.content if getattr(c, "type", None) == "text"]
+    if texts:
+        return "\n".join(texts)
+    if result.structured_content is not None:
+        return json.dumps(result.structured_content, ensure_ascii=False)
+    return str(result.content)
+
+
+class McpServerPool:
+    """
+    Load-balanced pool of equivalent MCP servers (e.g. several ``mcp/server.py`` processes).
+
+    Each server gets its own group of persistent sessions, and every tool
+    call is routed to the least busy healthy server; calls that fail to reach
+    a server are retried on the next one. A server that cannot be reached is
+    ejected and reconnected by the health check.
+    """
+
+    def __init__(self, name: str, urls: list[str], sessions_per_endpoint: int, timeout: float,
+                 eject_after_failures: int, eject_seconds: float):
+        self.name = name
+        endpoints = [Endpoint(url, McpSessionGroup(url, sessions_per_endpoint, timeout)) for url in urls]
+        self.pool: EndpointPool[McpSessionGroup] = EndpointPool(name, endpoints, eject_after_failures, eject_seconds)
+
+    async def start(self, health_check_interval: float) -> None:
+        await self.pool.check_health(self.health_check)
+        self.pool.start_health_checks(self.health_check, health_check_interval)
+
+    async def close(self) -> None:
+        await self.pool.stop_health_checks()
+        await asyncio.gather(*(e.client.close() for e in self.pool.endpoints))
+
+    @staticmethod
+    async def health_check(endpoint: Endpoint[McpSessionGroup]) -> bool:
+        return await endpoint.client.ping()
+
+    async def list_tools(self) -> list[Tool]:
+        healthy = [e for e in self.pool.endpoints if e.healthy and e.client.connected]
+        if not healthy:
+            raise ConnectionError(f"No reachable MCP server for {self.name}")
+        return await healthy[0].client.sessions[0].list_tools()
+
+    async def call_tool(self, name: str, arguments: dict[str, Any], progress_handler=None) -> str:
+        status = "error"
+        in_flight.inc(kind="mcp_calls")
+        try:
+            tried = []
+            attempts = len(self.pool.endpoints)
+            for attempt in range(attempts):
+                try:
+                    # 一次完整的 MCP 往返：请求、服务端处理和响应
+                    with span("mcp_call", tool=name), self.pool.lease(tried) as endpoint:
+                        tried.append(endpoint)
+                        result = await endpoint.client.call_tool(name, arguments, progress_handler)
+                    break
+                except Exception:
+                    # 连接或传输错误换下一个节点重试，与 BalancedChatModel 一致
+                    if attempt == attempts - 1:
+                        raise
+            # 工具自身的错误（如参数错误）不计入节点故障
+            if result.is_error:
+                status = "tool_error"
+                raise ToolException(_result_text(result))
+            status = "ok"
+            return _result_text(result)
+        finally:
+            in_flight.dec(kind="mcp_calls")
+            tool_calls.inc(tool=name, status=status)
+
+    def stats(self) -> dict:
+        return self.pool.stats()
+
+
+def _coerce_arguments(tool_input: Any, schema: dict[str, Any]) -> dict[str, Any]:
+    """
+    ReAct agents pass tool input as text; accept JSON objects or a bare value for single-argument tools.
+    """
+    if isinstance(tool_input, dict):
+        return tool_input
+    try:
+        parsed = json.loads(tool_input)
+    except (TypeError, ValueError):
+        parsed = tool_input
+    if isinstance(parsed, dict):
+        return parsed
+    properties = list(schema.get("properties", {}))
+    if len(properties) == 1:
+        return {properties[0]: parsed}
+    raise ToolException(f"Expected a JSON object with arguments {properties}")
+
+
+class PreviewListener(AsyncCallbackHandler):
+    """
+    Callback handler that asks MCP tools to report previews while they run.
+    The previews are dispatched as ``PREVIEW_EVENT`` custom events, which show up in ``astream_events``.
+    """
+
+
+def _listens_for_previews(callbacks: AsyncCallbackManager | None) -> bool:
+    return callbacks is not None and any(isinstance(handler, PreviewListener) for handler in callbacks.handlers)
+
+
+class McpTool(StructuredTool):
+    """
+    LangChain tool backed by an MCP server pool. Also accepts the text input produced by ReAct agents.
+    """
+
+    def _parse_input(self, tool_input: str | dict, tool_call_id: str | None) -> str | dict[str, Any]:
+        if isinstance(tool_input, str):
+            tool_input = _coerce_arguments(tool_input, self.args_schema)
+        return super()._parse_input(tool_input, tool_call_id)
+
+
+def make_langchain_tool(server: McpServerPool, tool: Tool) -> StructuredTool:
+    """
+    Wrap an MCP tool as a LangChain tool that calls it through the server pool.
+    """
+    async def call(callbacks: AsyncCallbackManager | None = None, **arguments: Any) -> str:
+        # 只有运行中挂了 PreviewListener 时才请求进度通知，服务端据此决定是否生成预览
+        if not _listens_for_previews(callbacks):
+            return await server.call_tool(tool.name, arguments)
+
+        async def on_progress(progress: float, total: float | None, message: str | None) -> None:
+            if message:
+                preview = json.loads(message)
+                if "preview" in preview:
+                    # 进度回调不在工具的上下文中执行，需要显式传入本次工具运行的回调
+                    await adispatch_custom_event(PREVIEW_EVENT, {"tool": tool.name, **preview},
+                                                 config={"callbacks": callbacks})
+
+        return await server.call_tool(tool.name, arguments, on_progress)
+
+    return McpTool(
+        name=tool.name,
+        description=tool.description or "",
+        args_schema=tool.inputSchema or {"type": "object", "properties": {}},
+        coroutine=call,
+        handle_tool_error=True,
+    )
+
+
+async def load_mcp_tools(mcp_configs: dict[str, dict[str, Any]], sessions_per_endpoint: int, timeout: float,
+                         eject_after_failures: int, eject_seconds: float,
+                         health_check_interval: float) -> tuple[list[StructuredTool], list[McpServerPool]]:
+    """
+    Connect to every configured MCP server group and return the LangChain tools and the pools.
+    ``mcp_configs`` maps a server name to ``{"urls": [...]}`` (a single ``"url"`` is also accepted).
+    """
+    servers: list[McpServerPool] = []
+    tools: list[StructuredTool] = []
+    try:
+        for name, config in mcp_configs.items():
+            urls = config.get("urls") or [config["url"]]
+            server = McpServerPool(name, urls, sessions_per_endpoint, timeout, eject_after_failures, eject_seconds)
+            servers.append(server)
+            await server.start(health_check_interval)
+            tools.extend(make_langchain_tool(server, tool) for tool in await server.list_tools())
+    except BaseException:
+        await asyncio.gather(*(s.close() for s in servers))
+        raise
+    return tools, servers
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from backend.app.core.config import settings
+from backend.app.services.result_handles import parse_result_handle
+
+
+_IMAGE_ID_IN_TEXT = re.compile(r"[0-9a-f]{64}")
+
+Plan = list[dict[str, Any]]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt so trivially different spellings share a cache entry.
+    """
+    prompt = unicodedata.normalize("NFKC", prompt).lower()
+    prompt = re.sub(r"\s+", " ", prompt)
+    return prompt.strip(" .。!！?？,，")
+
+
+def plan_cache_key(prompt: str, width: int, height: int, mode: str, image_format: str | None) -> str:
+    """
+    Build the cache key from the normalized prompt and the image properties the plan depends on.
+    """
+    raw = json.dumps(
+        [normalize_prompt(prompt), width, height, mode, image_format],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _replace_ids(value: Any, mapping: dict[str, str]) -> Any:
+    if isinstance(value, str):
+        # 先替换较长的占位符，避免 $step1 命中 $step10 的前缀
+        for old, new in sorted(mapping.items(), key=lambda item: -len(item[0])):
+            value = value.replace(old, new)
+        return value
+    if isinstance(value, dict):
+        return {k: _replace_ids(v, mapping) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace_ids(v, mapping) for v in value]
+    return value
+
+
+def _contains_image_id(value: Any) -> bool:
+    return bool(_IMAGE_ID_IN_TEXT.search(json.dumps(value)))
+
+
+def fill_plan_step(step: dict[str, Any], ids: dict[str, str]) -> Any:
+    """
+    Substitute the $input / $stepN placeholders of a cached step with real image IDs.
+    """
+    return _replace_ids(step["tool_input"], ids)
+
+
+class PlanRecorder(AsyncCallbackHandler):
+    """
+    Callback handler that records the tool calls made during one agent run.
+    """
+
+    def __init__(self):
+        self.calls: list[dict[str, Any]] = []
+        self.failed = False
+
+    async def on_tool_start(self, serialized: dict[str, Any] | None, input_str: str, *,
+                            inputs: dict[str, Any] | None = None, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name")
+        self.calls.append({"tool": name, "tool_input": inputs if inputs is not None else input_str, "result": None})
+
+    async def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        if self.calls:
+            handle = parse_result_handle(getattr(output, "content", output))
+            self.calls[-1]["result"] = handle["image_id"] if handle else None
+
+    async def on_tool_error(self, error: BaseException, **kwargs: Any) -> None:
+        self.failed = True
+
+    def to_plan(self, input_image_id: str) -> Plan | None:
+        """
+        Turn the recorded calls into a replayable plan.
+
+        The input image ID becomes ``$input`` and the result of the N-th call
+        becomes ``$stepN``. Returns None if the run failed or a call refers to
+        an image that is neither, since such a plan cannot be replayed.
+        """
+        if self.failed or not self.calls:
+            return None
+        mapping = {input_image_id: "$input"}
+        plan: Plan = []
+        for index, call in enumerate(self.calls):
+            if not call["tool"]:
+                return None
+            tool_input = _replace_ids(call["tool_input"], mapping)
+            if _contains_image_id(tool_input):
+                return None
+            plan.append({"tool": call["tool"], "tool_input": tool_input})
+            if call["result"]:
+                mapping[call["result"]] = f"$step{index}"
+        return plan
+
+
+class PlanCache:
+    """
+    Cache of agent tool-call plans with TTL and LRU eviction.
+
+    Recently used plans are kept in memory in front of a local SQLite file,
+    so cached plans survive restarts. Lookups do not write: access times are
+    collected in memory and written with the next ``put``, before eviction
+    needs them. The methods block on SQLite; call them from a worker thread.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, memory_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[Plan, float]] = OrderedDict()
+        # key -> 尚未写入数据库的最近访问时间
+        self._accessed: dict[str, float] = {}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            "key TEXT PRIMARY KEY, plan TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_plans_accessed ON plans (accessed)")
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.replay_failures = 0
+
+    def get(self, key: str) -> Plan | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._db.execute("SELECT plan, created FROM plans WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+            if entry is None or now - entry[1] > self.ttl_seconds:
+                if entry is not None:
+                    self._delete(key)
+                self.misses += 1
+                return None
+
+            self._remember(key, entry)
+            # 命中时不提交事务，访问时间留到下次写入时一起落盘
+            self._accessed[key] = now
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, plan: Plan) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, (plan, now))
+            self._accessed.pop(key, None)
+            if self._accessed:
+                self._db.executemany("UPDATE plans SET accessed = ? WHERE key = ?",
+                                     [(accessed, k) for k, accessed in self._accessed.items()])
+                self._accessed.clear()
+            self._db.execute(
+                "INSERT OR REPLACE INTO plans (key, plan, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(plan, ensure_ascii=False), now, now),
+            )
+            # 超出容量时删除最久未使用的计划
+            evicted = self._db.execute(
+                "DELETE FROM plans WHERE key IN ("
+                "SELECT key FROM plans ORDER BY accessed DESC LIMIT -1 OFFSET ?) RETURNING key",
+                (self.max_entries,),
+            ).fetchall()
+            self._db.commit()
+            for (evicted_key,) in evicted:
+                self._memory.pop(evicted_key, None)
+
+    def invalidate(self, key: str) -> None:
+        """
+        Drop a plan whose replay failed.
+        """
+        with self._lock:
+            self.replay_failures += 1
+            self._delete(key)
+
+    def _remember(self, key: str, entry: tuple[Plan, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _delete(self, key: str) -> None:
+        self._memory.pop(key, None)
+        self._accessed.pop(key, None)
+        self._db.execute("DELETE FROM plans WHERE key = ?", (key,))
+        self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = self._db.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "replay_failures": self.replay_failures,
+            }
+
+
+plan_cache = PlanCache(
+    settings.PLAN_CACHE_PATH,
+    ttl_seconds=settings.PLAN_CACHE_TTL_SECONDS,
+    max_entries=settings.PLAN_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,30 @@
+from langchain_core.prompts import PromptTemplate
+
+
+# hwchase17/react 提示词的本地副本：启动时不访问 LangChain Hub，离线节点也能启动
+REACT_PROMPT = """Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+
+
+def react_prompt() -> PromptTemplate:
+    """
+    The ReAct agent prompt, the same template ``hub.pull("hwchase17/react")`` returns.
+    """
+    return PromptTemplate.from_template(REACT_PROMPT)
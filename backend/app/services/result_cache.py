@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from backend.app.core.config import settings
+from backend.app.services.image_encoding import ENCODABLE_FORMATS, encoder_options, normalize_format
+from backend.app.services.image_ops import normalize_operation
+from backend.app.services.metrics import result_cache_bytes, result_cache_lookups
+
+# 图片处理算法变化导致相同参数的输出不同时递增，旧的缓存条目随之失效
+RESULT_CACHE_VERSION = 1
+
+Result = tuple[bytes, str]
+
+
+def result_cache_key(task: str, image_id: str, operations: list[dict[str, Any]],
+                     output_format: str | None, preset: str | None) -> str:
+    """
+    Build the cache key of a tool result: the input image (its ID is the hash of its bytes),
+    the task, the normalized operations, the output encoding they resolve to and the
+    threshold that picks the tiled path.
+    Raises ValueError for invalid operations or encoding parameters.
+    """
+    raw = json.dumps({
+        "version": RESULT_CACHE_VERSION,
+        "task": task,
+        "image": image_id,
+        "operations": [normalize_operation(operation) for operation in operations],
+        # 未指定格式时输出格式由配置和输入图片决定，输入图片已经包含在键中
+        "format": normalize_format(output_format) or settings.OUTPUT_FORMAT,
+        "encoder": {image_format: encoder_options(image_format, preset) for image_format in ENCODABLE_FORMATS},
+        # 逐条带处理的结果与整图处理可能相差一个色阶，阈值决定同一张图片走哪条路径
+        "tiled_threshold": settings.TILED_PIXEL_THRESHOLD,
+    }, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _MemoryTier:
+    """
+    LRU of results in memory, bounded by the total size of the encoded bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, Result] = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Result | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, result: Result) -> None:
+        size = len(result[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old[0])
+            self._entries[key] = result
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (data, _) = self._entries.popitem(last=False)
+                self.total_bytes -= len(data)
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _DiskTier:
+    """
+    Results on disk as ``<root>/<key[:2]>/<key>``, a format line followed by the encoded bytes.
+    Once the files grow past ``max_bytes`` the least recently used ones are removed.
+    """
+
+    def __init__(self, root: str | os.PathLike, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> size, ordered from least to most recently used
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+        self._loaded = False
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _ensure_loaded(self) -> None:
+        """
+        Build the LRU index from the files already on disk, oldest first.
+        """
+        if self._loaded:
+            return
+        found = []
+        if self.root.is_dir():
+            for shard in os.scandir(self.root):
+                if not shard.is_dir() or shard.name.startswith("."):
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.is_file():
+                        stat = entry.stat()
+                        found.append((stat.st_mtime, entry.name, stat.st_size))
+        found.sort()
+        for _, key, size in found:
+            self._entries[key] = size
+            self.total_bytes += size
+        self._loaded = True
+
+    def get(self, key: str) -> Result | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                image_format = f.readline().strip().decode("ascii")
+                data = f.read()
+            # mtime 作为访问时间，重启后据此恢复 LRU 顺序
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return data, image_format
+
+    def put(self, key: str, result: Result) -> None:
+        data, image_format = result
+        size = len(data) + len(image_format) + 1
+        if size > self.max_bytes:
+            return
+        incoming = self.root / ".incoming"
+        incoming.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=incoming, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(image_format.encode("ascii") + b"\n")
+                f.write(data)
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 原子 rename：读取方要么看不到文件，要么看到完整的文件
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        with self._lock:
+            self._ensure_loaded()
+            self.total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
+
+
+class ResultCache:
+    """
+    Two-tier cache of tool results (encoded bytes and format), keyed by ``result_cache_key``.
+
+    The tools are deterministic, so a result depends only on its key. Lookups
+    try memory, then disk; disk hits are promoted to memory. Identical calls
+    running at the same time share one computation.
+    """
+
+    def __init__(self, memory_bytes: int, disk_root: str | os.PathLike, disk_bytes: int):
+        self.memory = _MemoryTier(memory_bytes)
+        self.disk = _DiskTier(disk_root, disk_bytes)
+        # key -> computation in progress
+        self._pending: dict[str, asyncio.Task] = {}
+        self.outcomes = {"memory_hit": 0, "disk_hit": 0, "shared": 0, "miss": 0}
+        result_cache_bytes.set_function(lambda: self.memory.total_bytes, tier="memory")
+        result_cache_bytes.set_function(lambda: self.disk.total_bytes, tier="disk")
+
+    def _count(self, outcome: str) -> None:
+        self.outcomes[outcome] += 1
+        result_cache_lookups.inc(outcome=outcome)
+
+    async def get(self, key: str) -> Result | None:
+        """
+        Return the cached result, or None; a miss is counted by ``compute``.
+        """
+        result = self.memory.get(key)
+        if result is not None:
+            self._count("memory_hit")
+            return result
+        result = await asyncio.to_thread(self.disk.get, key)
+        if result is not None:
+            self._count("disk_hit")
+            self.memory.put(key, result)
+        return result
+
+    def is_pending(self, key: str) -> bool:
+        return key in self._pending
+
+    async def compute(self, key: str, compute: Callable[[], Awaitable[Result]]) -> Result:
+        """
+        Compute and cache the result of a missed lookup, or wait for the identical call already computing it.
+        A caller that is cancelled stops waiting but does not cancel the computation others may share.
+        """
+        task = self._pending.get(key)
+        if task is None:
+            self._count("miss")
+            task = asyncio.ensure_future(self._fill(key, compute))
+            self._pending[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self._count("shared")
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, compute: Callable[[], Awaitable[Result]]) -> Result:
+        result = await compute()
+        self.memory.put(key, result)
+        try:
+            await asyncio.to_thread(self.disk.put, key, result)
+        except OSError as e:
+            # 磁盘层写入失败只影响后续命中，不影响本次结果
+            print(f"Result cache write failed: {e}")
+        return result
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        # 所有调用方都已取消时，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        lookups = sum(self.outcomes.values())
+        hits = self.outcomes["memory_hit"] + self.outcomes["disk_hit"] + self.outcomes["shared"]
+        return {
+            **self.outcomes,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "pending": len(self._pending),
+            "memory": {
+                "entries": len(self.memory),
+                "bytes": self.memory.total_bytes,
+                "max_bytes": self.memory.max_bytes,
+                "evictions": self.memory.evictions,
+            },
+            "disk": {
+                "entries": len(self.disk),
+                "bytes": self.disk.total_bytes,
+                "max_bytes": self.disk.max_bytes,
+                "evictions": self.disk.evictions,
+            },
+        }
+
+
+result_cache = ResultCache(
+    settings.RESULT_CACHE_MEMORY_BYTES, settings.RESULT_CACHE_DIR, settings.RESULT_CACHE_DISK_MAX_BYTES,
+)
@@ -0,0 +1,51 @@
+import json
+import zipfile
+from io import BytesIO
+from typing import Any
+
+from PIL import Image
+
+from backend.app.services.image_store import image_store
+
+
+def make_result_handle(image_id: str, image_format: str, size: int) -> dict[str, Any]:
+    """
+    Build the small reference returned by tools in handle mode.
+    The image_id can be passed to another tool or downloaded from /api/results/{image_id}.
+    """
+    return {
+        "image_id": image_id,
+        "format": image_format,
+        "bytes": size,
+        "url": f"/api/results/{image_id}",
+    }
+
+
+def parse_result_handle(value: Any) -> dict[str, Any] | None:
+    """
+    Extract a result handle from a tool observation, if it contains one.
+    """
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    if isinstance(value, dict) and image_store.is_valid_id(str(value.get("image_id", ""))):
+        return value
+    return None
+
+
+def build_result_archive(entries: list[tuple[str, str]]) -> bytes:
+    """
+    Pack stored results into a zip archive.
+    ``entries`` are (file name without extension, image_id) pairs; the extension follows the image format.
+    """
+    buffer = BytesIO()
+    # 图片本身已经压缩过，直接存储比再压缩一遍快得多
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, image_id in entries:
+            path = image_store.open_path(image_id)
+            with Image.open(path) as img:
+                extension = (img.format or "bin").lower()
+            archive.write(path, arcname=f"{name}.{extension}")
+    return buffer.getvalue()
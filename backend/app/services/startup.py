@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+
+import aiohttp
+
+from backend.app.services.metrics import startup_seconds
+
+
+# 后台导入共用一个线程：多个线程同时导入同一批依赖（如 langchain_core）可能触发导入锁的死锁检测
+_import_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="startup-import")
+
+
+def _import_all(names: tuple[str, ...]) -> None:
+    for name in names:
+        importlib.import_module(name)
+
+
+async def import_in_background(*names: str) -> None:
+    """
+    Import modules in the startup import thread, so the event loop keeps serving requests meanwhile.
+    Afterwards the modules are in ``sys.modules`` and importing them again is free.
+    """
+    await asyncio.get_running_loop().run_in_executor(_import_executor, _import_all, names)
+
+
+async def warm_up_ollama(url: str, model: str, keep_alive: str, timeout: float) -> None:
+    """
+    Load ``model`` into memory on an Ollama server: a generate request without a prompt only loads the
+    model, and ``keep_alive`` keeps it loaded afterwards.
+    """
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(timeout=client_timeout) as session:
+        payload = {"model": model, "keep_alive": keep_alive}
+        async with session.post(f"{url.rstrip('/')}/api/generate", json=payload) as response:
+            response.raise_for_status()
+
+
+class StartupReport:
+    """
+    Readiness and timing of the startup phases.
+
+    The server accepts requests before the phases finish; ``ready`` becomes
+    true once every expected phase has completed. Phases may overlap, so their
+    durations can add up to more than the total.
+    """
+
+    def __init__(self, phases: Iterable[str], started: float | None = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.pending = list(phases)
+        self.durations: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+        self.total: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return not self.pending
+
+    def record(self, name: str, duration: float) -> None:
+        """
+        Mark a phase as completed after ``duration`` seconds.
+        """
+        self.durations[name] = duration
+        startup_seconds.set(duration, phase=name)
+        self.errors.pop(name, None)
+        if name in self.pending:
+            self.pending.remove(name)
+            if self.ready:
+                self.total = time.perf_counter() - self.started
+                startup_seconds.set(self.total, phase="total")
+                breakdown = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.durations.items())
+                print(f"Ready {self.total:.2f}s after start ({breakdown})")
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time a phase; a failed attempt is reported in ``errors`` and the phase stays pending.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = f"{type(e).__name__}: {e}"
+            raise
+        self.record(name, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "total_seconds": round(self.total, 3) if self.total is not None else None,
+            "phases": {name: round(seconds, 3) for name, seconds in self.durations.items()},
+            "pending": list(self.pending),
+            "errors": dict(self.errors),
+        }
@@ -0,0 +1,265 @@
+import math
+
+from PIL import Image
+
+from backend.app.core.config import settings
+from backend.app.services.image_cache import estimate_bytes, estimate_image_bytes
+from backend.app.services.image_ops import PipelineStep, step_output_size
+
+
+# LANCZOS 滤波器在每个方向上需要的源像素半径（按缩小倍数放大）
+_LANCZOS_SUPPORT = 3.0
+
+# 可以在中途停止的顺序解码器（PNG）；JPEG 等解码器必须读完整张图片
+_TRUNCATABLE_DECODERS = {"zip"}
+
+
+class MemoryLimitExceeded(ValueError):
+    """
+    Raised when processing an image would need more memory than the per-request ceiling.
+    """
+
+
+def check_memory(needed: int, what: str) -> None:
+    """
+    Raise MemoryLimitExceeded if ``needed`` bytes exceed ``TILED_MEMORY_CEILING_BYTES``.
+    """
+    ceiling = settings.TILED_MEMORY_CEILING_BYTES
+    if needed > ceiling:
+        raise MemoryLimitExceeded(
+            f"{what} needs about {needed // 2**20} MiB, more than the {ceiling // 2**20} MiB limit"
+        )
+
+
+def check_pipeline_memory(steps: list[PipelineStep], size: tuple[int, int], mode: str,
+                          source_in_memory: bool = True) -> None:
+    """
+    Raise MemoryLimitExceeded if any step would hold its input and output above the memory ceiling.
+    Only sizes are computed, so this runs before anything is decoded. ``source_in_memory`` is False
+    when the first step reads the source band by band and checks the bands itself.
+    """
+    current = estimate_bytes(mode, size) if source_in_memory else 0
+    for step in steps:
+        size = step_output_size(step, size)
+        result = estimate_bytes(mode, size)
+        check_memory(current + result, "Processing this image")
+        current = result
+
+
+def apply_decompression_limit() -> None:
+    """
+    Align Pillow's decompression bomb check with ``UPLOAD_MAX_PIXELS``.
+    Pillow only has a process-wide setting, so each process that decodes uploads calls this once at startup.
+    """
+    # 大图的安全由像素数上限和内存上限保证，不在导入时修改全局设置
+    Image.MAX_IMAGE_PIXELS = settings.UPLOAD_MAX_PIXELS
+
+
+def is_large(size: tuple[int, int]) -> bool:
+    """
+    Whether an image of ``size`` should be processed with the tiled, memory-bounded path.
+    """
+    return size[0] * size[1] > settings.TILED_PIXEL_THRESHOLD
+
+
+def _row_stride(mode: str, rawmode: str, width: int) -> int:
+    return len(Image.new(mode, (width, 1)).tobytes("raw", rawmode))
+
+
+class StripReader:
+    """
+    Decodes horizontal bands of an image file without holding the whole bitmap where the format allows it.
+
+    Uncompressed rasters (BMP, PPM, uncompressed TIFF) are read band by band
+    straight from the file. Other formats decode sequentially and are decoded
+    once; non-interlaced PNG only down to ``max_rows``. ``scale`` below 1 lets JPEG decode at
+    1/2, 1/4 or 1/8 of the size; ``size`` is then the reduced size and rows
+    are counted in it.
+    """
+
+    def __init__(self, path: str, scale: float = 1.0, max_rows: int | None = None):
+        self.path = path
+        self.scale = scale
+        with self._open() as img:
+            self.format, self.mode, self.size = img.format, img.mode, img.size
+            self.tiles = list(img.tile)
+            self.palette = img.getpalette() if img.mode in ("P", "PA") else None
+            self.transparency = img.info.get("transparency")
+            # 隔行扫描（Adam7）的 PNG 按扫描遍而不是按行存储，不能只解码前几行
+            self.interlaced = bool(img.info.get("interlace"))
+        self.raw = self._raw_layout()
+        self.max_rows = self.size[1]
+        self.limit_rows(max_rows)
+        self._decoded: Image.Image | None = None
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    @property
+    def banded(self) -> bool:
+        return self.raw is not None
+
+    def new_image(self, size: tuple[int, int]) -> Image.Image:
+        """
+        Create an empty image the bands can be pasted into, with the source's palette.
+        """
+        img = Image.new(self.mode, size)
+        if self.palette is not None:
+            img.putpalette(self.palette)
+        if self.transparency is not None:
+            img.info["transparency"] = self.transparency
+        return img
+
+    def _open(self) -> Image.Image:
+        img = Image.open(self.path)
+        if img.format == "JPEG" and self.scale < 1:
+            img.draft(img.mode, (math.ceil(img.width * self.scale), math.ceil(img.height * self.scale)))
+        return img
+
+    def _raw_layout(self) -> tuple[str, int, int, int] | None:
+        # 整张图片是一个未压缩数据块时返回 (rawmode, 行字节数, 方向, 起始偏移)
+        if len(self.tiles) != 1 or self.tiles[0][0] != "raw" or self.tiles[0][1] != (0, 0, *self.size):
+            return None
+        _, _, offset, args = self.tiles[0][:4]
+        args = args if isinstance(args, tuple) else (args,)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        return rawmode, stride or _row_stride(self.mode, rawmode, self.width), orientation, offset
+
+    def limit_rows(self, max_rows: int | None) -> None:
+        """
+        Rows below ``max_rows`` are never read, so sequential formats that allow it stop decoding there.
+        """
+        truncatable = self.tiles[:1] and self.tiles[0][0] in _TRUNCATABLE_DECODERS and not self.interlaced
+        if max_rows is not None and (self.banded or truncatable):
+            self.max_rows = max(1, min(max_rows, self.size[1]))
+
+    def band_rows(self, bytes_per_row: int) -> int:
+        """
+        Number of rows per band that keeps a band, plus the work done on it, within the memory ceiling.
+        """
+        return max(1, settings.TILED_MEMORY_CEILING_BYTES // 4 // max(1, bytes_per_row))
+
+    def decoded_bytes(self) -> int:
+        """
+        Memory held by the reader while bands are read.
+        """
+        if self.banded:
+            return 0
+        return estimate_image_bytes(Image.new(self.mode, (1, 1))) * self.width * self.max_rows
+
+    def _decode_sequential(self) -> Image.Image:
+        check_memory(self.decoded_bytes(), "Decoding this image")
+        with self._open() as img:
+            if self.max_rows < self.height:
+                # 只解码到需要的最后一行
+                name, _, offset, args = self.tiles[0][:4]
+                img.tile = [(name, (0, 0, self.width, self.max_rows), offset, args)]
+                img._size = (self.width, self.max_rows)
+            img.load()
+            return img._new(img.im)
+
+    def read_rows(self, top: int, bottom: int) -> tuple[Image.Image, int]:
+        """
+        Decode an image of the full width that contains rows ``[top, bottom)``.
+        Returns the image and the source row of its first row; sequentially decoded
+        formats return the whole decoded image instead of copying the band out of it.
+        """
+        top, bottom = max(0, top), min(bottom, self.max_rows)
+        if not self.banded:
+            if self._decoded is None:
+                self._decoded = self._decode_sequential()
+            return self._decoded, 0
+
+        rawmode, stride, orientation, offset = self.raw
+        # 自下而上存储的位图（如 BMP）从 bottom 所在的行开始读取
+        first_row = top if orientation > 0 else self.height - bottom
+        with open(self.path, "rb") as fp:
+            fp.seek(offset + first_row * stride)
+            data = fp.read((bottom - top) * stride)
+        return Image.frombytes(self.mode, (self.width, bottom - top), data, "raw", rawmode, stride, orientation), top
+
+
+def tiled_crop(path: str, box: tuple[float, float, float, float]) -> Image.Image:
+    """
+    Crop an image file band by band; only the rows inside the box are decoded where the format allows it.
+    """
+    left, upper, right, lower = (int(v) for v in box)
+    reader = StripReader(path, max_rows=lower)
+    # 先按尺寸检查，再分配结果图片
+    check_memory(estimate_bytes(reader.mode, (right - left, lower - upper)) + reader.decoded_bytes(),
+                 "Cropping this image")
+    result = reader.new_image((right - left, lower - upper))
+
+    rows = reader.band_rows(estimate_image_bytes(Image.new(reader.mode, (reader.width + result.width, 1))))
+    for top in range(max(0, upper), min(lower, reader.height), rows):
+        bottom = min(top + rows, lower, reader.height)
+        band, origin = reader.read_rows(top, bottom)
+        # 超出原图范围的部分与 Image.crop 一样保持为 0
+        result.paste(band.crop((left, top - origin, right, bottom - origin)), (0, top - upper))
+    return result
+
+
+def tiled_resize(path: str, size: tuple[int, int], box: tuple[float, float, float, float] | None = None) -> Image.Image:
+    """
+    Resize (the ``box`` region of) an image file with LANCZOS, one horizontal band at a time.
+
+    Each output band is resampled from a source band with enough extra rows
+    for the filter, so the result matches a resize of the whole image. JPEG
+    files are decoded at the smallest draft scale that still covers ``size``.
+    """
+    with Image.open(path) as img:
+        full_size = img.size
+    box = box or (0, 0, *full_size)
+    box_width, box_height = box[2] - box[0], box[3] - box[1]
+    scale = min(1.0, max(size[0] / box_width, size[1] / box_height))
+
+    reader = StripReader(path, scale=scale)
+    sx, sy = reader.width / full_size[0], reader.height / full_size[1]
+    left, upper, right, lower = box[0] * sx, box[1] * sy, box[2] * sx, box[3] * sy
+    # box 以下（加上滤波半径）的行不需要解码
+    reader.limit_rows(math.ceil(lower + _LANCZOS_SUPPORT * max(1.0, (lower - upper) / size[1])) + 1)
+
+    check_memory(estimate_bytes(reader.mode, size) + reader.decoded_bytes(), "Resizing this image")
+    result = reader.new_image(size)
+    if reader.mode in ("1", "P"):
+        # 与 Image.resize 一致，这两种模式只能使用最近邻
+        resample = Image.Resampling.NEAREST
+    else:
+        resample = Image.Resampling.LANCZOS
+
+    rows_per_output = (lower - upper) / size[1]
+    margin = math.ceil(_LANCZOS_SUPPORT * max(1.0, rows_per_output)) + 1
+    row_bytes = estimate_image_bytes(Image.new(reader.mode, (reader.width + size[0], 1)))
+    source_rows = reader.band_rows(row_bytes)
+    output_rows = max(1, int((source_rows - 2 * margin) / rows_per_output))
+
+    for out_top in range(0, size[1], output_rows):
+        out_bottom = min(out_top + output_rows, size[1])
+        src_top = upper + out_top * rows_per_output
+        src_bottom = upper + out_bottom * rows_per_output
+        band_top = max(0, math.floor(src_top) - margin)
+        band_bottom = min(reader.height, math.ceil(src_bottom) + margin)
+        # 带 box 的 resize 只会处理 box 附近的行，整张已解码的图片也不需要先裁出条带
+        band, origin = reader.read_rows(band_top, band_bottom)
+        part = band.resize((size[0], out_bottom - out_top), resample,
+                           box=(left, src_top - origin, right, src_bottom - origin))
+        result.paste(part, (0, out_top))
+    return result
+
+
+def decode_bounded(path: str, extra_bytes: int = 0) -> Image.Image:
+    """
+    Decode a whole image without caching it, after checking it fits into the memory ceiling
+    together with ``extra_bytes`` needed for the result.
+    """
+    with Image.open(path) as img:
+        check_memory(estimate_image_bytes(img) + extra_bytes, "Processing this image")
+        img.load()
+        decoded = img._new(img.im)
+        decoded.format = img.format
+    return decoded
@@ -0,0 +1,190 @@
+import contextlib
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from backend.app.core.config import settings
+from backend.app.services.metrics import in_flight, slow_requests, stage_duration
+
+
+# 当前所在的 span；新 span 作为它的子节点
+_current: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+# 工作进程中的 span 不直接计入指标，随结果返回后由主进程统一记录，避免线程池模式下重复计数
+_in_worker: ContextVar[bool] = ContextVar("in_worker", default=False)
+
+
+class Span:
+    """
+    A timed stage of a request. Spans nest into a tree whose root is the request itself.
+
+    Every finished span is observed in ``stage_duration`` under its name, so
+    names must be a small fixed set; details go into ``attrs``. When a root
+    span takes longer than ``SLOW_REQUEST_LOG_SECONDS``, its tree is logged.
+    """
+
+    def __init__(self, name: str, root: bool = False, **attrs: Any):
+        self.name = name
+        self.root = root
+        self.attrs = attrs
+        self.children: list[Span] = []
+        self.start = time.perf_counter()
+        self.duration: float | None = None
+        self.error: str | None = None
+
+    def child(self, name: str, **attrs: Any) -> "Span":
+        span = Span(name, **attrs)
+        self.children.append(span)
+        return span
+
+    def record(self, name: str, duration: float, **attrs: Any) -> "Span":
+        """
+        Add a finished child span whose duration was measured elsewhere.
+        """
+        span = self.child(name, **attrs)
+        span.start -= duration
+        span.duration = duration
+        _observe(span)
+        return span
+
+    @contextlib.contextmanager
+    def activate(self) -> Iterator["Span"]:
+        """
+        Make this span the current one without finishing it, so stages started inside become its children.
+        """
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def finish(self, error: BaseException | None = None) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.error = type(error).__name__
+        if not _in_worker.get():
+            _observe(self)
+        if self.root and 0 < settings.SLOW_REQUEST_LOG_SECONDS <= self.duration:
+            slow_requests.inc(name=self.name)
+            print(f"Slow request {self.name} took {self.duration:.3f}s:\n{self.format()}")
+
+    def format(self, depth: int = 0) -> str:
+        """
+        The span tree as indented text, one span per line.
+        """
+        duration = f"{self.duration * 1000:.1f} ms" if self.duration is not None else "unfinished"
+        details = " ".join(f"{key}={value}" for key, value in self.attrs.items())
+        line = f"{'  ' * depth}{self.name} {duration}"
+        if details:
+            line += f" {details}"
+        if self.error:
+            line += f" error={self.error}"
+        return "\n".join([line] + [child.format(depth + 1) for child in self.children])
+
+
+def _observe(span: Span) -> None:
+    stage_duration.observe(span.duration, stage=span.name)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    Time a stage as a child of the current span (or on its own outside of a request).
+    """
+    parent = _current.get()
+    current = parent.child(name, **attrs) if parent is not None else Span(name, **attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.finish(e)
+        raise
+    else:
+        current.finish()
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def trace(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    Time a whole request as a root span; stages inside become its children.
+    """
+    root = Span(name, root=True, **attrs)
+    token = _current.set(root)
+    in_flight.inc(kind=name)
+    try:
+        yield root
+    except BaseException as e:
+        root.finish(e)
+        raise
+    else:
+        root.finish()
+    finally:
+        in_flight.dec(kind=name)
+        _current.reset(token)
+
+
+async def traced_events(events: AsyncIterator[str], root: Span) -> AsyncIterator[str]:
+    """
+    Forward SSE events with ``root`` as the current span and finish it when the stream ends.
+
+    The time spent between yielding an event and being asked for the next one
+    is the time the server took to send it; it is summed into one
+    ``sse_flush`` span instead of one span per event.
+    """
+    token = _current.set(root)
+    in_flight.inc(kind=root.name)
+    flush_seconds = 0.0
+    count = 0
+    error = None
+    try:
+        async for event in events:
+            start = time.perf_counter()
+            yield event
+            flush_seconds += time.perf_counter() - start
+            count += 1
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        root.record("sse_flush", flush_seconds, events=count)
+        root.finish(error)
+        in_flight.dec(kind=root.name)
+        # 客户端断开时生成器可能在另一个上下文中被关闭
+        with contextlib.suppress(ValueError):
+            _current.reset(token)
+
+
+def traced_call(fn: Callable[..., Any], *args: Any) -> tuple[Any, list[Span]]:
+    """
+    Run ``fn(*args)`` in a worker and return its result with the spans it recorded.
+    Module-level so process pools can pickle it.
+    """
+    collector = Span("worker")
+    worker_token = _in_worker.set(True)
+    token = _current.set(collector)
+    try:
+        return fn(*args), collector.children
+    finally:
+        _current.reset(token)
+        _in_worker.reset(worker_token)
+
+
+def attach(spans: list[Span]) -> None:
+    """
+    Add spans recorded by a worker to the current span and observe them in the metrics.
+    """
+    parent = _current.get()
+    pending = list(spans)
+    while pending:
+        item = pending.pop()
+        _observe(item)
+        pending.extend(item.children)
+    if parent is not None:
+        parent.children.extend(spans)
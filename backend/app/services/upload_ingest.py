@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import BinaryIO
+
+from fastapi import UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, UnidentifiedImageError
+
+from backend.app.core.config import settings
+from backend.app.services.image_store import ImageStore, image_store
+
+
+# 读取到这么多字节后先尝试解析文件头，尽早拒绝不合格的上传
+_HEADER_SNIFF_BYTES = 64 * 1024
+
+
+class UploadRejected(ValueError):
+    """
+    Raised when an upload is too large, not an image, or an unsupported or oversized image.
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class ImageInfo:
+    """
+    Properties read from the image header, without decoding pixels.
+    """
+    width: int
+    height: int
+    format: str
+    mode: str
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+
+def _read_header(fp: str | BinaryIO) -> ImageInfo:
+    # Image.open 只读取文件头，不调用 load() 就不会解码像素
+    try:
+        with Image.open(fp) as img:
+            return ImageInfo(img.width, img.height, img.format, img.mode)
+    except Image.DecompressionBombError as e:
+        raise UploadRejected(status.HTTP_413_CONTENT_TOO_LARGE, str(e))
+
+
+def _check_limits(info: ImageInfo) -> ImageInfo:
+    if info.format not in settings.UPLOAD_ALLOWED_FORMATS:
+        raise UploadRejected(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, f"Unsupported image format: {info.format}")
+    if max(info.size) > settings.UPLOAD_MAX_DIMENSION or info.width * info.height > settings.UPLOAD_MAX_PIXELS:
+        raise UploadRejected(
+            status.HTTP_413_CONTENT_TOO_LARGE,
+            f"Image dimensions {info.width}x{info.height} exceed the limit",
+        )
+    return info
+
+
+def inspect_image(fp: str | BinaryIO) -> ImageInfo:
+    """
+    Parse only the image header and check it against the upload limits.
+    Raises UploadRejected for unsupported formats, oversized dimensions and decompression bombs.
+    """
+    try:
+        info = _read_header(fp)
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise UploadRejected(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "File is not a supported image")
+    return _check_limits(info)
+
+
+async def ingest_upload(file: UploadFile, store: ImageStore = image_store) -> tuple[str, ImageInfo]:
+    """
+    Stream an upload into the image store in chunks and return its image ID and header info.
+
+    The content is hashed while it is written, so the upload is never held in
+    memory as a whole. Uploads larger than ``UPLOAD_MAX_BYTES`` are stopped as
+    soon as they cross the limit, and the header is checked as soon as the
+    first chunk arrives, so bad files are rejected before the rest is copied.
+    """
+    if file.size is not None and file.size > settings.UPLOAD_MAX_BYTES:
+        raise UploadRejected(status.HTTP_413_CONTENT_TOO_LARGE, "Upload is too large")
+
+    writer = await run_in_threadpool(store.open_writer)
+    try:
+        head = b""
+        info = None
+        while chunk := await file.read(settings.UPLOAD_CHUNK_BYTES):
+            if writer.size + len(chunk) > settings.UPLOAD_MAX_BYTES:
+                raise UploadRejected(status.HTTP_413_CONTENT_TOO_LARGE, "Upload is too large")
+            if info is None and len(head) < _HEADER_SNIFF_BYTES:
+                head += chunk
+                if len(head) >= _HEADER_SNIFF_BYTES:
+                    info = _sniff_header(head)
+            await run_in_threadpool(writer.write, chunk)
+
+        if writer.size == 0:
+            raise UploadRejected(status.HTTP_400_BAD_REQUEST, "Upload is empty")
+        if info is None:
+            # 文件头不在开头的数据块中（或文件很小），用完整文件再解析一次
+            await run_in_threadpool(writer.flush)
+            info = await run_in_threadpool(inspect_image, writer.tmp_path)
+        image_id = await run_in_threadpool(writer.commit)
+    finally:
+        writer.abort()
+    return image_id, info
+
+
+def _sniff_header(head: bytes) -> ImageInfo | None:
+    """
+    Check the header from the first bytes of an upload.
+    Returns None if the header does not fit into them, so it is checked again on the full file.
+    """
+    try:
+        info = _read_header(BytesIO(head))
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        return None
+    return _check_limits(info)
@@ -0,0 +1,185 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Literal
+
+from backend.app.core.config import settings
+from backend.app.services.image_cache import decoded_image_cache
+from backend.app.services.metrics import in_flight
+from backend.app.services.tiled_images import apply_decompression_limit
+from backend.app.services.tracing import attach, span, traced_call
+
+
+# 工具调用因工作池已满失败时错误信息包含该文本，调用方据此返回 429
+WORKER_POOL_FULL_MESSAGE = "Worker pool queue is full"
+
+
+class WorkerPoolFull(RuntimeError):
+    """
+    Raised when a task is submitted while the pool's queue is already full.
+    """
+
+
+def _init_process_worker(cache_max_bytes: int) -> None:
+    # 每个工作进程有自己的解码缓存，总预算按进程数平分
+    decoded_image_cache.max_bytes = cache_max_bytes
+    apply_decompression_limit()
+
+
+class WorkerPool:
+    """
+    Bounded executor for CPU-bound image work.
+
+    ``kind`` selects a process pool (one interpreter per core, workers are
+    replaced after ``max_tasks_per_child`` tasks, each with its own share of
+    the decoded image cache) or a thread pool (Pillow releases the GIL for
+    resampling and encoding, and all threads share one decoded image cache).
+    At most ``max_workers``
+    tasks run at once and at most ``max_queue`` more may wait; anything beyond
+    that is rejected with WorkerPoolFull instead of piling up.
+    """
+
+    def __init__(
+        self,
+        kind: Literal["process", "thread"],
+        max_workers: int,
+        max_queue: int,
+        task_timeout: float,
+        max_tasks_per_child: int,
+    ):
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.task_timeout = task_timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor: Executor | None = None
+        self._executor_lock = threading.Lock()
+        self._slots: asyncio.Semaphore | None = None
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self) -> Executor:
+        with self._executor_lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    # max_tasks_per_child 不支持 fork 启动方式
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        max_tasks_per_child=self.max_tasks_per_child or None,
+                        initializer=_init_process_worker,
+                        initargs=(self.cache_bytes_per_worker,),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="image-worker",
+                    )
+            return self._executor
+
+    @property
+    def cache_bytes_per_worker(self) -> int:
+        if self.kind == "process":
+            return decoded_image_cache.max_bytes // self.max_workers
+        return decoded_image_cache.max_bytes
+
+    def _reset_executor(self, broken: Executor) -> None:
+        with self._executor_lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run ``fn(*args)`` in the pool and return its result.
+        ``fn`` and its arguments must be picklable when the pool uses processes.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise WorkerPoolFull(f"{WORKER_POOL_FULL_MESSAGE} ({self.max_queue} tasks waiting)")
+
+        loop = asyncio.get_running_loop()
+        slots = self._slots
+        self.queued += 1
+        acquired = False
+        # 任务在工作进程中记录的各阶段 span 随结果一起返回，挂到这个 span 下
+        with span("worker", task=getattr(fn, "__name__", "task")) as worker_span:
+            try:
+                async with asyncio.timeout(self.task_timeout):
+                    await slots.acquire()
+                    acquired = True
+                    self.queued -= 1
+                    worker_span.record("worker_queue", time.perf_counter() - worker_span.start)
+                    executor = self._get_executor()
+                    try:
+                        future = executor.submit(traced_call, fn, *args)
+                    except BaseException:
+                        slots.release()
+                        raise
+                    self.running += 1
+
+                    def _release(_):
+                        # 任务真正结束（包括超时后仍在执行的任务）才归还执行槽位
+                        self.running -= 1
+                        slots.release()
+
+                    future.add_done_callback(lambda f: loop.call_soon_threadsafe(_release, f))
+                    try:
+                        result, spans = await asyncio.wrap_future(future)
+                    except BrokenProcessPool:
+                        # 工作进程异常退出，丢弃整个进程池，下次使用时重建
+                        self._reset_executor(executor)
+                        raise
+            except TimeoutError:
+                self.timeouts += 1
+                raise TimeoutError(f"Image task timed out after {self.task_timeout}s") from None
+            except BaseException:
+                self.failed += 1
+                raise
+            finally:
+                if not acquired:
+                    self.queued -= 1
+            attach(spans)
+        self.completed += 1
+        return result
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+worker_pool = WorkerPool(
+    kind=settings.WORKER_POOL_KIND,
+    max_workers=settings.WORKER_POOL_SIZE,
+    max_queue=settings.WORKER_POOL_MAX_QUEUE,
+    task_timeout=settings.WORKER_POOL_TASK_TIMEOUT,
+    max_tasks_per_child=settings.WORKER_POOL_MAX_TASKS_PER_CHILD,
+)
+
+in_flight.set_function(lambda: worker_pool.running, kind="worker_tasks")
+in_flight.set_function(lambda: worker_pool.queued, kind="worker_queue")
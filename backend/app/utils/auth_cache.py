@@ -0,0 +1,144 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from fastapi import HTTPException, status
+
+from backend.app.core.config import settings
+from backend.app.models.user import User
+from backend.app.utils.jwt_token import verify_jwt_token
+
+
+class AuthCache:
+    """
+    Caches verified JWT claims and looked-up users for the auth dependency.
+
+    Verified claims are kept in a bounded LRU until the token's ``exp``, so a
+    stream of requests with the same token is verified once. Users are kept for
+    a short TTL on top of the database lookup. Entries of a revoked user can be
+    dropped with invalidate_user().
+    """
+
+    def __init__(self, max_tokens: int, user_ttl_seconds: float, max_users: int):
+        self.max_tokens = max_tokens
+        self.user_ttl_seconds = user_ttl_seconds
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        # token 摘要 -> (claims, 过期时间)
+        self._tokens: OrderedDict[str, tuple[dict[str, Any], float]] = OrderedDict()
+        # user_id -> (user, 缓存到期时间)
+        self._users: OrderedDict[int, tuple[User, float]] = OrderedDict()
+        # user_id -> 该用户已缓存的 token 摘要，用于撤销时一并清除
+        self._tokens_by_user: dict[int, set[str]] = {}
+        self.token_hits = 0
+        self.token_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def verify_token(self, token: str) -> dict[str, Any]:
+        """
+        Return the claims of a token, verifying its signature only on a cache miss.
+        """
+        key = self._token_key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at > now:
+                    self._tokens.move_to_end(key)
+                    self.token_hits += 1
+                    return claims
+                self._drop_token(key)
+            self.token_misses += 1
+
+        # 缓存未命中时完整验证签名和过期时间，失败直接抛出 401
+        claims = verify_jwt_token(token)
+        expires_at = float(claims.get("exp", now))
+        user_id = claims.get("user_id")
+        with self._lock:
+            self._tokens[key] = (claims, expires_at)
+            if user_id is not None:
+                self._tokens_by_user.setdefault(user_id, set()).add(key)
+            while len(self._tokens) > self.max_tokens:
+                self._drop_token(next(iter(self._tokens)))
+        return claims
+
+    def get_user(self, user_id: int) -> User | None:
+        now = time.time()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._users.move_to_end(user_id)
+                self.user_hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._users[user_id]
+            self.user_misses += 1
+            return None
+
+    def put_user(self, user: User) -> None:
+        with self._lock:
+            self._users[user.id] = (user, time.time() + self.user_ttl_seconds)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Drop the cached user and all cached tokens of a revoked user.
+        """
+        with self._lock:
+            self._users.pop(user_id, None)
+            for key in self._tokens_by_user.pop(user_id, set()):
+                self._tokens.pop(key, None)
+
+    def invalidate_token(self, token: str) -> None:
+        with self._lock:
+            self._drop_token(self._token_key(token))
+
+    def _drop_token(self, key: str) -> None:
+        entry = self._tokens.pop(key, None)
+        if entry is None:
+            return
+        user_keys = self._tokens_by_user.get(entry[0].get("user_id"))
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                self._tokens_by_user.pop(entry[0].get("user_id"), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            token_lookups = self.token_hits + self.token_misses
+            user_lookups = self.user_hits + self.user_misses
+            return {
+                "tokens": len(self._tokens),
+                "token_hits": self.token_hits,
+                "token_misses": self.token_misses,
+                "token_hit_rate": self.token_hits / token_lookups if token_lookups else 0.0,
+                "users": len(self._users),
+                "user_hits": self.user_hits,
+                "user_misses": self.user_misses,
+                "user_hit_rate": self.user_hits / user_lookups if user_lookups else 0.0,
+            }
+
+
+def credentials_exception(detail: str = "Not authenticated") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+auth_cache = AuthCache(
+    max_tokens=settings.AUTH_TOKEN_CACHE_SIZE,
+    user_ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS,
+    max_users=settings.AUTH_USER_CACHE_SIZE,
+)
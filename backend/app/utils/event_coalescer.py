@@ -0,0 +1,71 @@
+import asyncio
+import contextlib
+from typing import Any, AsyncIterator
+
+
+_END = object()
+
+
+async def coalesce_events(events: AsyncIterator[dict[str, Any]], merge_type: str, max_chars: int,
+                          max_delay: float) -> AsyncIterator[dict[str, Any]]:
+    """
+    Merge runs of consecutive ``merge_type`` events into one event whose ``content`` is their concatenation.
+
+    A merged event is sent once it holds ``max_chars`` characters, ``max_delay``
+    seconds after its first part arrived, or just before any other event, so
+    the order of events is kept while token streams turn into a few larger frames.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump() -> None:
+        # 在单独的任务中读取上游，等待超时不会打断上游的生成器
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_END)
+
+    pump_task = asyncio.create_task(pump())
+    loop = asyncio.get_running_loop()
+    parts: list[str] = []
+    size = 0
+    deadline = None
+
+    def flush() -> dict[str, Any]:
+        nonlocal size, deadline
+        merged = {"type": merge_type, "content": "".join(parts)}
+        parts.clear()
+        size, deadline = 0, None
+        return merged
+
+    try:
+        while True:
+            try:
+                timeout = None if deadline is None else max(0.0, deadline - loop.time())
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield flush()
+                continue
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if item.get("type") == merge_type:
+                parts.append(item["content"])
+                size += len(item["content"])
+                if deadline is None:
+                    deadline = loop.time() + max_delay
+                if size >= max_chars:
+                    yield flush()
+                continue
+            if parts:
+                yield flush()
+            yield item
+        if parts:
+            yield flush()
+    finally:
+        pump_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await pump_task
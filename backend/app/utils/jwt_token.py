@@ -8,18 +8,21 @@ from typing import Dict, Any
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 
+# HMAC 密钥在启动时准备一次，避免每次签发/验证都重新处理字符串密钥
+_SIGNING_KEY = jwt.get_algorithm_by_name(ALGORITHM).prepare_key(SECRET_KEY)
+
 
 def generate_jwt_token(payload: Dict[str, Any], expires_in: int = 3600) -> str:
     """生成 JWT token"""
     token_payload = payload.copy()
     token_payload['exp'] = datetime.datetime.utcnow() + datetime.timedelta(seconds=expires_in)
-    return jwt.encode(token_payload, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(token_payload, _SIGNING_KEY, algorithm=ALGORITHM)
 
 
 def verify_jwt_token(token: str) -> Dict[str, Any]:
     """验证 JWT token"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, _SIGNING_KEY, algorithms=[ALGORITHM])
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import hmac
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.app.core.config import settings
+
+
+ALGORITHM = "pbkdf2_sha256"
+# 旧格式 "hash:salt" 固定使用的迭代次数
+LEGACY_ITERATIONS = 100000
+
+
+def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), iterations).hex()
+
+
+def hash_password(password: str, iterations: int | None = None) -> str:
+    """
+    Hash a password into the versioned format ``algo$iterations$salt$hash``.
+    """
+    iterations = iterations or settings.PASSWORD_HASH_ITERATIONS
+    salt = secrets.token_hex(16)
+    return f"{ALGORITHM}${iterations}${salt}${_pbkdf2(password, salt, iterations)}"
+
+
+def verify_password(stored_password_hash: str, provided_password: str) -> bool:
+    """
+    Verify a password against a stored hash in the versioned or the legacy ``hash:salt`` format.
+    """
+    try:
+        if "$" in stored_password_hash:
+            algorithm, iterations, salt, expected = stored_password_hash.split("$", 3)
+            if algorithm != ALGORITHM:
+                return False
+            actual = _pbkdf2(provided_password, salt, int(iterations))
+        else:
+            expected, salt = stored_password_hash.split(":", 1)
+            actual = _pbkdf2(provided_password, salt, LEGACY_ITERATIONS)
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored_password_hash: str) -> bool:
+    """
+    Whether a stored hash uses an old format or a different iteration count than configured.
+    """
+    if "$" not in stored_password_hash:
+        return True
+    algorithm, iterations, _, _ = stored_password_hash.split("$", 3)
+    return algorithm != ALGORITHM or int(iterations) != settings.PASSWORD_HASH_ITERATIONS
+
+
+class PasswordHasherBusy(RuntimeError):
+    """
+    Raised when too many hashing requests are already waiting.
+    """
+
+
+class PasswordHasher:
+    """
+    Runs PBKDF2 on a dedicated thread pool so logins never block the event loop.
+
+    hashlib releases the GIL while deriving keys, so ``max_workers`` hashes run
+    in parallel. At most ``max_queue`` further requests may wait for a worker;
+    the rest are rejected with PasswordHasherBusy.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hasher")
+        self._slots: asyncio.Semaphore | None = None
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, fn, *args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many password hashing requests")
+
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, stored_password_hash: str, provided_password: str) -> bool:
+        return await self._run(verify_password, stored_password_hash, provided_password)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
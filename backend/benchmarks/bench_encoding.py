@@ -0,0 +1,77 @@
+"""
+Compare output size and encoding time of every format and preset.
+
+Usage (from backend/):
+    python benchmarks/bench_encoding.py [image ...] [--repeat N] [--json]
+
+Without arguments a synthetic photo-like image and a flat graphic are used.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+# 添加系统目录
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from backend.app.services.image_encoding import ENCODABLE_FORMATS, PRESETS, encode_image
+
+
+def synthetic_images(size: int = 1024) -> dict[str, Image.Image]:
+    # 照片类图片：渐变加噪声；图形类图片：大面积纯色和线条
+    gradient = Image.linear_gradient("L").resize((size, size))
+    noise = Image.effect_noise((size, size), 40)
+    photo = Image.merge("RGB", (gradient, noise, gradient.rotate(90)))
+    graphic = Image.new("RGBA", (size, size), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(graphic)
+    for i in range(0, size // 2, 64):
+        draw.rectangle((i, i, size - i, size - i), outline=(i % 256, 80, 200, 255), width=6)
+    return {"photo": photo, "graphic": graphic}
+
+
+def bench(img: Image.Image, image_format: str, preset: str, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data, _ = encode_image(img, output_format=image_format, preset=preset)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"format": image_format, "preset": preset, "bytes": len(data), "ms": round(statistics.median(timings), 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="image files to encode")
+    parser.add_argument("--repeat", type=int, default=5, help="encodings per combination (median is reported)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.images:
+        images = {}
+        for path in args.images:
+            with Image.open(path) as img:
+                img.load()
+                images[Path(path).name] = img
+    else:
+        images = synthetic_images()
+
+    results = {}
+    for name, img in images.items():
+        results[name] = [bench(img, f, p, args.repeat) for f in ENCODABLE_FORMATS for p in PRESETS]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, rows in results.items():
+        img = images[name]
+        print(f"\n{name} ({img.width}x{img.height} {img.mode})")
+        print(f"{'format':<6} {'preset':<9} {'bytes':>10} {'ms':>9}")
+        for row in rows:
+            print(f"{row['format']:<6} {row['preset']:<9} {row['bytes']:>10} {row['ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compare the pixel operations of the MCP tools with the equivalent Pillow ImageEnhance / ImageFilter calls.
+
+Usage (from backend/):
+    python benchmarks/bench_pixel_ops.py [image] [--size MP] [--repeat N] [--json]
+
+Each case runs the operations through ``apply_operations`` (the path the
+tools take) and through the reference Pillow calls, and reports the median
+time of both and the largest per-pixel difference between the results.
+Without an image a synthetic photo-like RGB image of ``--size`` megapixels is used.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+
+# 添加系统目录
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from backend.app.services.image_ops import apply_operations
+from backend.app.services.pixel_ops import SEPIA_MATRIX
+
+
+def synthetic_image(megapixels: float) -> Image.Image:
+    side = round((megapixels * 1_000_000) ** 0.5)
+    gradient = Image.linear_gradient("L").resize((side, side))
+    noise = Image.effect_noise((side, side), 40)
+    return Image.merge("RGB", (gradient, noise, gradient.rotate(90)))
+
+
+def _gamma(img: Image.Image, gamma: float) -> Image.Image:
+    return img.point([round(255 * (v / 255) ** (1 / gamma)) for v in range(256)] * len(img.getbands()))
+
+
+def _sepia(img: Image.Image) -> Image.Image:
+    matrix = tuple(v for row in SEPIA_MATRIX for v in (*row, 0))
+    return img.convert("RGB", matrix)
+
+
+# 每个用例：名称、工具使用的操作列表、等价的 Pillow 调用
+CASES: list[tuple[str, list[dict], Callable[[Image.Image], Image.Image]]] = [
+    ("brightness", [{"op": "brightness", "factor": 1.3}], lambda img: ImageEnhance.Brightness(img).enhance(1.3)),
+    ("contrast", [{"op": "contrast", "factor": 1.5}], lambda img: ImageEnhance.Contrast(img).enhance(1.5)),
+    ("gamma", [{"op": "gamma", "gamma": 1.8}], lambda img: _gamma(img, 1.8)),
+    ("brightness+contrast+gamma",
+     [{"op": "brightness", "factor": 1.1}, {"op": "contrast", "factor": 1.2}, {"op": "gamma", "gamma": 1.4}],
+     lambda img: _gamma(ImageEnhance.Contrast(ImageEnhance.Brightness(img).enhance(1.1)).enhance(1.2), 1.4)),
+    ("levels", [{"op": "levels", "black": 0, "white": 255}], ImageOps.autocontrast),
+    ("grayscale", [{"op": "grayscale"}], lambda img: img.convert("L")),
+    ("sepia", [{"op": "sepia"}], _sepia),
+    ("blur", [{"op": "blur", "radius": 4}], lambda img: img.filter(ImageFilter.GaussianBlur(4))),
+    ("sharpen", [{"op": "sharpen", "amount": 1.5, "radius": 2}],
+     lambda img: img.filter(ImageFilter.UnsharpMask(2, 150, 0))),
+]
+
+
+def _median_ms(fn: Callable[[], Image.Image], repeat: int) -> tuple[float, Image.Image]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def bench(img: Image.Image, name: str, operations: list[dict], reference: Callable, repeat: int) -> dict:
+    tool_ms, result = _median_ms(lambda: apply_operations(img, operations), repeat)
+    pillow_ms, expected = _median_ms(lambda: reference(img), repeat)
+    row = {"case": name, "tool_ms": round(tool_ms, 2), "pillow_ms": round(pillow_ms, 2),
+           "speedup": round(pillow_ms / tool_ms, 2) if tool_ms else None, "max_diff": None}
+    # levels 与 autocontrast 只是耗时可比，结果不同
+    if name != "levels" and result.mode == expected.mode and result.size == expected.size:
+        row["max_diff"] = int(np.abs(np.asarray(result, dtype=np.int16) - np.asarray(expected, dtype=np.int16)).max())
+    return row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", help="image file to process")
+    parser.add_argument("--size", type=float, default=4.0, help="megapixels of the synthetic image")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (median is reported)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.image:
+        with Image.open(args.image) as img:
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    else:
+        img = synthetic_image(args.size)
+
+    results = [bench(img, name, operations, reference, args.repeat) for name, operations, reference in CASES]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{img.width}x{img.height} {img.mode}")
+    print(f"{'case':<26} {'tool ms':>9} {'pillow ms':>10} {'speedup':>8} {'max diff':>9}")
+    for row in results:
+        diff = "-" if row["max_diff"] is None else row["max_diff"]
+        print(f"{row['case']:<26} {row['tool_ms']:>9.2f} {row['pillow_ms']:>10.2f} {row['speedup']:>8.2f} {diff:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Benchmark the image tools, password hashing and the agent endpoint, and compare runs against a baseline.
+
+Usage (from backend/):
+    python benchmarks/bench_suite.py [--suite tools password agent] [--sizes 0.3 2 12 50]
+        [--repeat N] [--output results.json] [--baseline baseline.json] [--threshold 0.15]
+
+Suites:
+    tools     the mcp/server.py tools in TOOL_ARGUMENTS on synthetic images of each size and
+              mode/format variant, called through an in-memory FastMCP client with the
+              result cache off, plus repeated img_resize calls served from the cache
+    password  UserCRUD.hash_password latency, and password_hasher throughput
+              with twice as many concurrent callers as hashing workers
+    agent     /agent/image_process end to end through the ASGI app, with a
+              scripted chat model in place of ChatOllama and the FastMCP
+              server served in this process: a full ReAct run, a cached plan
+              replay and a fast-path request
+
+Every case reports p50/p95/p99 latency, throughput and the peak RSS of the
+process and its worker processes, as JSON. With --baseline the run is
+compared to a saved result file, and the exit status is 1 if any case got
+slower, lost throughput or used more memory by more than the threshold.
+
+Images, the image store, the plan cache and the result cache live in a temporary directory;
+pass --work-dir to keep them, which also skips regenerating the images.
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import math
+import os
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+# 添加系统目录；main.py 中的路由以 app.* 导入
+sys.path.append(str(BACKEND_DIR.parent))
+sys.path.append(str(BACKEND_DIR))
+
+from harness import compare, environment, run_case
+
+# 测试图片的模式和格式组合
+VARIANTS = {
+    "RGB-JPEG": ("RGB", "JPEG"),
+    "RGBA-PNG": ("RGBA", "PNG"),
+    "L-PNG": ("L", "PNG"),
+    "RGB-WEBP": ("RGB", "WEBP"),
+}
+
+# 每个工具的参数，由图片尺寸计算
+TOOL_ARGUMENTS = {
+    "img_resize": lambda w, h: {"width": w // 2, "height": h // 2},
+    "img_crop": lambda w, h: {"left": w // 4, "upper": h // 4, "right": w * 3 // 4, "lower": h * 3 // 4},
+    "img_rotate": lambda w, h: {"angle": 90},
+    "img_contrast": lambda w, h: {"factor": 1.3},
+    "img_grayscale": lambda w, h: {},
+    "img_blur": lambda w, h: {"radius": 2.0},
+    "img_pipeline": lambda w, h: {"operations": [
+        {"op": "resize", "width": w // 2, "height": h // 2},
+        {"op": "rotate", "angle": 90},
+    ]},
+}
+
+# 快速路由识别不了的指令走完整的 Agent；脚本化模型对它总是给出同一个计划
+AGENT_PROMPT = "make this a postcard-style thumbnail"
+AGENT_OPERATIONS = [{"op": "resize", "width": 800, "height": 600}, {"op": "rotate", "angle": 90}]
+FAST_PATH_PROMPT = "resize to 800x600"
+
+
+def log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+def make_image(megapixels: float, mode: str, image_format: str, directory: Path) -> Path:
+    """
+    Create (or reuse) a synthetic 4:3 photo-like image: gradients with noise.
+    """
+    width = round(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = round(width * 3 / 4)
+    path = directory / f"{megapixels:g}mp_{mode}.{image_format.lower()}"
+    if not path.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        gradient = Image.linear_gradient("L").resize((width, height))
+        noise = Image.effect_noise((width, height), 40)
+        mirrored = gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        bands = {"L": [noise], "RGB": [gradient, noise, mirrored], "RGBA": [gradient, noise, mirrored, gradient]}
+        Image.merge(mode, bands[mode]).save(path, image_format)
+    return path
+
+
+def summary(name: str, case: dict) -> str:
+    return (f"{name}: p50 {case['p50_ms']:.1f} ms, p95 {case['p95_ms']:.1f} ms, "
+            f"{case['throughput_per_s']:.2f}/s, {case['peak_rss_mb']:.0f} MiB, {case['errors']} errors")
+
+
+async def bench_tools(args: argparse.Namespace, image_dir: Path) -> dict[str, dict]:
+    from fastmcp import Client
+    from backend.app.core.config import settings
+    from backend.app.services.image_store import image_store
+    from backend.mcp.server import mcp
+
+    results = {}
+    async with Client(mcp) as client:
+        for megapixels in args.sizes:
+            for variant in args.variants:
+                path = make_image(megapixels, *VARIANTS[variant], image_dir)
+                image_id = await asyncio.to_thread(image_store.put, path.read_bytes())
+                with Image.open(path) as img:
+                    width, height = img.size
+                for tool, arguments in TOOL_ARGUMENTS.items():
+                    call = functools.partial(client.call_tool, tool, {"image_id": image_id, **arguments(width, height)})
+                    name = f"tools/{tool}/{megapixels:g}MP/{variant}"
+                    results[name] = await run_case(call, args.repeat, args.concurrency, args.warmup)
+                    results[name]["size"] = [width, height]
+                    log(summary(name, results[name]))
+                # 其余用例关闭了结果缓存；这里测量重复调用命中缓存时的耗时
+                settings.RESULT_CACHE_ENABLED = True
+                try:
+                    arguments = {"image_id": image_id, **TOOL_ARGUMENTS["img_resize"](width, height)}
+                    name = f"tools/img_resize_cached/{megapixels:g}MP/{variant}"
+                    results[name] = await run_case(functools.partial(client.call_tool, "img_resize", arguments),
+                                                   args.repeat, args.concurrency, max(1, args.warmup))
+                    results[name]["size"] = [width, height]
+                    log(summary(name, results[name]))
+                finally:
+                    settings.RESULT_CACHE_ENABLED = False
+    return results
+
+
+async def bench_password(args: argparse.Namespace) -> dict[str, dict]:
+    from backend.app.core.config import settings
+    from backend.app.crud.user import UserCRUD
+    from backend.app.utils.password import password_hasher
+
+    results = {}
+    name = "password/hash_password"
+    results[name] = await run_case(
+        functools.partial(asyncio.to_thread, UserCRUD.hash_password, "benchmark-password"),
+        args.password_repeat, 1, args.warmup,
+    )
+    log(summary(name, results[name]))
+
+    name = "password/password_hasher"
+    results[name] = await run_case(
+        functools.partial(password_hasher.hash, "benchmark-password"),
+        args.password_repeat, 2 * settings.PASSWORD_HASH_WORKERS, args.warmup,
+    )
+    log(summary(name, results[name]))
+    for case in results.values():
+        case["pbkdf2_iterations"] = settings.PASSWORD_HASH_ITERATIONS
+    return results
+
+
+@contextlib.asynccontextmanager
+async def serve_mcp():
+    """
+    Serve mcp/server.py over streamable HTTP on a free local port inside this event loop.
+    """
+    import uvicorn
+    from backend.mcp.server import mcp
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(mcp.http_app(), log_level="warning"))
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    try:
+        while not server.started:
+            if task.done():
+                task.result()
+                raise RuntimeError("MCP server stopped during startup")
+            await asyncio.sleep(0.01)
+        yield f"http://127.0.0.1:{sock.getsockname()[1]}/mcp"
+    finally:
+        server.should_exit = True
+        await task
+        sock.close()
+
+
+async def bench_agent(args: argparse.Namespace, image_dir: Path) -> dict[str, dict]:
+    import httpx
+    from langchain.agents import AgentExecutor, create_react_agent
+
+    import main
+    from backend.app.core.config import settings
+    from backend.app.services.mcp_pool import load_mcp_tools
+    from backend.app.services.react_prompt import react_prompt
+    from fakes import ScriptedChatModel
+
+    path = make_image(args.agent_size, "RGB", "JPEG", image_dir)
+    data = path.read_bytes()
+    with Image.open(path) as img:
+        image_size = list(img.size)
+    results = {}
+    plan_cache_enabled = settings.PLAN_CACHE_ENABLED
+
+    async with serve_mcp() as url:
+        tools, servers = await load_mcp_tools(
+            {"imagetool": {"urls": [url]}},
+            sessions_per_endpoint=settings.MCP_SESSIONS_PER_ENDPOINT,
+            timeout=settings.MCP_CALL_TIMEOUT_SECONDS,
+            eject_after_failures=settings.BACKEND_EJECT_AFTER_FAILURES,
+            eject_seconds=settings.BACKEND_EJECT_SECONDS,
+            health_check_interval=settings.BACKEND_HEALTH_CHECK_INTERVAL_SECONDS,
+        )
+        # 与 build_agent 相同的 Agent，只把 Ollama 换成脚本化模型；lifespan 不运行，也就不会连接 Ollama
+        llm = ScriptedChatModel(operations=AGENT_OPERATIONS, token_delay=args.token_delay)
+        agent = create_react_agent(llm, tools, react_prompt())
+        main.agent_instance = AgentExecutor(agent=agent, tools=tools)
+        main.mcp_pools = servers
+
+        async def request(client: httpx.AsyncClient, prompt: str) -> None:
+            response = await client.post(
+                "/agent/image_process",
+                data={"prompt": prompt},
+                files={"file": (path.name, data, "image/jpeg")},
+            )
+            response.raise_for_status()
+            events = [json.loads(line[5:]) for line in response.text.splitlines() if line.startswith("data:")]
+            if not any(event["type"] == "final_image" for event in events):
+                errors = [event["content"] for event in events if event["type"] == "error"]
+                raise RuntimeError(errors[0] if errors else "No final_image event")
+
+        cases = [
+            ("agent/react", AGENT_PROMPT, False),
+            # 预热请求写入计划缓存，之后的请求都重放缓存的计划
+            ("agent/plan_replay", AGENT_PROMPT, True),
+            ("agent/fast_path", FAST_PATH_PROMPT, False),
+        ]
+        try:
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                for name, prompt, use_plan_cache in cases:
+                    settings.PLAN_CACHE_ENABLED = use_plan_cache
+                    results[name] = await run_case(functools.partial(request, client, prompt),
+                                                   args.repeat, args.concurrency, max(1, args.warmup))
+                    results[name]["image_size"] = image_size
+                    log(summary(name, results[name]))
+        finally:
+            settings.PLAN_CACHE_ENABLED = plan_cache_enabled
+            main.agent_instance = None
+            for server in servers:
+                await server.close()
+    return results
+
+
+async def run_suites(args: argparse.Namespace, work_dir: Path) -> dict[str, dict]:
+    from backend.app.services.worker_pool import worker_pool
+
+    results = {}
+    try:
+        if "password" in args.suite:
+            results.update(await bench_password(args))
+        if "tools" in args.suite:
+            results.update(await bench_tools(args, work_dir / "images"))
+        if "agent" in args.suite:
+            results.update(await bench_agent(args, work_dir / "images"))
+    finally:
+        worker_pool.shutdown()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", nargs="+", choices=["tools", "password", "agent"],
+                        default=["tools", "password", "agent"], help="suites to run (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=float, default=[0.3, 2, 12, 50],
+                        help="image sizes of the tools suite in megapixels")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS),
+                        help="image mode/format combinations of the tools suite")
+    parser.add_argument("--repeat", type=int, default=5, help="measured calls per tool and agent case")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured calls before each case")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent callers for tool and agent cases")
+    parser.add_argument("--password-repeat", type=int, default=50, help="measured hashes per password case")
+    parser.add_argument("--agent-size", type=float, default=2, help="size of the agent suite's image in megapixels")
+    parser.add_argument("--token-delay", type=float, default=0.0,
+                        help="seconds between tokens of the scripted chat model")
+    parser.add_argument("--work-dir", type=Path, help="directory for images, image store and plan cache")
+    parser.add_argument("--output", type=Path, help="write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", type=Path, help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="relative change that counts as a regression (default: 0.15)")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        work_dir = args.work_dir or Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="bench-")))
+        # 必须在导入配置之前设置，基准测试不写入正式的图片库和计划缓存
+        os.environ["IMAGE_STORE_DIR"] = str(work_dir / "store")
+        os.environ["PLAN_CACHE_PATH"] = str(work_dir / "plan_cache.sqlite3")
+        # 重复的相同调用会命中工具结果缓存，测量的就不再是图片处理本身
+        os.environ["RESULT_CACHE_DIR"] = str(work_dir / "results")
+        os.environ["RESULT_CACHE_ENABLED"] = "false"
+        from backend.app.core.config import settings
+
+        results = asyncio.run(run_suites(args, work_dir))
+
+    report = {
+        "environment": {
+            **environment(),
+            "worker_pool": f"{settings.WORKER_POOL_KIND}x{settings.WORKER_POOL_SIZE or os.cpu_count()}",
+            "tool_result_mode": settings.TOOL_RESULT_MODE,
+            "output_preset": settings.OUTPUT_PRESET,
+        },
+        "cases": results,
+    }
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        report["comparison"] = compare(results, baseline["cases"], args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    else:
+        print(text)
+
+    comparison = report.get("comparison")
+    if comparison:
+        for entry in comparison["regressions"]:
+            log(f"REGRESSION {entry['case']} {entry['metric']}: {entry['baseline']} -> {entry['current']}")
+        if comparison["regressions"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
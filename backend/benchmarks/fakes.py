@@ -0,0 +1,74 @@
+"""
+Deterministic stand-ins used by the end-to-end benchmark: a scripted ReAct chat model.
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that answers every ReAct request the same way, in place of ChatOllama.
+
+    The first turn calls ``tool`` with ``operations`` on the image ID found
+    in the question; once an observation is in the scratchpad it returns it as
+    the final answer. Replies are streamed word by word, ``token_delay``
+    seconds apart, to mimic a model generating tokens.
+    """
+
+    tool: str = "img_pipeline"
+    operations: list[dict] = Field(default_factory=list)
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-react"
+
+    def _reply(self, messages: list[BaseMessage]) -> str:
+        text = messages[-1].content if isinstance(messages[-1].content, str) else str(messages[-1].content)
+        # 提示词模板本身也包含 "Observation:"，只看问题之后的草稿部分
+        scratchpad = text.rsplit("\nQuestion: ", 1)[-1]
+        if "\nObservation: " in scratchpad:
+            observation = scratchpad.rsplit("\nObservation: ", 1)[1].split("\nThought:", 1)[0].strip()
+            return f" I now know the final answer\nFinal Answer: {observation}"
+        match = re.search(r"image_id:([\w.-]+)", scratchpad)
+        arguments = {"image_id": match.group(1) if match else "", "operations": self.operations}
+        return (f" I should apply all operations in one call.\nAction: {self.tool}\n"
+                f"Action Input: {json.dumps(arguments)}")
+
+    @staticmethod
+    def _tokens(reply: str) -> list[str]:
+        return re.findall(r"\s*\S+", reply)
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for token in self._tokens(self._reply(messages)):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                       run_manager: AsyncCallbackManagerForLLMRun | None = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for token in self._tokens(self._reply(messages)):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,207 @@
+"""
+Shared helpers of the benchmark suite: timing, latency percentiles, peak RSS and baseline comparison.
+"""
+import asyncio
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+# 与基线比较时的指标：名称 -> 数值变大是否更差
+METRICS = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+    "throughput_per_s": False,
+    "peak_rss_mb": True,
+}
+
+# 低于这些绝对变化量的差异视为噪声，即使相对变化超过阈值
+MIN_DELTA = {
+    "p50_ms": 1.0,
+    "p95_ms": 1.0,
+    "p99_ms": 1.0,
+    "throughput_per_s": 0.0,
+    "peak_rss_mb": 8.0,
+}
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    The ``q``-th percentile (0-100) of ``values``, linearly interpolated between the closest ranks.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    rank = (len(ordered) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def _rss_bytes(pid: int | str) -> int:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _child_pids() -> list[str]:
+    children = []
+    for task in Path("/proc/self/task").iterdir():
+        try:
+            children.extend((task / "children").read_text().split())
+        except OSError:
+            continue
+    return children
+
+
+def process_rss() -> int:
+    """
+    Resident memory of this process and its child processes (process pool workers) in bytes.
+    """
+    total = _rss_bytes("self")
+    for pid in _child_pids():
+        try:
+            total += _rss_bytes(pid)
+        except (OSError, ValueError):
+            # 子进程可能刚好退出
+            continue
+    return total
+
+
+class RssSampler:
+    """
+    Samples the resident memory of the process tree in a background thread and keeps the peak.
+
+    Without ``/proc`` (macOS), the peak falls back to ``ru_maxrss``, which
+    covers only this process and never goes down between cases.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._proc = Path("/proc/self/statm").exists()
+
+    def _sample(self) -> None:
+        self.peak = max(self.peak, process_rss())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "RssSampler":
+        if self._proc:
+            self._sample()
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+        else:
+            # ru_maxrss 在 Linux 上以 KiB 为单位，在 macOS 上以字节为单位
+            scale = 1 if sys.platform == "darwin" else 1024
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+async def run_case(fn: Callable[[], Awaitable[Any]], iterations: int, concurrency: int = 1,
+                   warmup: int = 1) -> dict:
+    """
+    Call ``fn`` ``iterations`` times from ``concurrency`` concurrent workers and summarize the latencies.
+
+    Warm-up calls run first and are not measured. Failed calls are counted
+    in ``errors`` and left out of the latency percentiles.
+    """
+    for _ in range(warmup):
+        await fn()
+
+    latencies: list[float] = []
+    errors: list[str] = []
+    remaining = iterations
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                await fn()
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        wall = time.perf_counter() - start
+
+    result = {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else float("nan"),
+        "max_ms": round(max(latencies), 3) if latencies else float("nan"),
+        "throughput_per_s": round(len(latencies) / wall, 3) if wall > 0 else float("nan"),
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+    }
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def environment() -> dict:
+    """
+    Description of the machine the results were taken on, saved next to them.
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> dict:
+    """
+    Compare the cases of two runs. A metric regresses when it got worse by more than ``threshold``
+    (relative) and by more than its noise floor in ``MIN_DELTA``.
+    """
+    regressions, improvements = [], []
+    for name, case in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, higher_is_worse in METRICS.items():
+            old, new = base.get(metric), case.get(metric)
+            # NaN（全部失败的用例）与任何值比较都为 False，会被跳过
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old > 0:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if higher_is_worse else change < -threshold
+            better = change < -threshold if higher_is_worse else change > threshold
+            if abs(new - old) <= MIN_DELTA[metric] or not (worse or better):
+                continue
+            entry = {"case": name, "metric": metric, "baseline": old, "current": new,
+                     "change_pct": round(change * 100, 1)}
+            (regressions if worse else improvements).append(entry)
+        if case.get("errors", 0) > base.get("errors", 0):
+            regressions.append({"case": name, "metric": "errors", "baseline": base.get("errors", 0),
+                                "current": case["errors"], "change_pct": None})
+    return {
+        "threshold_pct": round(threshold * 100, 1),
+        "missing_cases": sorted(set(baseline) - set(results)),
+        "regressions": regressions,
+        "improvements": improvements,
+    }
@@ -1,84 +1,200 @@
-from contextlib import asynccontextmanager
+import time
+# 开始导入本模块的时间，启动耗时从这里算起
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import json
+import math
 import base64
-from io import BytesIO
+from pathlib import Path
 from dotenv import load_dotenv
 import sys
 # 添加系统目录
 sys.path.append("../")
 
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from sse_starlette.sse import EventSourceResponse
-from PIL import Image
+from starlette.background import BackgroundTask
 
-from langchain_core.tools import tool
-from langchain_ollama import ChatOllama
-from langchain import hub
-from langchain.agents import create_react_agent, AgentExecutor
-from langchain_mcp_tools.langchain_mcp_tools import convert_mcp_to_langchain_tools
+from langchain_core.messages import BaseMessageChunk
 
 # Import auth modules
 from app.api.routes.auth import router as auth_router
+from app.api.routes.results import router as results_router
+from app.api.routes.db import router as db_router
+from backend.app.core.config import settings
+from backend.app.core.db import async_engine
+from backend.app.api.deps import OptionalUser
+from backend.app.utils.auth_cache import credentials_exception
+from backend.app.utils.body_limit import MaxBodySizeMiddleware
+from backend.app.utils.event_coalescer import coalesce_events
+from backend.app.services.captcha_client import captcha_client
+from backend.app.services.image_store import image_store
+from backend.app.services.result_handles import build_result_archive, parse_result_handle
+from backend.app.services.intent_router import RoutedIntent, intent_router
+from backend.app.services.plan_cache import PlanRecorder, fill_plan_step, plan_cache, plan_cache_key
+from backend.app.services.tiled_images import apply_decompression_limit
+from backend.app.services.upload_ingest import ImageInfo, UploadRejected, ingest_upload
+from backend.app.services.worker_pool import WORKER_POOL_FULL_MESSAGE
+from backend.app.services.job_scheduler import SchedulerFull, Ticket, agent_scheduler, fast_path_scheduler
+from backend.app.services.metrics import registry
+from backend.app.services.startup import StartupReport, import_in_background, warm_up_ollama
+from backend.app.services.tracing import Span, current_span, span, traced_events
+from backend.app.services.agent_tracing import AgentTracer
 
 # 1. 加载环境变量
 load_dotenv()
 
 
+# 每个 MCP 服务可以配置多个等价的地址（多个 server.py 进程），调用时负载均衡
 mcp_configs = {
     "imagetool": {
-        "url": "http://localhost:8000/mcp",
-        "trabsport": "http",
+        "urls": settings.MCP_ENDPOINTS,
+        "transport": "http",
     }
 }
 
+# 运行时的后端连接池，供 /agent/stats 查看
+llm_pool = None
+mcp_pools = []
+agent_instance = None
 
-@asynccontextmanager
-async def make_agent():
-    tools, cleanup = await convert_mcp_to_langchain_tools(
-            mcp_configs,
+# 启动各阶段的耗时和就绪状态，由 /ready 返回
+startup_report = StartupReport(["imports", "agent_imports", "mcp_connect", "llm_warmup", "agent"],
+                               started=_import_started)
+
+
+async def connect_mcp_tools() -> list:
+    """
+    Connect to the MCP servers, retrying until at least one server of each group answers.
+    """
+    global mcp_pools
+    from backend.app.services.mcp_pool import load_mcp_tools  # 已在后台导入
+
+    while True:
+        try:
+            with startup_report.phase("mcp_connect"):
+                tools, mcp_pools = await load_mcp_tools(
+                    mcp_configs,
+                    sessions_per_endpoint=settings.MCP_SESSIONS_PER_ENDPOINT,
+                    timeout=settings.MCP_CALL_TIMEOUT_SECONDS,
+                    eject_after_failures=settings.BACKEND_EJECT_AFTER_FAILURES,
+                    eject_seconds=settings.BACKEND_EJECT_SECONDS,
+                    health_check_interval=settings.BACKEND_HEALTH_CHECK_INTERVAL_SECONDS,
+                )
+            return tools
+        except Exception as e:
+            print(f"MCP servers not reachable, retrying in {settings.STARTUP_RETRY_SECONDS}s: {e}")
+            await asyncio.sleep(settings.STARTUP_RETRY_SECONDS)
+
+
+async def warm_up_llm() -> None:
+    """
+    Load the model on every Ollama server before the first request needs it.
+    Ready once at least one server has it loaded; servers that failed load it on their first call.
+    """
+    while True:
+        try:
+            with startup_report.phase("llm_warmup"):
+                results = await asyncio.gather(*(
+                    warm_up_ollama(url, settings.LLM_MODEL, settings.LLM_KEEP_ALIVE,
+                                   settings.LLM_WARMUP_TIMEOUT_SECONDS)
+                    for url in settings.LLM_ENDPOINTS
+                ), return_exceptions=True)
+                failed = [(url, r) for url, r in zip(settings.LLM_ENDPOINTS, results) if isinstance(r, Exception)]
+                for url, error in failed:
+                    print(f"Model warm-up failed on {url}: {error!r}")
+                if len(failed) == len(results):
+                    raise ConnectionError("No Ollama server loaded the model")
+            return
+        except Exception:
+            await asyncio.sleep(settings.STARTUP_RETRY_SECONDS)
+
+
+async def build_agent() -> None:
+    global agent_instance, llm_pool
+    # LangChain Agent、Ollama 客户端和 MCP 客户端导入较慢，在后台线程中导入，不阻塞服务开始监听；
+    # MCP 连接等待网络期间，后台线程继续导入 Agent 框架和模型客户端
+    with startup_report.phase("agent_imports"):
+        await import_in_background("backend.app.services.mcp_pool")
+        connecting = asyncio.ensure_future(connect_mcp_tools())
+        try:
+            await import_in_background("backend.app.services.llm_pool", "langchain.agents",
+                                       "backend.app.services.react_prompt")
+        except BaseException:
+            connecting.cancel()
+            raise
+    tools = await connecting
+
+    from langchain.agents import create_react_agent, AgentExecutor
+    from backend.app.services.llm_pool import BalancedChatModel, make_ollama_pool, ollama_health_check
+    from backend.app.services.react_prompt import react_prompt
+
+    with startup_report.phase("agent"):
+        # 多个 Ollama 实例组成连接池，每次调用发往未完成请求最少的健康节点
+        llm_pool = make_ollama_pool(
+            settings.LLM_MODEL,
+            settings.LLM_ENDPOINTS,
+            eject_after_failures=settings.BACKEND_EJECT_AFTER_FAILURES,
+            eject_seconds=settings.BACKEND_EJECT_SECONDS,
+            temperature=0,
+            keep_alive=settings.LLM_KEEP_ALIVE,
         )
+        llm_pool.start_health_checks(ollama_health_check, settings.BACKEND_HEALTH_CHECK_INTERVAL_SECONDS)
+        llm = BalancedChatModel(pool=llm_pool)
+        agent = create_react_agent(llm, tools, react_prompt())
+        agent_instance = AgentExecutor(agent=agent, tools=tools, verbose=True)
 
-    # --- LangChain Agent 设置 ---
-    llm = ChatOllama(model="modelscope.cn/unsloth/Qwen3-Coder-30B-A3B-Instruct-GGUF:UD-TQ1_0", temperature=0)
-    system_prompt = hub.pull("hwchase17/react")
-    agent = create_react_agent(llm, tools, system_prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
-    yield agent_executor
-    await cleanup()
 
+async def start_agent() -> None:
+    """
+    Build the agent in the background: model warm-up, module imports and the MCP connection all overlap.
+    """
+    try:
+        await asyncio.gather(warm_up_llm(), build_agent())
+    except Exception as e:
+        print(f"Agent startup failed: {e!r}")
 
 
+async def stop_agent() -> None:
+    global agent_instance, llm_pool, mcp_pools
+    agent_instance = None
+    if llm_pool is not None:
+        await llm_pool.stop_health_checks()
+    for pool in mcp_pools:
+        await pool.close()
+    llm_pool, mcp_pools = None, []
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global agent_instance
-    # 应用启动时执行
-    async with make_agent() as agent:
-        agent_instance = agent
-        yield
+    # 应用启动时执行；Agent 在后台构建，MCP 连接建立后快速路由即可使用，其他接口一直可用
+    apply_decompression_limit()
+    await captcha_client.start()
+    startup = asyncio.create_task(start_agent())
+    yield
     # 应用关闭时执行清理工作
-    agent_instance = None
+    startup.cancel()
+    with suppress(asyncio.CancelledError):
+        await startup
+    await stop_agent()
+    await captcha_client.close()
+    await async_engine.dispose()
 
 # 使用 lifespan 初始化 FastAPI 应用
 app = FastAPI(lifespan=lifespan)
 
 # Include auth routes
 app.include_router(auth_router)
+app.include_router(results_router)
+app.include_router(db_router)
 
-# --- 图片处理工具定义 ---
-# 使用 @tool 装饰器可以非常方便地将一个函数变成 LangChain 工具
-@tool
-def convert_image_to_grayscale(image_bytes: bytes) -> bytes:
-    """
-    Receives an image as bytes, converts it to grayscale, and returns the processed image as bytes.
-    Use this tool when the user asks to make an image grayscale or black and white.
-    """
-    image = Image.open(BytesIO(image_bytes))
-    grayscale_image = image.convert("L")
-    output_buffer = BytesIO()
-    grayscale_image.save(output_buffer, format=image.format or "PNG")
-    return output_buffer.getvalue()
+# 限制请求体大小，超大上传在解析表单前就被拒绝
+app.add_middleware(MaxBodySizeMiddleware, max_bytes=settings.UPLOAD_MAX_REQUEST_BYTES)
 
 # 3. CORS 中间件
 app.add_middleware(
@@ -90,70 +206,556 @@ app.add_middleware(
 )
 
 
+def final_image_event(handle: dict) -> str:
+    """
+    Build the final_image SSE event that references a stored result.
+    """
+    return json.dumps({
+        "type": "final_image",
+        "image_id": handle["image_id"],
+        "url": handle.get("url", f"/api/results/{handle['image_id']}"),
+        "format": f"image/{handle.get('format', 'PNG').lower()}",
+    })
+
+
+def preview_event(image_format: str, data: str, tool_name: str | None = None) -> str:
+    """
+    Build the preview SSE event carrying a low-resolution Base64 image that arrives before the full result.
+    """
+    return json.dumps({
+        "type": "preview",
+        "content": data,
+        "format": f"image/{image_format.lower()}",
+        "tool": tool_name,
+    })
+
+
+def image_tool_server():
+    """
+    The MCP server pool of the image tools, or None while it is still connecting.
+    """
+    return next((pool for pool in mcp_pools if pool.name == "imagetool"), None)
+
+
+def start_fast_path_call(image_id: str, intent: RoutedIntent) -> tuple[asyncio.Future, asyncio.Queue]:
+    """
+    直接调用 img_pipeline 工具执行快速路由识别出的操作，不经过 LLM。
+    与 Agent 的工具调用一样经过 MCP 服务的工作池（排队、超时、结果缓存）；返回调用本身和预览队列。
+    """
+    previews: asyncio.Queue[dict] = asyncio.Queue()
+
+    async def on_progress(progress: float, total: float | None, message: str | None) -> None:
+        if message:
+            preview = json.loads(message)
+            if "preview" in preview:
+                previews.put_nowait(preview)
+
+    # 传入进度回调时服务端才会生成预览
+    progress_handler = on_progress if settings.PREVIEW_ENABLED else None
+    arguments = {"image_id": image_id, "operations": intent.operations}
+    call = asyncio.ensure_future(image_tool_server().call_tool("img_pipeline", arguments, progress_handler))
+    return call, previews
+
+
+async def await_fast_path_admission(call: asyncio.Future, previews: asyncio.Queue) -> dict | None:
+    """
+    Wait until the tool call has been accepted (the first preview arrives) or has finished, before the
+    response starts, so a full worker pool is answered with 429. Returns the first preview, if any.
+    """
+    waiter = asyncio.ensure_future(previews.get())
+    try:
+        await asyncio.wait({call, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not waiter.done():
+            waiter.cancel()
+    if waiter.done() and not waiter.cancelled():
+        return waiter.result()
+    error = call.exception()
+    if error is not None and WORKER_POOL_FULL_MESSAGE in str(error):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(error),
+            headers={"Retry-After": "1"},
+        )
+    return None
+
+
+async def fast_path_event_generator(intent: RoutedIntent, call: asyncio.Future, previews: asyncio.Queue,
+                                    first_preview: dict | None):
+    """
+    把已经开始的快速路径工具调用转换为与 Agent 相同类型的 SSE 事件。
+    """
+    waiter = None
+    try:
+        yield json.dumps({"type": "thought", "content": f"Fast path: {json.dumps(intent.operations)}"})
+        if first_preview is not None and not call.done():
+            yield preview_event(first_preview["format"], first_preview["preview"], "img_pipeline")
+        while not call.done():
+            waiter = asyncio.ensure_future(previews.get())
+            await asyncio.wait({call, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if waiter.done() and not call.done():
+                preview = waiter.result()
+                yield preview_event(preview["format"], preview["preview"], "img_pipeline")
+            waiter.cancel()
+        observation = await call
+        handle = parse_result_handle(observation)
+        if handle is None:
+            raise ValueError(f"img_pipeline did not return an image: {observation}")
+        yield json.dumps({"type": "observation", "content": observation})
+        yield json.dumps({"type": "final_output", "content": "; ".join(intent.descriptions)})
+        yield final_image_event(handle)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        yield json.dumps({"type": "error", "content": str(e)})
+    finally:
+        # 客户端断开时不再等待工具结果
+        for future in (call, waiter):
+            if future is not None:
+                future.cancel()
+        yield json.dumps({"type": "end"})
+
+
+# Agent 事件流只订阅需要转发的事件：模型输出的 token、工具调用、工具预览以及 Agent 本身的最终结果
+# （自定义事件按事件名而不是运行类型过滤）
+AGENT_EVENT_TYPES = ["chat_model", "llm", "tool"]
+
+
+async def agent_events(agent_input: dict, callbacks: list):
+    """
+    把 Agent 的事件流转换为要转发给前端的事件（尚未序列化）。
+    """
+    from backend.app.services.mcp_pool import PREVIEW_EVENT  # Agent 构建前已在后台导入
+
+    events = agent_instance.astream_events(
+        agent_input,
+        version="v2",
+        config={"callbacks": callbacks},
+        include_types=AGENT_EVENT_TYPES,
+        include_names=["AgentExecutor", PREVIEW_EVENT],
+    )
+    async for event in events:
+        kind = event["event"]
+        # 模型输出的 token，即 Agent 的思考过程
+        if kind in ("on_chat_model_stream", "on_llm_stream"):
+            chunk = event["data"]["chunk"]
+            text = chunk.content if isinstance(chunk, BaseMessageChunk) else chunk.text
+            if text:
+                yield {"type": "thought", "content": text}
+
+        # 工具执行完成，返回的是结果引用（handle 模式）或文本，都只是很小的字符串
+        elif kind == "on_tool_end":
+            output = event["data"].get("output")
+            yield {"type": "observation", "content": str(getattr(output, "content", output))}
+
+        # 工具执行期间上报的低分辨率预览
+        elif kind == "on_custom_event" and event["name"] == PREVIEW_EVENT:
+            yield {"type": "preview", **event["data"]}
+
+        # Agent 本身结束时给出最终答案
+        elif kind == "on_chain_end" and not event["parent_ids"]:
+            output = event["data"].get("output")
+            yield {"type": "final_output", "content": output.get("output") if isinstance(output, dict) else output}
+
+
+async def agent_event_generator(agent_input: dict, image_id: str, content_type: str | None,
+                                cache_key: str | None = None, recorder: PlanRecorder | None = None):
+    """
+    通过 Agent 处理请求并流式返回事件；成功时把本次的工具调用计划写入计划缓存。
+    传入 recorder 时，调用方可以在结束后取得本次的工具调用计划。
+    """
+    from backend.app.services.mcp_pool import PreviewListener  # Agent 构建前已在后台导入
+
+    # 最近一次工具返回的结果引用，结束时只把引用发给前端，由前端单独下载图片
+    result_handle = None
+    recorder = recorder or PlanRecorder()
+    try:
+        # 连续的 token 合并成按大小或时间切分的帧，减少小块网络写入
+        events = coalesce_events(
+            agent_events(agent_input, [recorder, PreviewListener(), AgentTracer()]),
+            merge_type="thought",
+            max_chars=settings.SSE_COALESCE_MAX_CHARS,
+            max_delay=settings.SSE_COALESCE_MAX_DELAY_SECONDS,
+        )
+        async for event in events:
+            if event["type"] == "preview":
+                yield preview_event(event["format"], event["preview"], event["tool"])
+                continue
+
+            if event["type"] == "observation":
+                result_handle = parse_result_handle(event["content"]) or result_handle
+
+            elif event["type"] == "final_output":
+                final_output = event["content"]
+                result_handle = parse_result_handle(final_output) or result_handle
+                # bytes 模式下工具直接返回图片字节，保留原来的 Base64 传输方式
+                if isinstance(final_output, bytes):
+                    with span("base64"):
+                        encoded = base64.b64encode(final_output).decode('utf-8')
+                    yield json.dumps({
+                        "type": "final_image",
+                        "content": encoded,
+                        "format": content_type
+                    })
+                    continue
+
+            yield json.dumps(event)
+
+        if result_handle is not None:
+            yield final_image_event(result_handle)
+            plan = recorder.to_plan(image_id)
+            if cache_key is not None and plan:
+                await asyncio.to_thread(plan_cache.put, cache_key, plan)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        yield json.dumps({"type": "error", "content": str(e)})
+    finally:
+        yield json.dumps({"type": "end"})
+
+
+async def replay_plan(plan: list[dict], image_id: str) -> tuple[dict, list[str]]:
+    """
+    依次调用计划中的 MCP 工具处理一张图片，返回最终结果引用和每一步的观察结果。
+    """
+    tools = {t.name: t for t in agent_instance.tools}
+    ids = {"$input": image_id}
+    result_handle = None
+    observations = []
+    for index, step in enumerate(plan):
+        observation = await tools[step["tool"]].ainvoke(fill_plan_step(step, ids))
+        result_handle = parse_result_handle(observation)
+        if result_handle is None:
+            raise ValueError(f"Cached step {step['tool']} did not return an image")
+        ids[f"$step{index}"] = result_handle["image_id"]
+        observations.append(observation)
+    return result_handle, observations
+
+
+async def replay_event_generator(plan: list[dict], image_id: str, cache_key: str,
+                                 agent_input: dict, content_type: str | None):
+    """
+    重放缓存的工具调用计划，不调用 LLM；重放失败时回退到一次完整的 Agent 运行。
+    """
+    try:
+        result_handle, observations = await replay_plan(plan, image_id)
+    except Exception as e:
+        print(f"Cached plan replay failed: {e}")
+        await asyncio.to_thread(plan_cache.invalidate, cache_key)
+        async for event in agent_event_generator(agent_input, image_id, content_type, cache_key):
+            yield event
+        return
+
+    yield json.dumps({"type": "thought", "content": f"Replaying cached plan: {json.dumps(plan, ensure_ascii=False)}"})
+    for observation in observations:
+        yield json.dumps({"type": "observation", "content": observation})
+    yield json.dumps({"type": "final_output", "content": "Replayed cached plan"})
+    yield final_image_event(result_handle)
+    yield json.dumps({"type": "end"})
+
+
+async def batch_event_generator(prompt: str, items: list[tuple[str, str]], infos: list[ImageInfo],
+                                content_types: list[str | None]):
+    """
+    批处理：按尺寸、模式和格式把图片分组，每组只规划一次工具调用，再把该组的计划并行应用到组内图片。
+    items 为 (文件名, image_id) 列表，infos 和 content_types 与之一一对应；
+    每张图片单独返回进度和结果事件，最后返回结果压缩包。
+    """
+    tasks: list[asyncio.Task] = []
+    try:
+        yield json.dumps({"type": "batch_start", "count": len(items)})
+        results: dict[int, str] = {}
+        # 计划中的几何参数按图片尺寸解析，只能在计划缓存键相同的图片之间共享
+        groups: dict[tuple, list[int]] = {}
+        for index, info in enumerate(infos):
+            groups.setdefault((info.size, info.mode, info.format), []).append(index)
+
+        plans: dict[int, list[dict]] = {}
+        for (image_size, image_mode, image_format), indexes in groups.items():
+            first = indexes[0]
+            first_id = items[first][1]
+
+            # 与单张处理相同的顺序获取计划：快速路由、计划缓存、最后才调用 Agent
+            plan = None
+            cache_key = None
+            intent = intent_router.route(prompt, image_size)
+            if intent is not None:
+                plan = [{"tool": "img_pipeline", "tool_input": {"image_id": "$input", "operations": intent.operations}}]
+            elif settings.PLAN_CACHE_ENABLED:
+                cache_key = plan_cache_key(prompt, *image_size, image_mode, image_format)
+                plan = await asyncio.to_thread(plan_cache.get, cache_key)
+
+            if plan is None:
+                recorder = PlanRecorder()
+                agent_input = {"input": agent_prompt(prompt, first_id, infos[first])}
+                async for event in agent_event_generator(agent_input, first_id, content_types[first], cache_key,
+                                                         recorder):
+                    data = json.loads(event)
+                    if data["type"] == "end":
+                        continue
+                    if data["type"] == "final_image" and "image_id" in data:
+                        results[first] = data["image_id"]
+                    yield json.dumps({**data, "index": first})
+                plan = recorder.to_plan(first_id)
+                if not plan or first not in results:
+                    for index in indexes:
+                        if index not in results:
+                            yield json.dumps({"type": "error", "index": index,
+                                              "content": "Could not derive a reusable plan for this image size"})
+                    continue
+
+            yield json.dumps({"type": "plan", "content": plan, "indexes": indexes})
+            for index in indexes:
+                plans[index] = plan
+
+        events: asyncio.Queue[str] = asyncio.Queue()
+        slots = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+        async def run_one(index: int, image_id: str) -> None:
+            async with slots:
+                await events.put(json.dumps({"type": "progress", "index": index, "status": "running"}))
+                try:
+                    handle, _ = await replay_plan(plans[index], image_id)
+                except Exception as e:
+                    await events.put(json.dumps({"type": "error", "index": index, "content": str(e)}))
+                    return
+                results[index] = handle["image_id"]
+                await events.put(json.dumps({**json.loads(final_image_event(handle)), "type": "result", "index": index}))
+
+        pending = [(index, items[index][1]) for index in sorted(plans) if index not in results]
+        tasks = [asyncio.create_task(run_one(index, image_id)) for index, image_id in pending]
+        # 每张图片恰好产生两个事件：开始处理，以及结果或错误
+        for _ in range(2 * len(pending)):
+            yield await events.get()
+
+        entries = [(f"{index:03d}_{Path(items[index][0]).stem}", results[index]) for index in sorted(results)]
+        archive_id = None
+        if entries:
+            archive = await run_in_threadpool(build_result_archive, entries)
+            archive_id = await run_in_threadpool(image_store.put, archive)
+        yield json.dumps({
+            "type": "batch_complete",
+            "succeeded": len(results),
+            "failed": len(items) - len(results),
+            "zip_url": f"/api/results/{archive_id}" if archive_id else None,
+        })
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        yield json.dumps({"type": "error", "content": str(e)})
+    finally:
+        # 客户端断开时取消仍在运行的图片任务
+        for task in tasks:
+            task.cancel()
+        yield json.dumps({"type": "end"})
+
+
+async def scheduled_event_generator(ticket: Ticket, events):
+    """
+    排队等待调度时发送 queue_position 事件，获得运行名额后再转发任务事件。
+    客户端断开时生成器被取消，ticket 随之出队或释放名额。
+    """
+    queued_at = time.perf_counter()
+    try:
+        async for position in ticket.wait():
+            yield json.dumps({"type": "queue_position", "position": position})
+        request_span = current_span()
+        if request_span is not None:
+            request_span.record("agent_queue", time.perf_counter() - queued_at)
+        async for event in events:
+            yield event
+    finally:
+        await events.aclose()
+        ticket.release()
+
+
 # --- API 路由 ---
+@app.get("/metrics")
+async def metrics() -> Response:
+    """
+    Prometheus metrics: stage durations, tool calls, agent iterations and work in flight.
+    """
+    return Response(registry.render(), media_type=registry.content_type)
+
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """
+    Readiness probe: 200 once the agent is built and the model is loaded, 503 before.
+    The body reports the startup time breakdown.
+    """
+    report = startup_report.stats()
+    status_code = status.HTTP_200_OK if report["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(report, status_code=status_code)
+
+
+@app.get("/agent/stats")
+async def agent_stats() -> dict:
+    """
+    Runtime statistics of the agent endpoint.
+    """
+    return {
+        "intent_router": intent_router.stats(),
+        "plan_cache": await asyncio.to_thread(plan_cache.stats),
+        "scheduler": agent_scheduler.stats(),
+        "fast_path_scheduler": fast_path_scheduler.stats(),
+        "llm_pool": llm_pool.stats() if llm_pool is not None else None,
+        "mcp_pools": [pool.stats() for pool in mcp_pools],
+    }
+
+
+async def ingest_or_reject(file: UploadFile) -> tuple[str, ImageInfo]:
+    """
+    Stream an upload into the image store, turning rejected uploads into HTTP errors.
+    """
+    try:
+        return await ingest_upload(file)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+def agent_prompt(prompt: str, image_id: str, info: ImageInfo) -> str:
+    """
+    Agent 的输入：用户指令 + 图片引用，并附上已解析的尺寸和格式，省去 Agent 自行查询。
+    """
+    return f"{prompt},image_id:{image_id},width:{info.width},height:{info.height},format:{info.format}"
+
+
+def admit_agent_job(request: Request, user, fast_path: bool = False) -> Ticket:
+    """
+    Submit a job to the agent scheduler (fast-path jobs to their own scheduler), rejecting with 503 while
+    what the job needs is still starting (the image tools for fast-path jobs, the agent otherwise) and
+    with 429 when the queue is full.
+    """
+    starting = image_tool_server() is None if fast_path else agent_instance is None
+    if starting:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The image tools are still starting" if fast_path else "The agent is still starting",
+            headers={"Retry-After": str(math.ceil(settings.STARTUP_RETRY_SECONDS))},
+        )
+    tenant = f"user:{user.id}" if user is not None else f"ip:{request.client.host if request.client else 'unknown'}"
+    scheduler = fast_path_scheduler if fast_path else agent_scheduler
+    try:
+        return scheduler.submit(tenant)
+    except SchedulerFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
 # 修改接口以接收文件和表单数据
 @app.post("/agent/image_process")
 async def image_process_agent(
+    request: Request,
+    user: OptionalUser,
     prompt: str = Form(...),
     file: UploadFile = File(...)
 ):
     """
     接收图片和指令，通过 Agent 处理，并流式返回结果。
     """
-    image_bytes = await file.read()
-    # 保存到本地的临时文件
-    image_path = f"temp_{file.filename}"
-    with open(image_path, "wb") as f:
-        f.write(image_bytes)
+    if user is None and settings.AGENT_REQUIRE_AUTH:
+        raise credentials_exception()
+
+    # 整个请求（上传到最后一个 SSE 事件发出）的耗时树，各阶段是它的子 span
+    request_span = Span("agent_request", root=True)
+
+    # 分块写入图片库并同时计算内容哈希；只解析文件头获取尺寸、模式和格式，供快速路由和计划缓存使用
+    with request_span.activate(), span("upload"):
+        image_id, info = await ingest_or_reject(file)
+    image_size, image_mode, image_format = info.size, info.mode, info.format
+
+    # 简单指令直接调用工具，跳过 LLM 推理；与批处理一样依赖工具返回的结果引用
+    intent = intent_router.route(prompt, image_size) if settings.TOOL_RESULT_MODE == "handle" else None
+    if intent is not None:
+        # 快速路径使用独立的调度器，不排在 Agent 任务后面；排队很短，在响应开始前等待名额
+        ticket = admit_agent_job(request, user, fast_path=True)
+        request_span.attrs["path"] = "fast_path"
+        call = None
+        try:
+            with request_span.activate(), span("fast_path_queue"):
+                async for _ in ticket.wait():
+                    pass
+            call, previews = start_fast_path_call(image_id, intent)
+            # 工作池已满时在响应开始前返回 429
+            first_preview = await await_fast_path_admission(call, previews)
+        except BaseException:
+            if call is not None:
+                call.cancel()
+            ticket.release()
+            raise
+        events = fast_path_event_generator(intent, call, previews, first_preview)
+        # 名额已经拿到，响应结束（包括客户端断开）时释放
+        return EventSourceResponse(traced_events(events, request_span), ping=settings.SSE_PING_SECONDS,
+                                   background=BackgroundTask(ticket.release))
 
     # Agent 的输入现在包含文本和图片
     agent_input = {
-        "input": f"{prompt},image_path:{image_path}",
+        "input": agent_prompt(prompt, image_id, info),
     }
 
-    async def event_generator():
-        try:
-            # astream_log 仍然是我们的核心
-            async for chunk in agent_instance.astream_log(agent_input):
-                for op in chunk.ops:
-                    path = op["path"]
-                    # 同样，流式返回思考过程
-                    if path.endswith("/logs/action/streamed_output_str"):
-                        yield json.dumps({"type": "thought", "content": op["value"]})
-                    
-                    # 当工具执行完成后，它的输出在这里
-                    elif path.endswith("/logs/observation/streamed_output_str"):
-                        # 工具的输出可能是字符串，也可能是我们返回的图片字节
-                        # 这里我们只流式传输文本观察结果
-                         yield json.dumps({"type": "observation", "content": op["value"]})
-
-                    # 当最终答案生成时
-                    elif path.endswith("/logs/final_output"):
-                        # 最终输出对象里包含了我们的图片字节
-                        final_output = op.get("value", {}).get("output")
-                        
-                        # 检查最终输出是否是我们的图片工具返回的结果
-                        # 这里我们假设如果 Agent 成功调用工具，最终输出就是图片字节
-                        # 在更复杂的场景中，您可能需要更精细的逻辑来区分文本和图片输出
-                        if isinstance(final_output, bytes):
-                            # 如果是图片字节，进行Base64编码后发送
-                            encoded_image = base64.b64encode(final_output).decode('utf-8')
-                            yield json.dumps({
-                                "type": "final_image", 
-                                "content": encoded_image,
-                                "format": file.content_type
-                            })
-                        else:
-                            # 如果是文本，则正常发送
-                            yield json.dumps({"type": "final_output", "content": final_output})
+    # 需要 Agent 的请求先经过调度器：限制并发，按用户（匿名时按客户端地址）公平排队
+    ticket = admit_agent_job(request, user)
+
+    request_span.attrs["path"] = "agent"
+    if not settings.PLAN_CACHE_ENABLED:
+        events = agent_event_generator(agent_input, image_id, file.content_type)
+    else:
+        # 相同指令 + 相同图片属性命中缓存时直接重放工具调用
+        cache_key = plan_cache_key(prompt, *image_size, image_mode, image_format)
+        plan = await asyncio.to_thread(plan_cache.get, cache_key)
+        if plan is not None:
+            request_span.attrs["path"] = "plan_replay"
+            events = replay_event_generator(plan, image_id, cache_key, agent_input, file.content_type)
+        else:
+            events = agent_event_generator(agent_input, image_id, file.content_type, cache_key)
+    # 响应结束后再释放一次，防止生成器从未启动时名额泄漏
+    return EventSourceResponse(traced_events(scheduled_event_generator(ticket, events), request_span),
+                               ping=settings.SSE_PING_SECONDS, background=BackgroundTask(ticket.release))
+
+
+@app.post("/agent/batch_process")
+async def batch_process_agent(
+    request: Request,
+    user: OptionalUser,
+    prompt: str = Form(...),
+    files: list[UploadFile] = File(...)
+):
+    """
+    接收多张图片和一条指令：相同尺寸的图片只规划一次，并行处理所有图片，流式返回每张图片的进度和结果。
+    """
+    if user is None and settings.AGENT_REQUIRE_AUTH:
+        raise credentials_exception()
+    if len(files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BATCH_MAX_FILES} files per batch"
+        )
+    if settings.TOOL_RESULT_MODE != "handle":
+        # 计划重放依赖工具返回的结果引用
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batch processing requires TOOL_RESULT_MODE=handle"
+        )
+
+    request_span = Span("batch_request", root=True, files=len(files))
+    items = []
+    infos = []
+    for file in files:
+        with request_span.activate(), span("upload"):
+            image_id, info = await ingest_or_reject(file)
+        items.append((file.filename or image_id[:12], image_id))
+        infos.append(info)
+
+    # 整个批次作为一个 Agent 任务排队
+    ticket = admit_agent_job(request, user)
+    events = batch_event_generator(prompt, items, infos, [file.content_type for file in files])
+    return EventSourceResponse(traced_events(scheduled_event_generator(ticket, events), request_span),
+                               ping=settings.SSE_PING_SECONDS, background=BackgroundTask(ticket.release))
 
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            yield json.dumps({"type": "error", "content": str(e)})
-        finally:
-            yield json.dumps({"type": "end"})
 
-    return EventSourceResponse(event_generator())
+startup_report.record("imports", time.perf_counter() - _import_started)
 
 
 if __name__ == "__main__":
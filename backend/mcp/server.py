@@ -1,97 +1,449 @@
-from fastmcp import FastMCP
-from PIL import Image
-from io import BytesIO
-import os
+import asyncio
+import base64
+import functools
+import json
+from fastmcp import Context, FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+import sys
+# 添加系统目录
+sys.path.append("../../")
+
+from backend.app.core.config import settings
+from backend.app.services.image_store import image_store
+from backend.app.services.result_handles import make_result_handle
+from backend.app.services.image_cache import decoded_image_cache
+from backend.app.services.result_cache import result_cache, result_cache_key
+from backend.app.services.worker_pool import worker_pool
+from backend.app.services import image_tasks
+from backend.app.services.tiled_images import apply_decompression_limit
+from backend.app.services.metrics import registry, tool_calls
+from backend.app.services.tracing import span, trace
 
 mcp = FastMCP("ImageTools")
 
 
+def _image_path(image_id: str) -> str:
+    """
+    Resolve an image ID from the shared image store to its file path.
+    """
+    return str(image_store.open_path(image_id))
+
+
+async def _tool_result(result: tuple[bytes, str]) -> bytes | dict:
+    """
+    Return encoded image bytes as-is, or store them and return a small handle in handle mode.
+    """
+    data, image_format = result
+    if settings.TOOL_RESULT_MODE == "bytes":
+        return data
+    with span("store_result"):
+        image_id = await asyncio.to_thread(image_store.put, data)
+    return make_result_handle(image_id, image_format, len(data))
+
+
+def _wants_preview(ctx: Context) -> bool:
+    """
+    Previews are only worth computing when the caller asked for progress notifications.
+    """
+    meta = getattr(ctx.request_context, "meta", None)
+    # 不同版本的 fastmcp 中 meta 分别是原始字典或 pydantic 对象
+    token = meta.get("progressToken") if isinstance(meta, dict) else getattr(meta, "progressToken", None)
+    return settings.PREVIEW_ENABLED and token is not None
+
+
+def _cache_key(task, image_id: str, operations: list[dict], output_format: str | None,
+               preset: str | None) -> str | None:
+    """
+    Result cache key of a tool call, or None when caching is off or the parameters are invalid
+    (the task then reports the error).
+    """
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    try:
+        return result_cache_key(task.__name__, image_id, operations, output_format, preset)
+    except ValueError:
+        return None
+
+
+async def _run_tool(ctx: Context, tool: str, image_id: str, operations: list[dict],
+                    output_format: str | None, preset: str | None, task, *args) -> bytes | dict:
+    """
+    Run an image task in the worker pool, or reuse the cached result of an identical call.
+    If the caller listens for progress, a low-resolution preview of the result is computed
+    alongside and reported as soon as it is ready.
+    """
+    status = "error"
+    preview = None
+    result = None
+    # 每次工具调用是一个请求：工作池排队、解码、变换、编码和结果存储都是它的子阶段
+    with trace("mcp_tool", tool=tool):
+        try:
+            image_path = _image_path(image_id)
+            key = _cache_key(task, image_id, operations, output_format, preset)
+            cached = None
+            if key is not None:
+                with span("result_cache"):
+                    cached = await result_cache.get(key)
+            if cached is not None:
+                handle = await _tool_result(cached)
+                status = "ok"
+                return handle
+            if _wants_preview(ctx) and not (key is not None and result_cache.is_pending(key)):
+                # 预览先提交，工作池繁忙时也能排在完整结果之前
+                preview = asyncio.ensure_future(worker_pool.run(image_tasks.preview_task, image_path, operations))
+            compute = functools.partial(worker_pool.run, task, image_path, *args, output_format, preset)
+            # 相同的调用正在执行时等待它的结果，不再重复计算
+            result = asyncio.ensure_future(result_cache.compute(key, compute) if key is not None else compute())
+            if preview is not None:
+                try:
+                    data, image_format = await preview
+                except Exception as e:
+                    # 预览失败不影响完整结果
+                    print(f"Preview failed: {e}")
+                else:
+                    if not result.done():
+                        await ctx.report_progress(0, 1, json.dumps({
+                            "preview": base64.b64encode(data).decode("ascii"),
+                            "format": image_format,
+                        }))
+            handle = await _tool_result(await result)
+            status = "ok"
+            return handle
+        finally:
+            tool_calls.inc(tool=tool, status=status)
+            for future in (preview, result):
+                if future is not None:
+                    future.cancel()
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> Response:
+    """
+    Prometheus metrics of this server: tool calls, stage durations, result cache hits and worker pool load.
+    """
+    return Response(registry.render(), media_type=registry.content_type)
+
+
+@mcp.custom_route("/stats", methods=["GET"])
+async def stats(request: Request) -> JSONResponse:
+    """
+    Runtime statistics of the tool server.
+    """
+    if worker_pool.kind == "thread":
+        image_cache_stats = decoded_image_cache.stats()
+    else:
+        # 进程模式下解码缓存在各工作进程中，本进程的缓存始终为空
+        image_cache_stats = {"per_worker": True, "max_bytes": worker_pool.cache_bytes_per_worker}
+    return JSONResponse({
+        "decoded_image_cache": image_cache_stats,
+        "result_cache": result_cache.stats(),
+        "worker_pool": worker_pool.stats(),
+    })
+
+
 @mcp.tool()
-def img_resize(image_path: str, width: int, height: int) -> bytes:
+async def img_resize(image_id: str, width: int, height: int, ctx: Context,
+                     output_format: str | None = None, preset: str | None = None) -> bytes | dict:
     """
     Resize an image to the specified width and height.
-    
+
     Args:
-        image_path (str): The local file path of the input image
+        image_id (str): The ID of the input image in the image store
         width (int): The target width for the resized image
         height (int): The target height for the resized image
-        
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
     Returns:
-        bytes: The resized image data in PNG format as bytes
-    """
-    # Open the input image from file path
-    img = Image.open(image_path)
-    
-    # Resize the image using LANCZOS resampling algorithm for high quality
-    resized_img = img.resize((width, height), Image.Resampling.LANCZOS)
-    
-    # Save the resized image to a byte stream in PNG format
-    output_stream = BytesIO()
-    resized_img.save(output_stream, format='PNG')
-    output_stream.seek(0)
-    
-    # Return the resized image data as bytes
-    return output_stream.getvalue()
+        dict: A handle with the image_id and format of the resized image
+    """
+    # Decoding, resampling and encoding run in the worker pool
+    operations = [{"op": "resize", "width": width, "height": height}]
+    return await _run_tool(ctx, "img_resize", image_id, operations, output_format, preset,
+                           image_tasks.resize_task, width, height)
 
 
 @mcp.tool()
-def img_crop(image_path: str, left: int, upper: int, right: int, lower: int) -> bytes:
+async def img_crop(image_id: str, left: int, upper: int, right: int, lower: int, ctx: Context,
+                   output_format: str | None = None, preset: str | None = None) -> bytes | dict:
     """
     Crop an image to the specified box.
-    
+
     Args:
-        image_path (str): The local file path of the input image
+        image_id (str): The ID of the input image in the image store
         left (int): The x-coordinate of the left edge of the crop box
         upper (int): The y-coordinate of the upper edge of the crop box
         right (int): The x-coordinate of the right edge of the crop box
         lower (int): The y-coordinate of the lower edge of the crop box
-    
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
     Returns:
-        bytes: The cropped image data in PNG format as bytes
-    """
-    # Load the image from file path
-    img = Image.open(image_path)
-    
-    # Crop the image to the specified bounding box
-    cropped_img = img.crop((left, upper, right, lower))
-    
-    # Save the cropped image to a byte stream in PNG format
-    output_stream = BytesIO()
-    cropped_img.save(output_stream, format='PNG')
-    output_stream.seek(0)
-    
-    # Return the cropped image bytes
-    return output_stream.getvalue()
+        dict: A handle with the image_id and format of the cropped image
+    """
+    operations = [{"op": "crop", "left": left, "upper": upper, "right": right, "lower": lower}]
+    return await _run_tool(ctx, "img_crop", image_id, operations, output_format, preset,
+                           image_tasks.crop_task, left, upper, right, lower)
 
 
 @mcp.tool()
-def img_rotate(image_path: str, angle: float) -> bytes:
+async def img_rotate(image_id: str, angle: float, ctx: Context,
+                     output_format: str | None = None, preset: str | None = None) -> bytes | dict:
     """
     Rotate an image by a specified angle and return the rotated image data.
-    
+
     Args:
-        image_path (str): The local file path of the input image
-        angle (float): The rotation angle in degrees. Positive values indicate 
+        image_id (str): The ID of the input image in the image store
+        angle (float): The rotation angle in degrees. Positive values indicate
                       counter-clockwise rotation, negative values indicate clockwise rotation
-    
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the rotated image
+    """
+    operations = [{"op": "rotate", "angle": angle}]
+    return await _run_tool(ctx, "img_rotate", image_id, operations, output_format, preset,
+                           image_tasks.rotate_task, angle)
+
+
+async def _run_operation(ctx: Context, tool: str, image_id: str, operation: dict,
+                         output_format: str | None, preset: str | None) -> bytes | dict:
+    """
+    Run a single pixel operation through the pipeline task.
+    """
+    operations = [operation]
+    return await _run_tool(ctx, tool, image_id, operations, output_format, preset,
+                           image_tasks.pipeline_task, operations)
+
+
+@mcp.tool()
+async def img_brightness(image_id: str, factor: float, ctx: Context,
+                         output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Adjust the brightness of an image.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        factor (float): 1.0 keeps the image unchanged, lower values darken and higher values brighten it
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
     Returns:
-        bytes: The rotated image data in PNG format as bytes
-    """
-    # Load the image from file path
-    img = Image.open(image_path)
-    
-    # Rotate the image by the specified angle, expand=True ensures the entire 
-    # rotated image is visible without cropping
-    rotated_img = img.rotate(angle, expand=True)
-    
-    # Save the rotated image to a byte stream in PNG format
-    output_stream = BytesIO()
-    rotated_img.save(output_stream, format='PNG')
-    output_stream.seek(0)
-    
-    # Return the image byte data
-    return output_stream.getvalue()
+        dict: A handle with the image_id and format of the adjusted image
+    """
+    return await _run_operation(ctx, "img_brightness", image_id, {"op": "brightness", "factor": factor},
+                                output_format, preset)
+
+
+@mcp.tool()
+async def img_contrast(image_id: str, factor: float, ctx: Context,
+                       output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Adjust the contrast of an image.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        factor (float): 1.0 keeps the image unchanged, 0.0 gives a flat gray image, higher values add contrast
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the adjusted image
+    """
+    return await _run_operation(ctx, "img_contrast", image_id, {"op": "contrast", "factor": factor},
+                                output_format, preset)
+
+
+@mcp.tool()
+async def img_gamma(image_id: str, gamma: float, ctx: Context,
+                    output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Apply gamma correction to an image.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        gamma (float): Values above 1.0 brighten the midtones, values below 1.0 darken them
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the corrected image
+    """
+    return await _run_operation(ctx, "img_gamma", image_id, {"op": "gamma", "gamma": gamma}, output_format, preset)
+
+
+@mcp.tool()
+async def img_levels(image_id: str, black: int, white: int, ctx: Context, gamma: float = 1.0,
+                     output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Stretch the tonal range of an image: input values at or below black become 0,
+    values at or above white become 255.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        black (int): The input black point, 0-254
+        white (int): The input white point, greater than black and at most 255
+        gamma (float, optional): Midtone gamma applied after the stretch, 1.0 by default
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the adjusted image
+    """
+    operation = {"op": "levels", "black": black, "white": white, "gamma": gamma}
+    return await _run_operation(ctx, "img_levels", image_id, operation, output_format, preset)
+
+
+@mcp.tool()
+async def img_curves(image_id: str, points: list[list[float]], ctx: Context,
+                     output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Remap the tones of an image along a curve through the given points, interpolating linearly between them.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        points (list[list[float]]): At least two [input, output] pairs in the range 0-255,
+            e.g. [[0, 0], [128, 160], [255, 255]] to brighten the midtones
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the adjusted image
+    """
+    return await _run_operation(ctx, "img_curves", image_id, {"op": "curves", "points": points},
+                                output_format, preset)
+
+
+@mcp.tool()
+async def img_grayscale(image_id: str, ctx: Context,
+                        output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Convert an image to grayscale, keeping its transparency.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the grayscale image
+    """
+    return await _run_operation(ctx, "img_grayscale", image_id, {"op": "grayscale"}, output_format, preset)
+
+
+@mcp.tool()
+async def img_sepia(image_id: str, ctx: Context,
+                    output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Give an image a sepia (old photo) tone.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the toned image
+    """
+    return await _run_operation(ctx, "img_sepia", image_id, {"op": "sepia"}, output_format, preset)
+
+
+@mcp.tool()
+async def img_channel_mix(image_id: str, matrix: list[list[float]], ctx: Context,
+                          output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Mix the color channels of an image: each output channel is a weighted sum of the input red, green and blue.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        matrix (list[list[float]]): Three rows of three weights, one row per output channel (R, G, B),
+            e.g. [[0, 0, 1], [0, 1, 0], [1, 0, 0]] swaps red and blue
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the processed image
+    """
+    return await _run_operation(ctx, "img_channel_mix", image_id, {"op": "channel_mix", "matrix": matrix},
+                                output_format, preset)
+
+
+@mcp.tool()
+async def img_blur(image_id: str, radius: float, ctx: Context,
+                   output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Apply a Gaussian blur to an image.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        radius (float): The blur radius (standard deviation) in pixels, at most 100
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the blurred image
+    """
+    return await _run_operation(ctx, "img_blur", image_id, {"op": "blur", "radius": radius}, output_format, preset)
+
+
+@mcp.tool()
+async def img_sharpen(image_id: str, amount: float, ctx: Context, radius: float = 2.0,
+                      output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Sharpen an image with an unsharp mask.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        amount (float): Strength of the sharpening, e.g. 0.5 for subtle and 2.0 for strong
+        radius (float, optional): Size of the details to sharpen in pixels, 2.0 by default
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the sharpened image
+    """
+    operation = {"op": "sharpen", "amount": amount, "radius": radius}
+    return await _run_operation(ctx, "img_sharpen", image_id, operation, output_format, preset)
+
+
+@mcp.tool()
+async def img_pipeline(image_id: str, operations: list[dict], ctx: Context,
+                       output_format: str | None = None, preset: str | None = None) -> bytes | dict:
+    """
+    Apply several operations to an image in one call. Prefer this tool over
+    calling the single-operation tools one after another.
+
+    Args:
+        image_id (str): The ID of the input image in the image store
+        operations (list[dict]): The operations to apply, in order. Each item is one of
+            {"op": "resize", "width": int, "height": int},
+            {"op": "crop", "left": int, "upper": int, "right": int, "lower": int},
+            {"op": "rotate", "angle": float},
+            {"op": "brightness", "factor": float},
+            {"op": "contrast", "factor": float},
+            {"op": "gamma", "gamma": float},
+            {"op": "levels", "black": int, "white": int, "gamma": float (optional)},
+            {"op": "curves", "points": [[input, output], ...]},
+            {"op": "grayscale"},
+            {"op": "sepia"},
+            {"op": "channel_mix", "matrix": [[r, g, b], [r, g, b], [r, g, b]]},
+            {"op": "blur", "radius": float},
+            {"op": "sharpen", "amount": float, "radius": float (optional)}
+        output_format (str, optional): "PNG", "JPEG" or "WEBP"; keeps the input format if omitted
+        preset (str, optional): Encoding effort, "fast", "balanced" or "smallest"
+
+    Returns:
+        dict: A handle with the image_id and format of the processed image
+    """
+    return await _run_tool(ctx, "img_pipeline", image_id, operations, output_format, preset,
+                           image_tasks.pipeline_task, operations)
 
 
 if __name__ == "__main__":
-    mcp.run(transport="http", host="127.0.0.1", port=8000)
\ No newline at end of file
+    apply_decompression_limit()
+    try:
+        mcp.run(transport="http", host="127.0.0.1", port=8000)
+    finally:
+        worker_pool.shutdown()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 与 main.py 一样以仓库根目录为导入根，测试中使用 backend.app... 的绝对导入
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
@@ -0,0 +1,25 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+from aiohttp import web
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+@asynccontextmanager
+async def stub_server(routes: dict[tuple[str, str], Handler]) -> AsyncIterator[str]:
+    """
+    Serve ``{(method, path): handler}`` on a free local port and yield the base URL.
+    """
+    app = web.Application()
+    for (method, path), handler in routes.items():
+        app.router.add_route(method, path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        host, port = runner.addresses[0][:2]
+        yield f"http://{host}:{port}"
+    finally:
+        await runner.cleanup()
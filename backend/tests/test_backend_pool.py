@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.app.services.backend_pool import Endpoint, EndpointPool, NoHealthyEndpoint
+
+
+def make_pool(count: int = 3, eject_after_failures: int = 2, eject_seconds: float = 30.0) -> EndpointPool[str]:
+    endpoints = [Endpoint(f"http://backend-{i}", f"client-{i}") for i in range(count)]
+    return EndpointPool("test", endpoints, eject_after_failures, eject_seconds)
+
+
+def test_pool_needs_endpoints():
+    with pytest.raises(NoHealthyEndpoint):
+        EndpointPool("empty", [], 1, 1.0)
+
+
+def test_requests_go_to_the_least_outstanding_endpoint():
+    pool = make_pool(3)
+    with pool.lease() as first, pool.lease() as second, pool.lease() as third:
+        # 三个请求同时进行时各占一个节点
+        assert len({first.url, second.url, third.url}) == 3
+        with pool.lease() as fourth:
+            assert fourth.outstanding == 2
+    assert all(e.outstanding == 0 for e in pool.endpoints)
+    assert sum(e.requests for e in pool.endpoints) == 4
+
+
+def test_lease_prefers_endpoints_not_excluded():
+    pool = make_pool(2)
+    first = pool.pick()
+    for _ in range(10):
+        assert pool.pick(exclude=[first]) is not first
+    # 全部被排除时仍然返回一个节点
+    assert pool.pick(exclude=pool.endpoints) in pool.endpoints
+
+
+def test_endpoint_is_ejected_after_consecutive_failures():
+    pool = make_pool(2, eject_after_failures=2)
+    bad, good = pool.endpoints
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            with pool.lease(exclude=[good]):
+                raise ConnectionError("down")
+    assert not bad.healthy
+    assert bad.failures == 2
+    assert all(pool.pick() is good for _ in range(10))
+    assert pool.stats()["healthy"] == 1
+
+
+def test_success_resets_the_failure_count():
+    pool = make_pool(1, eject_after_failures=2)
+    endpoint = pool.endpoints[0]
+    with pytest.raises(ConnectionError):
+        with pool.lease():
+            raise ConnectionError("down")
+    with pool.lease():
+        pass
+    with pytest.raises(ConnectionError):
+        with pool.lease():
+            raise ConnectionError("down")
+    assert endpoint.healthy
+    assert endpoint.consecutive_failures == 1
+
+
+def test_ejected_endpoint_rejoins_after_eject_seconds():
+    pool = make_pool(2, eject_after_failures=1, eject_seconds=0.05)
+    endpoint = pool.endpoints[0]
+    pool.record_failure(endpoint)
+    assert not endpoint.healthy
+    time.sleep(0.06)
+    assert endpoint.healthy
+
+
+def test_all_ejected_still_spreads_requests():
+    pool = make_pool(2, eject_after_failures=1)
+    for endpoint in pool.endpoints:
+        pool.record_failure(endpoint)
+    with pool.lease() as first, pool.lease() as second:
+        assert first is not second
+
+
+def test_health_check_ejects_and_restores_endpoints():
+    async def scenario():
+        pool = make_pool(2)
+        down = {pool.endpoints[0].url}
+
+        async def check(endpoint: Endpoint[str]) -> bool:
+            if endpoint.url in down:
+                raise ConnectionError("unreachable")
+            return True
+
+        await pool.check_health(check)
+        assert [e.healthy for e in pool.endpoints] == [False, True]
+        down.clear()
+        await pool.check_health(check)
+        assert [e.healthy for e in pool.endpoints] == [True, True]
+
+    asyncio.run(scenario())
+
+
+def test_background_health_checks_run_until_stopped():
+    async def scenario():
+        pool = make_pool(1)
+        checks = 0
+
+        async def check(endpoint: Endpoint[str]) -> bool:
+            nonlocal checks
+            checks += 1
+            return True
+
+        pool.start_health_checks(check, 0.01)
+        await asyncio.sleep(0.05)
+        await pool.stop_health_checks()
+        seen = checks
+        await asyncio.sleep(0.03)
+        assert seen >= 2
+        assert checks == seen
+
+    asyncio.run(scenario())
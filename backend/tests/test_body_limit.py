@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from fastapi import FastAPI, File, UploadFile
+
+from backend.app.utils.body_limit import MaxBodySizeMiddleware
+
+BOUNDARY = "limit-test"
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)) -> dict:
+        return {"size": len(await file.read())}
+
+    return app
+
+
+def multipart_body(size: int) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="a.bin"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + b"x" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def post(body: bytes, max_bytes: int, content_length: bool = False, chunk: int = 1024) -> tuple[int, dict, int]:
+    """
+    Send ``body`` in chunks through the middleware; returns the status, the JSON body and the chunks read.
+    """
+    app = MaxBodySizeMiddleware(make_app(), max_bytes=max_bytes)
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/upload", "raw_path": b"/upload", "query_string": b"",
+             "headers": headers, "http_version": "1.1", "scheme": "http", "root_path": "",
+             "server": ("testserver", 80), "client": ("127.0.0.1", 1234)}
+    chunks = [body[i:i + chunk] for i in range(0, len(body), chunk)]
+    read = 0
+    sent = []
+
+    async def receive():
+        nonlocal read
+        if read < len(chunks):
+            read += 1
+            return {"type": "http.request", "body": chunks[read - 1], "more_body": read < len(chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = next(message for message in sent if message["type"] == "http.response.start")
+    content = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+    return start["status"], json.loads(content), read
+
+
+def test_small_body_passes():
+    status, content, _ = post(multipart_body(3000), max_bytes=10_000)
+    assert status == 200
+    assert content == {"size": 3000}
+
+
+def test_content_length_over_limit_is_rejected_without_reading():
+    status, _, read = post(multipart_body(50_000), max_bytes=10_000, content_length=True)
+    assert status == 413
+    assert read == 0
+
+
+def test_streamed_body_stops_at_the_limit():
+    body = multipart_body(50_000)
+    status, content, read = post(body, max_bytes=10_000)
+    assert status == 413
+    assert content == {"detail": "Request body is too large"}
+    # 超出上限的那一块之后不再读取
+    assert read == 10_000 // 1024 + 1
@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from backend.app.services.captcha_client import CaptchaClient, CaptchaUnavailable
+from tests.stubs import stub_server
+
+
+class VerifyStub:
+    """
+    Stand-in for the siteverify endpoint: answers with ``status`` after ``delay`` seconds and counts calls.
+    """
+
+    def __init__(self, success: bool = True, status: int = 200, delay: float = 0.0):
+        self.success = success
+        self.status = status
+        self.delay = delay
+        self.calls = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        await request.post()
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.Response(status=self.status)
+        return web.json_response({"success": self.success})
+
+    def serve(self):
+        return stub_server({("POST", "/siteverify"): self.handle})
+
+
+def make_client(url: str, **overrides) -> CaptchaClient:
+    options = dict(
+        endpoint=f"{url}/siteverify",
+        secret="secret",
+        timeout_seconds=1.0,
+        pool_size=4,
+        keepalive_seconds=5.0,
+        breaker_failures=2,
+        breaker_reset_seconds=0.2,
+        verdict_ttl_seconds=60.0,
+        verdict_cache_size=100,
+    )
+    options.update(overrides)
+    return CaptchaClient(**options)
+
+
+def test_verdict_is_cached_per_token():
+    async def scenario():
+        stub = VerifyStub(success=True)
+        async with stub.serve() as url:
+            client = make_client(url)
+            try:
+                assert await client.verify("token-a")
+                assert await client.verify("token-a")
+                stub.success = False
+                assert not await client.verify("token-b")
+            finally:
+                await client.close()
+        assert stub.calls == 2
+        assert client.stats()["cache_hits"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_expired_verdict_is_verified_again():
+    async def scenario():
+        stub = VerifyStub()
+        async with stub.serve() as url:
+            client = make_client(url, verdict_ttl_seconds=0.05)
+            try:
+                await client.verify("token")
+                await asyncio.sleep(0.1)
+                await client.verify("token")
+            finally:
+                await client.close()
+        assert stub.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_requests_for_one_token_share_an_upstream_call():
+    async def scenario():
+        stub = VerifyStub(delay=0.1)
+        async with stub.serve() as url:
+            client = make_client(url)
+            try:
+                verdicts = await asyncio.gather(*(client.verify("token") for _ in range(5)))
+            finally:
+                await client.close()
+        assert verdicts == [True] * 5
+        assert stub.calls == 1
+        assert client.stats()["upstream_calls"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers():
+    async def scenario():
+        stub = VerifyStub(status=503)
+        async with stub.serve() as url:
+            client = make_client(url)
+            try:
+                for token in ("a", "b"):
+                    with pytest.raises(CaptchaUnavailable):
+                        await client.verify(token)
+                assert client.state == "open"
+
+                # 熔断期间快速失败，不访问上游
+                with pytest.raises(CaptchaUnavailable):
+                    await client.verify("c")
+                assert stub.calls == 2
+                assert client.stats()["short_circuited"] == 1
+
+                # 恢复时间过后放行一次试探请求，成功则关闭熔断器
+                stub.status = 200
+                await asyncio.sleep(0.25)
+                assert client.state == "half_open"
+                assert await client.verify("d")
+                assert client.state == "closed"
+            finally:
+                await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_trial_request_reopens_the_breaker():
+    async def scenario():
+        stub = VerifyStub(status=500)
+        async with stub.serve() as url:
+            client = make_client(url, breaker_failures=1)
+            try:
+                with pytest.raises(CaptchaUnavailable):
+                    await client.verify("a")
+                await asyncio.sleep(0.25)
+                assert client.state == "half_open"
+                with pytest.raises(CaptchaUnavailable):
+                    await client.verify("b")
+                assert client.state == "open"
+            finally:
+                await client.close()
+        assert stub.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_timeouts_count_as_failures_and_are_not_cached():
+    async def scenario():
+        stub = VerifyStub(delay=0.5)
+        async with stub.serve() as url:
+            client = make_client(url, timeout_seconds=0.1, breaker_failures=5)
+            try:
+                with pytest.raises(CaptchaUnavailable):
+                    await client.verify("token")
+                stub.delay = 0.0
+                assert await client.verify("token")
+            finally:
+                await client.close()
+        assert client.stats()["failures"] == 1
+        assert stub.calls == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,45 @@
+import pytest
+from PIL import Image
+
+from backend.app.core.config import settings
+from backend.app.services import image_tasks
+from backend.app.services.image_cache import decoded_image_cache
+from backend.app.services.tiled_images import MemoryLimitExceeded
+
+CEILING = 4 * 1024 * 1024
+
+
+@pytest.fixture
+def small_png(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TILED_MEMORY_CEILING_BYTES", CEILING)
+    path = tmp_path / "small.png"
+    Image.new("RGB", (64, 48), (200, 100, 50)).save(path)
+    yield str(path)
+    decoded_image_cache.clear()
+
+
+def test_upscale_of_small_input_is_rejected_before_decoding(small_png, monkeypatch):
+    def decode(path):
+        raise AssertionError("decoded before the memory check")
+
+    monkeypatch.setattr(decoded_image_cache, "get", decode)
+    # 4096 x 4096 RGB 约 64 MiB，远超 4 MiB 上限
+    with pytest.raises(MemoryLimitExceeded):
+        image_tasks.resize_task(small_png, 4096, 4096)
+    with pytest.raises(MemoryLimitExceeded):
+        image_tasks.pipeline_task(small_png, [{"op": "resize", "width": 4096, "height": 4096}])
+    with pytest.raises(MemoryLimitExceeded):
+        image_tasks.crop_task(small_png, 0, 0, 4096, 4096)
+
+
+def test_fused_intermediate_size_does_not_count(small_png):
+    # 放大后再缩小会合并成一次缩放，不会产生放大后的中间图片
+    operations = [{"op": "resize", "width": 4096, "height": 4096}, {"op": "resize", "width": 32, "height": 24}]
+    data, _ = image_tasks.pipeline_task(small_png, operations, output_format="png")
+    assert data.startswith(b"\x89PNG")
+
+
+def test_output_within_ceiling_is_processed(small_png):
+    data, image_format = image_tasks.resize_task(small_png, 512, 512, output_format="png")
+    assert image_format.lower() == "png"
+    assert data.startswith(b"\x89PNG")
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from backend.app.services.kv_store import StoreFull, TTLStore
+
+
+def make_store(**overrides) -> TTLStore:
+    options = dict(max_keys=100, max_bytes=10_000, shards=1, sweep_interval=60.0)
+    options.update(overrides)
+    return TTLStore(**options)
+
+
+@pytest.mark.parametrize("ex", [0, -1])
+def test_set_rejects_non_positive_expiry(ex):
+    store = make_store()
+    with pytest.raises(ValueError):
+        store.set("code", "123456", ex=ex)
+    assert store.get("code") is None
+
+
+def test_set_with_expiry_expires():
+    store = make_store()
+    store.set("code", "123456", ex=1)
+    assert store.ttl("code") in (0, 1)
+    store._shards[0].data["code"] = ("123456", time.time() - 1)
+    assert store.get("code") is None
+    store.set("user", "{}")
+    assert store.ttl("user") == -1
+
+
+def test_large_values_are_bounded_by_bytes():
+    store = make_store(max_bytes=1000, eviction_policy="allkeys-lru")
+    for i in range(10):
+        store.set(f"k{i}", "x" * 200)
+    # 每个键约 202 字节，1000 字节内最多保留 4 个，最早写入的先被淘汰
+    assert store.stats()["bytes"] <= 1000
+    assert len(store) == 4
+    assert store.get("k0") is None
+    assert store.get("k9") == "x" * 200
+
+
+def test_value_larger_than_the_limit_is_rejected():
+    store = make_store(max_bytes=100)
+    with pytest.raises(StoreFull):
+        store.set("big", "x" * 200)
+
+
+def test_volatile_lru_only_evicts_keys_with_ttl():
+    store = make_store(max_bytes=500)
+    store.set("user", "u" * 200)
+    store.set("code", "c" * 200, ex=60)
+    store.set("other", "o" * 200, ex=60)
+    assert store.get("user") == "u" * 200
+    assert store.get("code") is None
+    with pytest.raises(StoreFull):
+        store.set("another", "a" * 400)
+
+
+def test_byte_count_follows_overwrites_deletes_and_incr():
+    store = make_store()
+    store.set("a", "xxxx")
+    store.set("a", "xx")
+    assert store.stats()["bytes"] == 3
+    store.incr("n")
+    store.incr("n", 10)
+    store.delete("a", "n")
+    assert store.stats()["bytes"] == 0
@@ -0,0 +1,89 @@
+import asyncio
+from typing import Any
+
+from aiohttp import web
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from backend.app.services.backend_pool import Endpoint, EndpointPool
+from backend.app.services.llm_pool import BalancedChatModel, ollama_health_check
+from tests.stubs import stub_server
+
+
+class UnreachableChatModel(BaseChatModel):
+    """
+    Chat model whose server cannot be reached.
+    """
+
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "unreachable"
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        raise ConnectionError("connection refused")
+
+
+def make_model(*clients: BaseChatModel, eject_after_failures: int = 1) -> BalancedChatModel:
+    endpoints = [Endpoint(f"http://ollama-{i}", client) for i, client in enumerate(clients)]
+    return BalancedChatModel(pool=EndpointPool("llm", endpoints, eject_after_failures, 30.0))
+
+
+def test_failed_call_is_retried_on_another_endpoint():
+    down = UnreachableChatModel()
+    model = make_model(down, FakeListChatModel(responses=["ok"]), eject_after_failures=1)
+    bad, good = model.pool.endpoints
+    # 让故障节点先被选中
+    good.outstanding = 1
+    assert model.invoke("hi").content == "ok"
+    good.outstanding = 0
+    assert down.calls == 1
+    assert not bad.healthy
+    assert good.requests == 1
+
+
+def test_ejected_endpoint_gets_no_traffic():
+    async def scenario():
+        down = UnreachableChatModel()
+        model = make_model(down, FakeListChatModel(responses=["ok"]), eject_after_failures=1)
+        model.pool.record_failure(model.pool.endpoints[0])
+        replies = await asyncio.gather(*(model.ainvoke("hi") for _ in range(5)))
+        assert [r.content for r in replies] == ["ok"] * 5
+        assert down.calls == 0
+
+    asyncio.run(scenario())
+
+
+def test_streaming_falls_back_before_any_output():
+    model = make_model(UnreachableChatModel(), FakeListChatModel(responses=["streamed"]))
+    model.pool.endpoints[1].outstanding = 1
+    text = "".join(chunk.content for chunk in model.stream("hi"))
+    assert text == "streamed"
+
+
+def test_ollama_health_check_against_stub_server():
+    async def scenario():
+        status = 200
+
+        async def tags(request: web.Request) -> web.Response:
+            return web.json_response({"models": []}, status=status)
+
+        async with stub_server({("GET", "/api/tags"): tags}) as url:
+            pool = EndpointPool("llm", [Endpoint(url, None), Endpoint("http://127.0.0.1:9", None)], 3, 30.0)
+            await pool.check_health(ollama_health_check)
+            assert [e.healthy for e in pool.endpoints] == [True, False]
+
+            status = 500
+            await pool.check_health(ollama_health_check)
+            assert not pool.endpoints[0].healthy
+
+            status = 200
+            await pool.check_health(ollama_health_check)
+            assert pool.endpoints[0].healthy
+
+    asyncio.run(scenario())
@@ -0,0 +1,150 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.tools import ToolException
+
+from backend.app.services import mcp_pool
+from backend.app.services.mcp_pool import McpServerPool, McpSessionGroup
+
+
+class FakeSessionGroup:
+    """
+    Stands in for the MCP sessions of one server: records calls and answers after ``delay`` seconds.
+    """
+
+    def __init__(self, name: str, delay: float = 0.0):
+        self.name = name
+        self.delay = delay
+        self.reachable = True
+        self.tool_error = False
+        self.calls = 0
+
+    async def call_tool(self, name, arguments, progress_handler=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if not self.reachable:
+            raise ConnectionError(f"{self.name} unreachable")
+        content = [SimpleNamespace(type="text", text=f"{self.name}:{name}")]
+        return SimpleNamespace(content=content, structured_content=None, is_error=self.tool_error)
+
+    async def ping(self) -> bool:
+        if not self.reachable:
+            raise ConnectionError(f"{self.name} unreachable")
+        return True
+
+
+def make_server(count: int, delay: float = 0.0, eject_after_failures: int = 2) -> tuple[McpServerPool, list]:
+    server = McpServerPool("imagetool", [f"http://mcp-{i}/mcp" for i in range(count)], 1, 5.0,
+                           eject_after_failures, 30.0)
+    groups = []
+    for i, endpoint in enumerate(server.pool.endpoints):
+        endpoint.client = FakeSessionGroup(f"mcp-{i}", delay)
+        groups.append(endpoint.client)
+    return server, groups
+
+
+def test_concurrent_calls_are_spread_over_servers():
+    async def scenario():
+        server, groups = make_server(3, delay=0.05)
+        results = await asyncio.gather(*(server.call_tool("img_resize", {}) for _ in range(6)))
+        assert [g.calls for g in groups] == [2, 2, 2]
+        assert sorted(results) == sorted(f"mcp-{i}:img_resize" for i in range(3) for _ in range(2))
+
+    asyncio.run(scenario())
+
+
+def test_unreachable_server_is_retried_ejected_and_recovers_through_health_check():
+    async def scenario():
+        server, (down, up) = make_server(2, eject_after_failures=2)
+        down.reachable = False
+        bad = server.pool.endpoints[0]
+        for _ in range(2):
+            # 让故障节点先被选中，调用换到另一个节点完成
+            server.pool.endpoints[1].outstanding = 1
+            assert await server.call_tool("img_rotate", {}) == "mcp-1:img_rotate"
+            server.pool.endpoints[1].outstanding = 0
+        assert not bad.healthy
+        assert down.calls == 2
+
+        for _ in range(4):
+            assert await server.call_tool("img_rotate", {}) == "mcp-1:img_rotate"
+        assert down.calls == 2
+
+        down.reachable = True
+        await server.pool.check_health(server.health_check)
+        assert bad.healthy
+        assert server.stats()["healthy"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_call_fails_once_every_server_is_unreachable():
+    async def scenario():
+        server, groups = make_server(2)
+        for group in groups:
+            group.reachable = False
+        with pytest.raises(ConnectionError):
+            await server.call_tool("img_rotate", {})
+        assert [g.calls for g in groups] == [1, 1]
+
+    asyncio.run(scenario())
+
+
+def test_tool_errors_do_not_eject_the_server():
+    async def scenario():
+        server, (group,) = make_server(1, eject_after_failures=1)
+        group.tool_error = True
+        with pytest.raises(ToolException):
+            await server.call_tool("img_crop", {})
+        assert group.calls == 1
+        assert server.pool.endpoints[0].healthy
+        assert server.pool.endpoints[0].failures == 0
+
+    asyncio.run(scenario())
+
+
+class FakeClient:
+    """
+    Stands in for a fastmcp ``Client`` session that can drop its connection.
+    """
+
+    def __init__(self, url, timeout):
+        self.alive = False
+        self.closed = False
+
+    async def __aenter__(self):
+        self.alive = True
+        return self
+
+    def is_connected(self) -> bool:
+        return self.alive
+
+    async def close(self) -> None:
+        self.alive = False
+        self.closed = True
+
+    async def call_tool(self, name, arguments, progress_handler=None, raise_on_error=True):
+        if not self.alive:
+            raise ConnectionError("session dropped")
+        return name
+
+
+def test_dropped_session_is_replaced_without_closing_the_others(monkeypatch):
+    monkeypatch.setattr(mcp_pool, "Client", FakeClient)
+
+    async def scenario():
+        group = McpSessionGroup("http://mcp-0/mcp", 3, 5.0)
+        await group.connect()
+        first, second, third = group.sessions
+        group._outstanding = [0, 1, 0]
+        second.alive = False
+
+        assert await group.call_tool("img_resize", {}) == "img_resize"
+        assert group.sessions[0] is first and group.sessions[2] is third
+        assert not first.closed and not third.closed
+        assert second.closed and group.sessions[1] is not second
+        # 断开会话上进行中的调用结束时仍会减少计数
+        assert group._outstanding == [0, 1, 0]
+
+    asyncio.run(scenario())
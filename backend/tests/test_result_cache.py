@@ -0,0 +1,16 @@
+from backend.app.core.config import settings
+from backend.app.services.result_cache import result_cache_key
+
+OPERATIONS = [{"op": "resize", "width": 100, "height": 80}]
+
+
+def test_key_is_stable_for_equivalent_operations():
+    key = result_cache_key("pipeline", "abc", OPERATIONS, None, None)
+    assert key == result_cache_key("pipeline", "abc", [{"op": "resize", "width": "100", "height": 80}], None, None)
+    assert key != result_cache_key("pipeline", "abd", OPERATIONS, None, None)
+
+
+def test_key_depends_on_tiled_threshold(monkeypatch):
+    key = result_cache_key("pipeline", "abc", OPERATIONS, None, None)
+    monkeypatch.setattr(settings, "TILED_PIXEL_THRESHOLD", settings.TILED_PIXEL_THRESHOLD // 2)
+    assert result_cache_key("pipeline", "abc", OPERATIONS, None, None) != key
@@ -0,0 +1,58 @@
+import struct
+import zlib
+
+from PIL import Image
+
+from backend.app.services.tiled_images import tiled_crop, tiled_resize
+
+# Adam7 每一遍的 (起始列, 起始行, 列间隔, 行间隔)
+ADAM7 = [(0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2)]
+
+
+def gradient(width: int, height: int) -> Image.Image:
+    img = Image.new("RGB", (width, height))
+    img.putdata([(x % 256, y % 256, (x + y) % 256) for y in range(height) for x in range(width)])
+    return img
+
+
+def write_interlaced_png(img: Image.Image, path) -> None:
+    """
+    Pillow cannot save interlaced PNGs, so encode the Adam7 passes by hand (filter type 0).
+    """
+    width, height = img.size
+    pixels = img.load()
+    raw = b""
+    for x0, y0, dx, dy in ADAM7:
+        columns = range(x0, width, dx)
+        if not columns:
+            continue
+        for y in range(y0, height, dy):
+            raw += b"\x00" + bytes(v for x in columns for v in pixels[x, y])
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 1)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw))
+                + chunk(b"IEND", b""))
+
+
+def test_crop_of_sequential_png_matches_pillow(tmp_path):
+    path = tmp_path / "plain.png"
+    source = gradient(200, 300)
+    source.save(path)
+    assert tiled_crop(str(path), (10, 10, 100, 100)).tobytes() == source.crop((10, 10, 100, 100)).tobytes()
+
+
+def test_interlaced_png_is_decoded_in_full(tmp_path):
+    path = tmp_path / "interlaced.png"
+    source = gradient(200, 300)
+    write_interlaced_png(source, path)
+    with Image.open(path) as img:
+        assert img.info.get("interlace")
+        assert img.convert("RGB").tobytes() == source.tobytes()
+
+    assert tiled_crop(str(path), (10, 10, 100, 100)).tobytes() == source.crop((10, 10, 100, 100)).tobytes()
+    resized = tiled_resize(str(path), (50, 40), (10, 10, 110, 90))
+    assert resized.tobytes() == source.resize((50, 40), Image.Resampling.LANCZOS, box=(10, 10, 110, 90)).tobytes()
@@ -1,12 +1,42 @@
 import hashlib
+import hmac
+import json
 import secrets
-import time
-from typing import Dict, Optional, Union
+from typing import Optional
 
+from backend.app.core.config import settings
+from backend.app.services.kv_store import KeyValueStore, create_kv_store
 
-# 模拟数据库存储
-users_db: Dict[str, dict] = {}
-verification_codes: Dict[str, Dict[str, Union[str, float]]] = {}  # email -> {code, timestamp}
+
+# 模拟数据库存储：用户和验证码都保存在带 TTL 的键值存储中，可替换为 Redis
+store: KeyValueStore = create_kv_store(
+    settings.KV_STORE_URL,
+    max_keys=settings.KV_STORE_MAX_KEYS,
+    max_bytes=settings.KV_STORE_MAX_BYTES,
+    shards=settings.KV_STORE_SHARDS,
+)
+
+
+class VerificationRateLimited(ValueError):
+    """
+    Raised when too many verification codes were requested for one email.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many verification codes requested")
+        self.retry_after = retry_after
+
+
+def _user_key(email: str) -> str:
+    return f"user:{email}"
+
+
+def _code_key(email: str) -> str:
+    return f"verification_code:{email}"
+
+
+def _rate_key(email: str) -> str:
+    return f"verification_rate:{email}"
 
 
 def hash_password(password: str, salt: str = None) -> tuple[str, str]:
@@ -33,7 +63,7 @@ def create_user(email: str, password: str) -> dict:
     Create a new user
     """
     # Check if user already exists
-    if email in users_db:
+    if store.get(_user_key(email)) is not None:
         raise ValueError("User with this email already exists")
 
     # Hash password
@@ -44,7 +74,7 @@ def create_user(email: str, password: str) -> dict:
         "password_hash": password_hash + ":" + salt  # Store both hash and salt
     }
     
-    users_db[email] = user
+    store.set(_user_key(email), json.dumps(user))
     return user
 
 
@@ -52,14 +82,15 @@ def get_user_by_email(email: str) -> Optional[dict]:
     """
     Get user by email
     """
-    return users_db.get(email)
+    user = store.get(_user_key(email))
+    return json.loads(user) if user is not None else None
 
 
 def authenticate_user(email: str, password: str) -> Optional[bool]:
     """
     Authenticate user and return token if successful
     """
-    user = users_db.get(email)
+    user = get_user_by_email(email)
     if not user:
         return None
 
@@ -75,31 +106,33 @@ def authenticate_user(email: str, password: str) -> Optional[bool]:
 
 def store_verification_code(email: str, code: str):
     """
-    Store verification code for an email
+    Store verification code for an email.
+    Raises VerificationRateLimited if the email exceeded its issuance limit.
     """
-    verification_codes[email] = {
-        "code": code,
-        "timestamp": time.time()
-    }
+    # 固定窗口限流：窗口内第一次计数时设置过期时间
+    issued = store.incr(_rate_key(email))
+    if issued == 1:
+        store.expire(_rate_key(email), settings.VERIFICATION_CODE_RATE_WINDOW_SECONDS)
+    if issued > settings.VERIFICATION_CODE_RATE_LIMIT:
+        retry_after = store.ttl(_rate_key(email))
+        raise VerificationRateLimited(retry_after if retry_after > 0 else settings.VERIFICATION_CODE_RATE_WINDOW_SECONDS)
+
+    # 过期由存储负责，过期的验证码会被主动清理
+    store.set(_code_key(email), code, ex=settings.VERIFICATION_CODE_TTL_SECONDS)
 
 
 def verify_code(email: str, code: str) -> bool:
     """
     Verify if the code for an email is valid and not expired
     """
-    if email not in verification_codes:
+    stored_code = store.get(_code_key(email))
+    if stored_code is None:
         return False
-
-    stored_data = verification_codes[email]
-    # Check if code matches and is not older than 10 minutes
-    if stored_data["code"] == code and (time.time() - stored_data["timestamp"]) < 600:
-        return True
-    return False
+    return hmac.compare_digest(str(stored_code), code)
 
 
 def delete_verification_code(email: str):
     """
     Delete verification code after successful use
     """
-    if email in verification_codes:
-        del verification_codes[email]
\ No newline at end of file
+    store.delete(_code_key(email))
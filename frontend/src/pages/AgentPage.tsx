@@ -5,9 +5,14 @@ import { API_BASE_URL } from '../config'; // 1. 导入基础 URL
 
 // 为 SSE 流返回的步骤数据定义一个类型接口
 interface AgentStep {
-  type: 'thought' | 'observation' | 'final_output' | 'error' | 'final_image';
+  type: 'thought' | 'observation' | 'final_output' | 'error' | 'final_image' | 'queue_position' | 'preview';
   content: string;
+  // 排队时服务端返回的当前位置
+  position?: number;
   format?: string;
+  // handle 模式下的结果引用，图片通过 url 单独下载
+  image_id?: string;
+  url?: string;
 }
 
 export function AgentPage(): JSX.Element {
@@ -18,6 +23,7 @@ export function AgentPage(): JSX.Element {
 
   const [isLoading, setIsLoading] = useState<boolean>(false);
   const [steps, setSteps] = useState<AgentStep[]>([]);
+  const [queuePosition, setQueuePosition] = useState<number | null>(null);
 
   const handleFileChange = (e: ChangeEvent<HTMLInputElement>): void => {
     if (e.target.files && e.target.files[0]) {
@@ -42,6 +48,7 @@ export function AgentPage(): JSX.Element {
     setIsLoading(true);
     setSteps([]);
     setOutputImageUrl(null);
+    setQueuePosition(null);
 
     const formData = new FormData();
     formData.append('prompt', prompt);
@@ -49,15 +56,20 @@ export function AgentPage(): JSX.Element {
 
     try {
       // 2. 更新 fetch 请求地址
+      // 已登录时携带 token，后端开启 AGENT_REQUIRE_AUTH 后必须认证
+      const authToken = localStorage.getItem('authToken');
       const response = await fetch(`${API_BASE_URL}/agent/image_process`, {
         method: 'POST',
         body: formData,
-        // 如果你的 agent 接口需要认证，你需要在这里添加 Authorization 头
-        // headers: {
-        //   'Authorization': `Bearer ${localStorage.getItem('authToken')}`
-        // }
+        headers: authToken ? { 'Authorization': `Bearer ${authToken}` } : undefined,
       });
 
+      if (response.status === 429) {
+        const retryAfter = response.headers.get('Retry-After');
+        setSteps([{ type: 'error', content: `服务器繁忙，请在 ${retryAfter ?? '几'} 秒后重试。` }]);
+        return;
+      }
+
       if (!response.body) {
         throw new Error("Response body is null");
       }
@@ -78,9 +90,28 @@ export function AgentPage(): JSX.Element {
               if (data.type === 'end') {
                 setIsLoading(false);
                 return;
+              } else if (data.type === 'queue_position') {
+                setQueuePosition(data.position ?? null);
+                continue;
+              }
+              setQueuePosition(null);
+              if (data.type === 'preview') {
+                // 低分辨率预览先显示，完整结果到达后被替换
+                setOutputImageUrl(`data:${data.format};base64,${data.content}`);
+              } else if (data.type === 'final_image' && data.url) {
+                setOutputImageUrl(`${API_BASE_URL}${data.url}`);
               } else if (data.type === 'final_image' && data.format) {
                 const imageUrl = `data:${data.format};base64,${data.content}`;
                 setOutputImageUrl(imageUrl);
+              } else if (data.type === 'thought') {
+                // 后端按大小和时间合并 token，连续的思考帧拼接到同一步骤中
+                setSteps(prevSteps => {
+                  const last = prevSteps[prevSteps.length - 1];
+                  if (last && last.type === 'thought') {
+                    return [...prevSteps.slice(0, -1), { ...last, content: last.content + data.content }];
+                  }
+                  return [...prevSteps, data];
+                });
               } else {
                 setSteps(prevSteps => [...prevSteps, data]);
               }
@@ -135,7 +166,11 @@ export function AgentPage(): JSX.Element {
 
         <div className="log-window">
           {steps.filter(step => step.type !== 'final_image').map(renderStep)}
-          {isLoading && <div className="step loading">智能体正在工作中...</div>}
+          {isLoading && (
+            <div className="step loading">
+              {queuePosition ? `排队中，前面还有 ${queuePosition - 1} 个任务...` : '智能体正在工作中...'}
+            </div>
+          )}
         </div>
 
         <form onSubmit={handleSubmit} className="input-form">